@@ -41,25 +41,6 @@ app.conf.timezone = 'America/Toronto'
 #     print(f'Request: {self.request!r}')
 
 
-# app.conf.beat_schedule = {
-#     "save_weekly_snapshots": {
-#         "task": "my_app.tasks.save_weekly_snapshots",
-#         "schedule": crontab(hour=23, minute=30, day_of_week="6"),  # Runs Sunday at 11:30 PM
-#     },
-#     "save_monthly_snapshots": {
-#         "task": "my_app.tasks.save_monthly_snapshots",
-#         "schedule": crontab(hour=23, minute=30, day_of_month="28-31"),  # Runs last day of the month
-#     },
-#     "save_annual_snapshots": {
-#         "task": "my_app.tasks.save_annual_snapshots",
-#         "schedule": crontab(hour=23, minute=30, day_of_month="31", month_of_year="12"),  # Runs Dec 31st
-#     },
-# }
-
-# # FUNDS TASKS
-# app.conf.beat_schedule = {
-#     "save-fund-profit-summary": {
-#         "task": "your_app.tasks.save_fund_profit_summary",
-#         "schedule": crontab(hour=23, minute=59),  # Runs at 11:59 PM daily
-#     },
-# }
+# Periodic tasks live in the database (DatabaseScheduler above) and are registered by
+# TrackersConfig in trackers/apps.py, including the nightly period close
+# (trackers.ledger.tasks.close_profit_periods) that replaced the old snapshot schedules.
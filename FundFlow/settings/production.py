@@ -26,6 +26,17 @@ CELERY_RESULT_BACKEND = 'rediss://:p31597f53c1a12263faad1db77cd4d0b6a20b35c04d66
 # CELERY_RESULT_SERIALIZER = 'json'
 # CELERY_TIMEZONE = 'UTC'
 BROKER_USE_SSL={'ssl_cert_reqs': ssl.CERT_NONE}
+
+# Shared by the web and worker processes (see CACHES in settings.py), the broker's Redis
+# unless CACHE_URL names another one
+CACHE_LOCATION = env.str('CACHE_URL', default=CELERY_BROKER_URL)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_LOCATION,
+        'OPTIONS': {'ssl_cert_reqs': ssl.CERT_NONE} if CACHE_LOCATION.startswith('rediss://') else {},
+    }
+}
 CELERY_REDIS_BACKEND_USE_SSL={'ssl_cert_reqs': ssl.CERT_NONE}
 
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
@@ -47,6 +47,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # outermost, so it counts the queries of every middleware below too
+    'trackers.instrumentation.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,13 +56,16 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # needs request.user, staff only
+    'trackers.instrumentation.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'FundFlow.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates timing each render for the request metrics (trackers/instrumentation)
+        'BACKEND': 'trackers.instrumentation.templates.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -119,3 +124,47 @@ STATIC_URL = '/static/'
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# The dashboard and fund series caches are invalidated by replacing per-user and per-fund
+# version tokens kept in the cache (trackers/analytics/dashboards.py, series.py), and celery
+# workers replace most of them. Every web and worker process has to share the one cache, so
+# anything beyond single-process development needs CACHE_URL, e.g. redis://localhost:6379/1.
+CACHES = {'default': env.cache_url('CACHE_URL', default='locmemcache://')}
+
+# Live P&L stream (served over ASGI, see FundFlow/asgi.py)
+# LIVE_PRICE_FEED is "yahoo" or "synthetic" (local random walk for development)
+LIVE_PRICE_FEED = env.str('LIVE_PRICE_FEED', default='yahoo')
+LIVE_REFRESH_SECONDS = env.int('LIVE_REFRESH_SECONDS', default=5)
+# one refresh of every subscribed symbol, on the upstream pool
+LIVE_REFRESH_TIMEOUT_SECONDS = 10
+LIVE_KEEPALIVE_SECONDS = 15
+
+# Upstream market data (Yahoo): bounded pool, hard timeout and circuit breaker
+UPSTREAM_MAX_WORKERS = 4
+UPSTREAM_TIMEOUT_SECONDS = 3
+UPSTREAM_FAILURE_THRESHOLD = 5
+UPSTREAM_RESET_SECONDS = 30
+LIVE_PRICE_FRESH_SECONDS = 15
+OPTION_CHAIN_FRESH_SECONDS = 60
+
+# Market-hours refresh scheduler (trackers/scheduling)
+MARKET_REFRESH_FAST_SECONDS = 120     # near the open/close, expiring or near-the-money contracts
+MARKET_REFRESH_MEDIUM_SECONDS = 300   # expiring this week or within 5% of the money
+MARKET_REFRESH_BASE_SECONDS = 900
+MARKET_EDGE_MINUTES = 30
+ISSUER_PUBLISH_TIMES = {              # exchange time, files are downloaded once after this
+    "YieldMax": "17:00",
+    "Defiance": "17:30",
+}
+
+# Options risk (trackers/analytics): Black-Scholes inputs
+RISK_FREE_RATE = 0.04
+DEFAULT_VOLATILITY = 0.6   # used when a position's entry premium can't be inverted to a vol
+
+# Position history buckets: months that ended more than this many days ago get packed
+POSITION_HISTORY_COMPACT_AFTER_DAYS = 35
+
+# Profit summaries (trackers/ledger): incremental rollups re-read trades saved this long before
+# their last run, and finished periods are frozen this many days after they end
+ROLLUP_LOOKBACK_MINUTES = 10
+PERIOD_CLOSE_GRACE_DAYS = 1
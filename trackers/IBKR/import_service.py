@@ -1,6 +1,8 @@
 from .csv_reader import CsvReader
 from .option_mapper import OptionMapper
 from .option_saver import OptionSaver
+from trackers.ledger.summaries import deferred_summaries
+from trackers.analytics.dashboards import warm_after_commit
 
 
 class OptionImportService:
@@ -8,12 +10,17 @@ class OptionImportService:
         self.reader = CsvReader(filepath)
         self.mapper = OptionMapper()
         self.saver = OptionSaver(user)
+        self.user = user
 
     def run(self):
         rows = self.reader.read_rows()
+        trades = []
         for row in rows:
             if row["DataDiscriminator"] != "Order":
                 continue  # Skip headers or non-trade lines
             data = self.mapper.parse_option_string(row["Symbol"])
-            self.saver.save(row, data)
+            trades.append(self.saver.resolve(row, data))
             print(row)
+        with deferred_summaries():
+            self.saver.save(trades)
+        warm_after_commit(self.user.id)
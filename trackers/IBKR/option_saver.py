@@ -2,12 +2,14 @@ import datetime
 from decimal import Decimal
 from trackers.models import Fund, Option, Trade, Position, UnderlyingAsset, BrokerAccount
 from trackers.utils import update_fund_summary
+from trackers.ledger.locking import lock_books
 
 class OptionSaver:
     def __init__(self, user):
         self.user = user
 
-    def save(self, row, parsed):
+    def resolve(self, row, parsed):
+        """The (fund, option, trade fields) for one statement row, creating the fund and option if needed."""
         quantity = int(float(row["Quantity"]))
         price = Decimal(row["T. Price"])
         trade_date = datetime.datetime.strptime(row["Date/Time"], "%Y-%m-%d, %H:%M:%S")
@@ -36,22 +38,33 @@ class OptionSaver:
             }
         )
 
-        # Save Trade
-        trade, trade_created = Trade.objects.get_or_create(
-            option=option,
-            trade_type=trade_type,
-            quantity=abs(quantity),
-            price=price,
-            date=trade_date,
-            commission=commission,
-        )
+        trade = {
+            "trade_type": trade_type,
+            "quantity": abs(quantity),
+            "price": price,
+            "date": trade_date,
+            "commission": commission,
+        }
+        return fund, option, trade
+
+    def save(self, rows):
+        return save_trades(rows)
+
 
-        # profit summary for the fund
-        update_fund_summary(fund, trade.date, trade.total_price)
-        # total profit for the fund
-        fund.total_profit += trade.total_price
-        if trade_created:
-            # Get or create Position
-            position = Position.objects.process_trade(fund, option, trade)
-            trade.position = position
-            trade.save()
+def save_trades(rows):
+    """
+    Write the (fund, option, trade fields) rows of one statement and replay the new trades into
+    positions. Every book's lock is taken up front, in one sorted lock_books call, so two imports
+    of overlapping statements can't deadlock on each other. Returns the trades it created.
+    """
+    created = []
+    with lock_books((fund.id, option.id) for fund, option, _ in rows):
+        for fund, option, fields in rows:
+            trade, trade_created = Trade.objects.get_or_create(option=option, **fields)
+            if trade_created:
+                # profit summaries and total profit for the fund (re-imported trades are already counted)
+                update_fund_summary(fund, trade.date, trade.total_price)
+                created.append((fund, option, trade))
+        if created:
+            Position.objects.process_trades(created)
+    return [trade for _, _, trade in created]
@@ -2,8 +2,10 @@ from abc import ABC, abstractmethod
 import pandas as pd
 from datetime import datetime, date
 from decimal import Decimal
-from trackers.models import Fund, Option, Trade, Position, UnderlyingAsset, BrokerAccount, Holding
-from trackers.utils import update_fund_summary
+from trackers.models import Fund, Option, UnderlyingAsset, BrokerAccount, Holding
+from trackers.IBKR.option_saver import save_trades
+from trackers.ledger.summaries import deferred_summaries
+from trackers.analytics.dashboards import warm_after_commit
 # read file and saving to DB is same process for all brokers(WS, IBKR...)
 class base_parser(ABC):
     def __init__(self, file_path, user):
@@ -11,6 +13,7 @@ class base_parser(ABC):
         self.user = user
 
     def save_to_db(self, row, parsed):
+        """The (fund, option, trade fields) for one option row, written with the rest by save_trades."""
         quantity = int(float(row["Quantity"]))
         price = Decimal(row["TradePrice"])
         if isinstance(row["DateTime"], pd.Timestamp):
@@ -43,25 +46,14 @@ class base_parser(ABC):
             }
         )
 
-        # Save Trade
-        trade, trade_created = Trade.objects.get_or_create(
-            option=option,
-            trade_type=trade_type,
-            quantity=abs(quantity),
-            price=price,
-            date=trade_date,
-            commission=commission,
-        )
-        if trade_created:
-            # profit summary for the fund
-            update_fund_summary(fund, trade.date, trade.total_price)
-            # total profit for the fund
-            fund.total_profit += trade.total_price
-        
-            # Get or create Position
-            position = Position.objects.process_trade(fund, option, trade)
-            trade.position = position
-            trade.save()
+        trade = {
+            "trade_type": trade_type,
+            "quantity": abs(quantity),
+            "price": price,
+            "date": trade_date,
+            "commission": commission,
+        }
+        return fund, option, trade
 
     def read_file(self):
         # Step 1: Find the Trades header line + start index
@@ -122,19 +114,24 @@ class IBKR_parser(base_parser):
         pass
     def parse_and_save(self):
         trades = self.read_file()
-        for _, row in trades.iterrows():   # iterate rows
-            _row = row.to_dict()
-            print(row.to_dict(), _row["Symbol"])
-            if _row["Type"] == "Data":
-                if _row["AssetCategory"] == 'Equity and Index Options' and len(_row["Symbol"]) > 12:
-                    # save to options
-                    parsed_data = self.parse_option_string(_row["Symbol"])
-                    self.save_to_db(_row, parsed_data)
-                elif _row["AssetCategory"] == 'Stocks':
-                    # Save to Holdings only
-                    self.save_holdings(_row)
-            else:
-                pass
+        options = []
+        # one transaction for the file, fund summaries are written once at the end
+        with deferred_summaries():
+            for _, row in trades.iterrows():   # iterate rows
+                _row = row.to_dict()
+                print(row.to_dict(), _row["Symbol"])
+                if _row["Type"] == "Data":
+                    if _row["AssetCategory"] == 'Equity and Index Options' and len(_row["Symbol"]) > 12:
+                        # collected, saved below with every book locked at once
+                        parsed_data = self.parse_option_string(_row["Symbol"])
+                        options.append(self.save_to_db(_row, parsed_data))
+                    elif _row["AssetCategory"] == 'Stocks':
+                        # Save to Holdings only
+                        self.save_holdings(_row)
+                else:
+                    pass
+            save_trades(options)
+        warm_after_commit(self.user.id)
     def save_holdings(self, row):
         broker, broker_created = BrokerAccount.objects.get_or_create(user=self.user, broker_name="IBKR")
         fund, fund_created = Fund.objects.get_or_create(name=row["Symbol"], broker_account=broker)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from trackers.models import Fund, Option, Trade, Position, UnderlyingAsset, Company, PositionHistory, FundProfitSummary, CompanyProfitSummary, Holding, HoldingSnapshot, BrokerAccount
+from trackers.models import Fund, Option, Trade, Position, UnderlyingAsset, Company, PositionHistoryBucket, ProfitSnapshot, FundRanking, FundProfitSummary, CompanyProfitSummary, Holding, HoldingSnapshot, BrokerAccount
 
 admin.site.register(Fund)
 admin.site.register(Option)
@@ -7,8 +7,10 @@ admin.site.register(Trade)
 admin.site.register(Position)
 admin.site.register(UnderlyingAsset)
 admin.site.register(Company)
-admin.site.register(PositionHistory)
+admin.site.register(PositionHistoryBucket)
 admin.site.register(FundProfitSummary)
+admin.site.register(ProfitSnapshot)
+admin.site.register(FundRanking)
 admin.site.register(CompanyProfitSummary)
 admin.site.register(Holding)
 admin.site.register(HoldingSnapshot)
@@ -0,0 +1,201 @@
+"""
+Per-user dashboard pages, computed once and served from the cache until the user's data changes.
+
+The user dashboard and each broker page are cached as their template context under the
+user's version token, the same scheme as the fund chart series (analytics/series.py). Anything
+that changes what those pages show gives the owning user a new token after commit:
+
+* saves and deletes of trades, positions, holdings, funds and broker accounts (signals below),
+* the bulk paths that skip signals: summary upserts and rollups (ledger/summaries.py,
+  ledger/rollups.py), the position replay, settlement and ledger rebuilds,
+* live price refreshes of the assets the user holds (scheduling/planner.py).
+
+Calls made inside one transaction are merged and resolved to users with at most one query per
+kind of id when it commits, so an import that saves thousands of rows bumps each user once.
+After an import the pages are rebuilt by a celery task (analytics/tasks.py), so the next view
+is already a cache hit. Entries expire after DASHBOARD_CACHE_TTL seconds regardless.
+
+Most of the bumps and the warming happen in celery workers, so this only works with a cache
+the web and worker processes share (CACHES in settings).
+"""
+import logging
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Prefetch, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from trackers.models import BrokerAccount, Fund, Holding, Position, Trade
+
+logger = logging.getLogger(__name__)
+
+TOTALS = ("weekly", "monthly", "yearly", "total_all_time_options", "combined_total_all_time", "holding_profit_loss")
+
+_pending = threading.local()
+
+
+def version_key(user_id):
+    return f"dashboard-version:{user_id}"
+
+
+def dashboard_version(user_id):
+    """The user's current cache token, created on first use."""
+    version = cache.get(version_key(user_id))
+    if version is None:
+        cache.add(version_key(user_id), time.time_ns(), None)
+        version = cache.get(version_key(user_id))
+    return version
+
+
+def _owners(changes):
+    """The ids of the users owning everything in `changes`."""
+    user_ids = set(changes["user"])
+    if changes["fund"]:
+        user_ids.update(Fund.objects.filter(id__in=changes["fund"]).values_list("broker_account__user_id", flat=True))
+    if changes["broker"]:
+        user_ids.update(BrokerAccount.objects.filter(id__in=changes["broker"]).values_list("user_id", flat=True))
+    if changes["asset"]:
+        user_ids.update(Holding.objects.filter(asset_id__in=changes["asset"], quantity__gt=0)
+                        .values_list("broker_account__user_id", flat=True))
+    user_ids.discard(None)
+    return user_ids
+
+
+def _bump():
+    changes, _pending.changes = getattr(_pending, "changes", None), None
+    # the first callback to run takes everything merged so far, the rest find nothing to do
+    user_ids = _owners(changes) if changes else ()
+    if user_ids:
+        token = time.time_ns()
+        cache.set_many({version_key(user_id): token for user_id in user_ids}, None)
+
+
+def invalidate_dashboards(user_ids=(), fund_ids=(), broker_ids=(), asset_ids=()):
+    """
+    Give the owners of these users, funds, broker accounts or held assets new tokens once the
+    current transaction commits. Calls within one transaction are resolved and bumped together.
+    """
+    changes = getattr(_pending, "changes", None)
+    if changes is None:
+        changes = _pending.changes = {"user": set(), "fund": set(), "broker": set(), "asset": set()}
+    for kind, ids in (("user", user_ids), ("fund", fund_ids), ("broker", broker_ids), ("asset", asset_ids)):
+        changes[kind].update(ids)
+    transaction.on_commit(_bump)
+
+
+def _funds():
+    return (Fund.objects.select_related("broker_account").with_period_profits()
+            .annotate(active_positions_total=Count("positions", filter=Q(positions__active=True))))
+
+
+def user_dashboard_context(user_id):
+    """Every account's P&L with the user's totals, funds and holdings."""
+    # every account's P&L comes annotated on the account, one query however many funds
+    broker_accounts = list(BrokerAccount.objects.filter(user_id=user_id).with_profit_summaries())
+    accounts = [{"broker": broker, "summary": broker.profit_summary} for broker in broker_accounts]
+    totals = {key: sum((account["summary"][key] for account in accounts), Decimal("0.00")) for key in TOTALS}
+    return {
+        "accounts": accounts,
+        "funds": list(_funds().filter(broker_account__in=broker_accounts)),
+        "user_total_weekly_profit": totals["weekly"],
+        "user_total_monthly_profit": totals["monthly"],
+        "user_total_yearly_profit": totals["yearly"],
+        "user_total_all_time_profit": totals["total_all_time_options"],
+        "combined_total_all_time": totals["combined_total_all_time"],
+        "holding_total_all_time": totals["holding_profit_loss"],
+        "holdings": list(Holding.objects.filter(fund__broker_account__in=broker_accounts)
+                         .select_related("fund__broker_account", "asset")),
+        "brokers": broker_accounts,
+    }
+
+
+def broker_dashboard_context(user_id, broker_id):
+    """One account's P&L, funds, holdings and open positions, None if the user has no such account."""
+    broker = BrokerAccount.objects.with_profit_summaries().filter(id=broker_id, user_id=user_id).first()
+    if broker is None:
+        return None
+    funds = _funds().filter(broker_account=broker).prefetch_related(
+        Prefetch("holdings", queryset=Holding.objects.filter(quantity__gt=0, fund__broker_account=broker)
+                 .select_related("asset")),
+        Prefetch("positions", queryset=Position.objects.filter(active=True, fund__broker_account=broker)),
+    )
+    summary = broker.profit_summary
+    return {
+        "broker": broker,
+        "funds": list(funds),
+        "user_total_weekly_profit": summary["weekly"],
+        "user_total_monthly_profit": summary["monthly"],
+        "user_total_yearly_profit": summary["yearly"],
+        "user_total_all_time_profit": summary["total_all_time_options"],
+        "combined_total_all_time": summary["combined_total_all_time"],
+        "holding_total_all_time": summary["holding_profit_loss"],
+    }
+
+
+def _cached(user_id, name, build):
+    # the current week, month and year move at midnight whether or not anything was written
+    key = f"dashboard:{name}:{user_id}:{dashboard_version(user_id)}:{timezone.localdate().isoformat()}"
+    context = cache.get(key)
+    if context is None:
+        context = build()
+        if context is not None:
+            cache.set(key, context, getattr(settings, "DASHBOARD_CACHE_TTL", 60 * 60))
+    return context
+
+
+def user_dashboard(user_id):
+    return _cached(user_id, "user", lambda: user_dashboard_context(user_id))
+
+
+def broker_dashboard(user_id, broker_id):
+    return _cached(user_id, f"broker-{broker_id}", lambda: broker_dashboard_context(user_id, broker_id))
+
+
+def warm(user_id):
+    """Build the user's dashboard and broker pages into the cache. Returns the number of pages."""
+    user_dashboard(user_id)
+    broker_ids = list(BrokerAccount.objects.filter(user_id=user_id).values_list("id", flat=True))
+    for broker_id in broker_ids:
+        broker_dashboard(user_id, broker_id)
+    return 1 + len(broker_ids)
+
+
+def warm_after_commit(user_id):
+    """Queue `warm` for the user once the import's transaction commits (after its bump)."""
+    from .tasks import warm_dashboards
+
+    def queue():
+        try:
+            warm_dashboards.delay(user_id)
+        except Exception as e:
+            # no broker reachable, the first view builds the pages instead
+            logger.warning(f"Could not queue dashboard warm-up for user {user_id}: {e}")
+
+    transaction.on_commit(queue)
+
+
+@receiver([post_save, post_delete], sender=Trade)
+def _trade_changed(sender, instance, **kwargs):
+    invalidate_dashboards(fund_ids=[instance.option.fund_id])
+
+
+@receiver([post_save, post_delete], sender=Position)
+@receiver([post_save, post_delete], sender=Holding)
+def _fund_row_changed(sender, instance, **kwargs):
+    invalidate_dashboards(fund_ids=[instance.fund_id])
+
+
+@receiver([post_save, post_delete], sender=Fund)
+def _fund_changed(sender, instance, **kwargs):
+    invalidate_dashboards(broker_ids=[instance.broker_account_id] if instance.broker_account_id else ())
+
+
+@receiver([post_save, post_delete], sender=BrokerAccount)
+def _broker_changed(sender, instance, **kwargs):
+    invalidate_dashboards(user_ids=[instance.user_id])
@@ -0,0 +1,121 @@
+"""
+Vectorised Black-Scholes pricing, implied volatility and Greeks.
+
+Everything works on NumPy arrays, one element per contract, so a whole book is priced in a
+handful of array operations. Inputs are per share: spot, strike, time to expiry in years,
+rate and volatility as decimals, and `is_call` as a boolean array. No dividends.
+"""
+import numpy as np
+
+SQRT_2PI = np.sqrt(2.0 * np.pi)
+
+# Abramowitz & Stegun 7.1.26, good to ~1.5e-7 which is plenty for pricing
+_P = 0.3275911
+_A = (0.254829592, -0.284496736, 1.421413741, -1.453152027, 1.061405429)
+
+VOL_FLOOR = 1e-4
+VOL_CAP = 5.0
+
+
+def norm_pdf(x):
+    return np.exp(-0.5 * x * x) / SQRT_2PI
+
+
+def norm_cdf(x):
+    z = np.abs(x) / np.sqrt(2.0)
+    t = 1.0 / (1.0 + _P * z)
+    poly = t * (_A[0] + t * (_A[1] + t * (_A[2] + t * (_A[3] + t * _A[4]))))
+    erf = 1.0 - poly * np.exp(-z * z)
+    return 0.5 * (1.0 + np.sign(x) * erf)
+
+
+def _d1_d2(spot, strike, years, rate, vol):
+    root = vol * np.sqrt(years)
+    d1 = (np.log(spot / strike) + (rate + 0.5 * vol * vol) * years) / root
+    return d1, d1 - root
+
+
+def price(spot, strike, years, rate, vol, is_call):
+    """Black-Scholes premium per share. Contracts at or past expiry are worth intrinsic value."""
+    live = years > 0
+    t = np.where(live, years, 1.0)
+    d1, d2 = _d1_d2(spot, strike, t, rate, vol)
+    discount = strike * np.exp(-rate * t)
+    call = spot * norm_cdf(d1) - discount * norm_cdf(d2)
+    put = discount * norm_cdf(-d2) - spot * norm_cdf(-d1)
+    value = np.where(is_call, call, put)
+    intrinsic = np.where(is_call, np.maximum(spot - strike, 0.0), np.maximum(strike - spot, 0.0))
+    return np.where(live, value, intrinsic)
+
+
+def implied_vol(premium, spot, strike, years, rate, is_call, iterations=40, tolerance=1e-6):
+    """
+    Implied volatility for every contract at once: Newton steps, falling back to bisection
+    whenever a step leaves the bracket or vega is too flat to trust. Contracts whose premium
+    is outside the no-arbitrage bounds (or already expired) come back as NaN.
+    """
+    premium, spot, strike, years = (np.asarray(a, dtype=float) for a in (premium, spot, strike, years))
+    is_call = np.asarray(is_call, dtype=bool)
+
+    discount = strike * np.exp(-rate * np.maximum(years, 0.0))
+    lower = np.where(is_call, np.maximum(spot - discount, 0.0), np.maximum(discount - spot, 0.0))
+    upper = np.where(is_call, spot, discount)
+    solvable = (years > 0) & (premium > lower) & (premium < upper)
+
+    lo = np.full(premium.shape, VOL_FLOOR)
+    hi = np.full(premium.shape, VOL_CAP)
+    vol = np.full(premium.shape, 0.5)
+    active = solvable.copy()
+    t = np.where(years > 0, years, 1.0)
+
+    for _ in range(iterations):
+        if not active.any():
+            break
+        diff = price(spot, strike, t, rate, vol, is_call) - premium
+        converged = np.abs(diff) < tolerance
+        active &= ~converged
+
+        # Keep the bracket around the root: price increases with vol
+        hi = np.where(active & (diff > 0), vol, hi)
+        lo = np.where(active & (diff < 0), vol, lo)
+
+        d1, _ = _d1_d2(spot, strike, t, rate, vol)
+        vega = spot * norm_pdf(d1) * np.sqrt(t)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            newton = vol - diff / vega
+        use_newton = (vega > 1e-8) & (newton > lo) & (newton < hi)
+        vol = np.where(active, np.where(use_newton, newton, 0.5 * (lo + hi)), vol)
+
+    return np.where(solvable, vol, np.nan)
+
+
+def greeks(spot, strike, years, rate, vol, is_call):
+    """
+    Per-share delta, gamma, theta (per year) and vega (per 1.00 of vol) as a dict of arrays.
+    Expired contracts get their intrinsic delta and zero for the rest.
+    """
+    spot, strike, years, vol = (np.asarray(a, dtype=float) for a in (spot, strike, years, vol))
+    is_call = np.asarray(is_call, dtype=bool)
+    live = (years > 0) & (vol > 0)
+    t = np.where(live, years, 1.0)
+    v = np.where(live, vol, 1.0)
+
+    d1, d2 = _d1_d2(spot, strike, t, rate, v)
+    pdf = norm_pdf(d1)
+    root_t = np.sqrt(t)
+    discount = strike * np.exp(-rate * t)
+
+    delta = np.where(is_call, norm_cdf(d1), norm_cdf(d1) - 1.0)
+    gamma = pdf / (spot * v * root_t)
+    vega = spot * pdf * root_t
+    decay = -spot * pdf * v / (2.0 * root_t)
+    theta = np.where(is_call, decay - rate * discount * norm_cdf(d2), decay + rate * discount * norm_cdf(-d2))
+
+    itm = np.where(is_call, spot > strike, spot < strike)
+    expired_delta = np.where(itm, np.where(is_call, 1.0, -1.0), 0.0)
+    return {
+        "delta": np.where(live, delta, expired_delta),
+        "gamma": np.where(live, gamma, 0.0),
+        "theta": np.where(live, theta, 0.0),
+        "vega": np.where(live, vega, 0.0),
+    }
@@ -0,0 +1,72 @@
+"""
+Best and worst issuer funds per company, ranked in the database.
+
+Each fund's profit for the current week, month and year comes from its summary row (0 if it
+has none, see FundQuerySet.with_period_profits) and all time is Fund.total_profit. The ranks
+are RANK() window functions partitioned by company, best first and worst first, all from one
+SELECT over the funds. The result replaces the FundRanking table after every rollup refresh, so the dashboard reads the
+leaders of any number of companies with one query instead of ranking per request.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import Rank
+from django.utils import timezone
+
+from trackers.ledger.summaries import PERIODS, ZERO
+from trackers.models import Fund, FundRanking
+from trackers.parser.utils import get_week_range, get_month_range, get_year_range
+
+logger = logging.getLogger(__name__)
+
+
+def current_periods(today):
+    """{"week": (start, end), "month": ..., "year": ..., "all": (None, None)}"""
+    ranges = (get_week_range(today), get_month_range(today), get_year_range(today))
+    return {**dict(zip(PERIODS, ranges)), "all": (None, None)}
+
+
+# the column each period is ranked on
+COLUMNS = {"week": "week_profit", "month": "month_profit", "year": "year_profit", "all": "total_profit"}
+
+
+def ranked_funds(today=None):
+    """
+    Every issuer fund with its profit and both ranks for each period, as
+    {"id": fund, "company_id": id, "<column>": profit, "<period>_rank": n, "<period>_reverse_rank": n}.
+    """
+    today = today or timezone.localdate()
+    funds = Fund.objects.filter(company__isnull=False).with_period_profits(today)
+
+    ranks = {}
+    for period, column in COLUMNS.items():
+        ranks[f"{period}_rank"] = Window(Rank(), partition_by=[F("company_id")], order_by=F(column).desc())
+        ranks[f"{period}_reverse_rank"] = Window(Rank(), partition_by=[F("company_id")], order_by=F(column).asc())
+    return current_periods(today), funds.annotate(**ranks).values("id", "company_id", *COLUMNS.values(), *ranks).order_by()
+
+
+@transaction.atomic
+def refresh_leaderboard(today=None):
+    """Replace every FundRanking with the current ranks. Returns the number of funds ranked."""
+    periods, rows = ranked_funds(today)
+    ranked_at = timezone.now()
+    rankings = [
+        FundRanking(
+            company_id=row["company_id"],
+            fund_id=row["id"],
+            period=period,
+            start_date=start,
+            end_date=end,
+            profit=row[COLUMNS[period]] or ZERO,
+            rank=row[f"{period}_rank"],
+            reverse_rank=row[f"{period}_reverse_rank"],
+            ranked_at=ranked_at,
+        )
+        for row in rows
+        for period, (start, end) in periods.items()
+    ]
+    FundRanking.objects.all().delete()
+    FundRanking.objects.bulk_create(rankings, batch_size=500)
+    logger.info("Ranked %s funds", len(rankings) // len(periods))
+    return len(rankings) // len(periods)
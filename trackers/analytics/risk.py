@@ -0,0 +1,122 @@
+"""
+Net Greeks for open option positions, per fund and per broker account.
+
+Positions carry the premium they were opened at but we don't store option quotes, so each
+contract's volatility is implied from its entry: the premium against the position's entry_spot
+(the underlying when its opening trade was recorded, or the live price if there is none) and
+the time to expiry on the opening date. Greeks are then taken at today's live price and time to expiry with that vol.
+Contracts whose entry premium can't be inverted fall back to DEFAULT_VOLATILITY.
+
+Exposures are in position terms: shares of delta/gamma, dollars of theta per calendar day and
+dollars of vega per vol point, negative for short positions.
+"""
+import math
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from trackers.models import Position
+from . import greeks as bs
+
+MULTIPLIER = 100
+SHORT_TYPES = ("S", "SS")
+GREEKS = ("delta", "gamma", "theta", "vega")
+
+COLUMNS = (
+    "id", "fund_id", "fund__name", "fund__broker_account_id", "fund__broker_account__broker_name",
+    "trade_type", "remaining_quantity", "average_price", "date",
+    "option__type", "option__strike_price", "option__expiration_date",
+    "entry_spot", "option__underlying_asset__live_price",
+)
+
+
+def _floats(values):
+    return np.array([math.nan if value is None else float(value) for value in values], dtype=float)
+
+
+def position_exposures(rows, today, rate=None, default_vol=None):
+    """
+    Vectorised Greeks for `rows` (tuples in COLUMNS order). Returns a dict of arrays, one
+    element per row, with the position-level exposures plus "iv" and "priced".
+    """
+    rate = getattr(settings, "RISK_FREE_RATE", 0.04) if rate is None else rate
+    default_vol = getattr(settings, "DEFAULT_VOLATILITY", 0.6) if default_vol is None else default_vol
+
+    columns = dict(zip(COLUMNS, zip(*rows))) if rows else {name: () for name in COLUMNS}
+    strike = _floats(columns["option__strike_price"])
+    live = _floats(columns["option__underlying_asset__live_price"])
+    snapshot = _floats(columns["entry_spot"])
+    premium = _floats(columns["average_price"])
+    quantity = np.array(columns["remaining_quantity"], dtype=float)
+    is_call = np.array([kind == "C" for kind in columns["option__type"]], dtype=bool)
+    sign = np.array([-1.0 if kind in SHORT_TYPES else 1.0 for kind in columns["trade_type"]], dtype=float)
+
+    expiry = np.array(columns["option__expiration_date"], dtype="datetime64[D]")
+    opened = np.array(columns["date"], dtype="datetime64[D]")
+    now = np.datetime64(today, "D")
+    years_at_entry = (expiry - opened).astype(float) / 365.0
+    years_left = (expiry - now).astype(float) / 365.0
+
+    entry_spot = np.where(np.isnan(snapshot), live, snapshot)
+    iv = bs.implied_vol(premium, entry_spot, strike, years_at_entry, rate, is_call)
+    iv = np.where(np.isnan(iv), default_vol, iv)
+
+    priced = ~np.isnan(live) & (live > 0) & (strike > 0)
+    spot = np.where(priced, live, strike)  # placeholder for unpriced rows, their size is zero
+    per_share = bs.greeks(spot, strike, years_left, rate, iv, is_call)
+
+    size = np.where(priced, sign * quantity * MULTIPLIER, 0.0)
+    return {
+        "delta": per_share["delta"] * size,
+        "gamma": per_share["gamma"] * size,
+        "theta": per_share["theta"] / 365.0 * size,
+        "vega": per_share["vega"] / 100.0 * size,
+        "iv": iv,
+        "priced": priced,
+    }
+
+
+def _sum_by(keys, exposures):
+    """Sum every Greek by group key in one bincount each. Returns {key: {greek: value}}."""
+    unique, index = np.unique(np.asarray(keys), return_inverse=True)
+    sums = {name: np.bincount(index, weights=exposures[name], minlength=len(unique)) for name in GREEKS}
+    return {
+        int(key): {name: round(float(sums[name][i]), 4) for name in GREEKS}
+        for i, key in enumerate(unique)
+    }
+
+
+def book_greeks(positions, today=None):
+    """Net Greeks of a Position queryset, per broker account and fund, with totals."""
+    today = today or timezone.localdate()
+    rows = list(positions.filter(active=True, remaining_quantity__gt=0).values_list(*COLUMNS))
+    exposures = position_exposures(rows, today)
+
+    result = {
+        "as_of": today.isoformat(),
+        "positions": len(rows),
+        "unpriced": int((~exposures["priced"]).sum()),
+        "total": {name: round(float(exposures[name].sum()), 4) for name in GREEKS},
+        "brokers": [],
+    }
+    if not rows:
+        return result
+
+    by_fund = _sum_by([row[1] for row in rows], exposures)
+    by_broker = _sum_by([row[3] or 0 for row in rows], exposures)
+
+    brokers = OrderedDict()
+    for row in rows:
+        fund_id, fund_name, broker_id, broker_name = row[1], row[2], row[3] or 0, row[4]
+        broker = brokers.setdefault(broker_id, {"id": broker_id, "name": broker_name, **by_broker[broker_id], "funds": {}})
+        broker["funds"].setdefault(fund_id, {"id": fund_id, "name": fund_name, **by_fund[fund_id]})
+    for broker in brokers.values():
+        broker["funds"] = list(broker["funds"].values())
+    result["brokers"] = list(brokers.values())
+    return result
+
+
+def user_greeks(user, today=None):
+    return book_greeks(Position.objects.filter(fund__broker_account__user=user), today=today)
@@ -0,0 +1,90 @@
+"""
+Profit time series for the fund charts, served from the summary rows.
+
+FundProfitSummary already holds one row per fund and week, month or year, so a series is just
+the rows of one period kind in date order. Results are cached per fund under a version token
+that every summary write for the fund replaces (after commit), which also gives the endpoint
+a cheap ETag: same token and parameters, same body.
+
+The rollup, settlement and rebuild tasks replace tokens from celery workers, so the cache has
+to be the one the web processes read (CACHES in settings), or a stale series keeps its ETag
+for up to SERIES_TTL.
+"""
+import time
+from itertools import accumulate
+
+from django.core.cache import cache
+from django.db import transaction
+
+from trackers.ledger.summaries import PERIODS, PROFIT_FIELDS, period_of
+from trackers.models import FundProfitSummary
+
+SERIES_TTL = 60 * 60 * 24
+
+
+def version_key(fund_id):
+    return f"fund-series-version:{fund_id}"
+
+
+def series_version(fund_id):
+    """The fund's current cache token, created on first use."""
+    version = cache.get(version_key(fund_id))
+    if version is None:
+        cache.add(version_key(fund_id), time.time_ns(), None)
+        version = cache.get(version_key(fund_id))
+    return version
+
+
+def invalidate_fund_series(fund_ids):
+    """Give every fund in `fund_ids` a new token once the current transaction commits."""
+    fund_ids = set(fund_ids)
+    if not fund_ids:
+        return
+
+    def bump():
+        token = time.time_ns()
+        cache.set_many({version_key(fund_id): token for fund_id in fund_ids}, None)
+
+    transaction.on_commit(bump)
+
+
+def fund_series(fund_id, period="week", start=None, end=None, cumulative=False):
+    """
+    {"labels": [period start, ...], "profit": [...]} for one period kind, optionally limited to
+    periods inside start..end and summed up as a running total.
+    """
+    column = PROFIT_FIELDS[PERIODS.index(period)]
+    rows = FundProfitSummary.objects.filter(fund_id=fund_id)
+    if start:
+        rows = rows.filter(start_date__gte=start)
+    if end:
+        rows = rows.filter(end_date__lte=end)
+
+    labels, profit = [], []
+    for period_start, period_end, value in rows.order_by("start_date").values_list("start_date", "end_date", column):
+        if period_of(period_start, period_end) == period:
+            labels.append(period_start.isoformat())
+            profit.append(float(value))
+    if cumulative:
+        profit = list(accumulate(profit))
+    return {
+        "fund": fund_id,
+        "period": period,
+        "cumulative": cumulative,
+        "labels": labels,
+        "profit": [round(value, 2) for value in profit],
+    }
+
+
+def series_token(fund_id, period="week", start=None, end=None, cumulative=False):
+    """Identifies one version of one series, used as both cache key and ETag."""
+    return f"{fund_id}-{series_version(fund_id)}-{period}-{start or ''}-{end or ''}-{int(cumulative)}"
+
+
+def cached_fund_series(fund_id, period="week", start=None, end=None, cumulative=False):
+    key = f"fund-series:{series_token(fund_id, period, start, end, cumulative)}"
+    series = cache.get(key)
+    if series is None:
+        series = fund_series(fund_id, period, start, end, cumulative)
+        cache.set(key, series, SERIES_TTL)
+    return series
@@ -0,0 +1,18 @@
+import logging
+
+from celery import shared_task
+
+from . import dashboards
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def warm_dashboards(user_id):
+    """Rebuild a user's dashboard and broker pages into the cache, after an import."""
+    try:
+        pages = dashboards.warm(user_id)
+        return f"Warmed {pages} dashboard pages for user {user_id}"
+    except Exception as e:
+        logger.error(f"Failed to warm dashboards for user {user_id}: {e}", exc_info=True)
+        return "Dashboard warm-up failed"
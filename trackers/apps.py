@@ -6,6 +6,11 @@ class TrackersConfig(AppConfig):
     name = 'trackers'
 
     def ready(self):
+        # cached dashboards are invalidated by model signals, in every process
+        from .analytics import dashboards  # noqa: F401
+        # profiles of the tasks that ask for one (see instrumentation/celery_hooks.py)
+        from .instrumentation import celery_hooks  # noqa: F401
+
         # Only run this when running server or celery worker, to avoid migrations errors or other commands
         if not (('runserver' in sys.argv) or ('celery' in sys.argv)):
             return
@@ -13,22 +18,54 @@ class TrackersConfig(AppConfig):
         from django_celery_beat.models import PeriodicTask, CrontabSchedule
         import json
 
-        # Create or get crontab schedule for 9 PM Monday-Friday Toronto time
-        schedule, _ = CrontabSchedule.objects.get_or_create(
-            minute='*',          # every minute
-            hour='*',
+        # Market data is only refreshed in exchange hours, the task itself decides which
+        # underlyings are due (see trackers/scheduling/planner.py)
+        market_hours, _ = CrontabSchedule.objects.get_or_create(
+            minute='*',
+            hour='9-16',
+            day_of_week='1-5',
+            day_of_month='*',
+            month_of_year='*',
+            timezone='America/New_York',
+        )
+        # Issuer files are published in the evening, the task downloads each one once per day
+        evenings, _ = CrontabSchedule.objects.get_or_create(
+            minute='*/15',
+            hour='17-23',
+            day_of_week='1-5',
+            day_of_month='*',
+            month_of_year='*',
+            timezone='America/New_York',
+        )
+
+        # Quiet hours, once a day
+        nightly, _ = CrontabSchedule.objects.get_or_create(
+            minute='30',
+            hour='3',
             day_of_week='*',
             day_of_month='*',
             month_of_year='*',
+            timezone='America/New_York',
         )
 
-        # Create or update the periodic task for your scraper task
-        PeriodicTask.objects.update_or_create(
-            name='process company file',
-            defaults={
-                'crontab': schedule,
-                'task': 'trackers.tasks.download_and_process_chain',
-                'args': json.dumps([]),
-                'enabled': True,
-            }
-        )
\ No newline at end of file
+        periodic_tasks = [
+            ('refresh market data', 'trackers.scheduling.tasks.refresh_market_data', market_hours),
+            ('download issuer files', 'trackers.scheduling.tasks.download_published_issuer_files', evenings),
+            ('settle expired positions', 'trackers.ledger.tasks.settle_expired_positions', nightly),
+            ('compact position history', 'trackers.ledger.tasks.compact_position_history', nightly),
+            ('refresh profit rollups', 'trackers.ledger.tasks.refresh_profit_rollups', nightly),
+            ('close profit periods', 'trackers.ledger.tasks.close_profit_periods', nightly),
+        ]
+        for name, task, schedule in periodic_tasks:
+            PeriodicTask.objects.update_or_create(
+                name=name,
+                defaults={
+                    'crontab': schedule,
+                    'task': task,
+                    'args': json.dumps([]),
+                    'enabled': True,
+                },
+            )
+
+        # Replaced by the tasks above, it used to fire every minute of every day
+        PeriodicTask.objects.filter(name='process company file').delete()
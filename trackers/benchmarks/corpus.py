@@ -0,0 +1,213 @@
+"""
+End-to-end benchmark on the real issuer files in media/excel_files.
+
+Every YieldMax and Defiance daily file in the weekly folders (the ones process_company_files
+walks, oldest first) goes through the issuer parser's stages, timed and query-counted per
+stage over the whole corpus:
+
+  read, parse, resolve, write, position, summary    see trackers/parser/base_parser.py
+
+then every IBKR activity statement under IBKR/ goes through IBKR_parser.parse_and_save for a
+separate user. Each stage reports rows per second; the total adds the query count and the
+process' peak RSS.
+
+The digest is a sha256 over what the load computed: trade and position counts, every fund's
+total and realised P&L, and the company summaries. Run on a fresh database it only changes
+when the parsers or the ledger compute something different, so the golden file saved with
+--save catches P&L regressions along with the speed ones.
+"""
+import contextlib
+import csv
+import hashlib
+import io
+import json
+import time
+import warnings
+from decimal import Decimal
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+
+from trackers.data_parser import ParserFactory as IssuerParserFactory
+from trackers.file_manager import YieldMaxFileManager
+from trackers.IBKR.parser import ParserFactory
+from trackers.models import CompanyProfitSummary, Fund, Position, Trade
+from .harness import QueryCounter
+from .suite import environment
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ISSUERS = ("YieldMax", "Defiance")
+STAGES = ("read", "parse", "resolve", "write", "position", "summary")
+CENT = Decimal("0.01")
+
+
+def corpus_files(root):
+    """[(company, path), ...] for every issuer file in the weekly folders, oldest first per company."""
+    files = []
+    for company in ISSUERS:
+        for folder in sorted((Path(root) / company).glob("202*-W*")):
+            paths = sorted(folder.glob("*.csv"),
+                           key=lambda path: (YieldMaxFileManager.extract_date_from_filename(path), path.name))
+            files += [(company, path) for path in paths]
+    return files
+
+
+def peak_rss_mb():
+    """The process' peak resident set size so far, in MB (None where the platform can't tell)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if peak > 1 << 32 else 1024), 1)
+
+
+class Stage:
+    def __init__(self, label):
+        self.label = label
+        self.seconds = 0.0
+        self.items = 0
+        self.counter = QueryCounter()
+
+    @contextlib.contextmanager
+    def timed(self):
+        start = time.perf_counter()
+        with connection.execute_wrapper(self.counter):
+            yield self
+        self.seconds += time.perf_counter() - start
+
+    def result(self):
+        return {
+            "label": self.label,
+            "seconds": round(self.seconds, 4),
+            "queries": self.counter.count,
+            "db_seconds": round(self.counter.seconds, 4),
+            "items": self.items,
+        }
+
+
+def _statement_rows(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return sum(1 for row in csv.reader(f) if row[:3] == ["Trades", "Data", "Order"])
+
+
+def load_corpus(root):
+    """
+    Load the corpus under `root` into the current database. Returns a result per stage (see
+    harness.measure) and a "corpus total" one with the file count and peak RSS.
+    """
+    stages = {name: Stage(f"corpus {name}") for name in STAGES}
+    files = corpus_files(root)
+    for company, path in files:
+        parser = IssuerParserFactory.get_parser(company)
+        # the same stages, in the same transaction, as parser.parse_csv
+        with stages["read"].timed() as stage:
+            rows = parser.read(path)
+            stage.items += len(rows)
+        with stages["parse"].timed() as stage:
+            records = parser.parse(rows)
+            stage.items += len(rows)
+        with transaction.atomic():
+            with stages["resolve"].timed() as stage:
+                resolved = parser.resolve(records)
+                stage.items += len(records)
+            with stages["write"].timed() as stage:
+                entries = parser.write(resolved)
+                stage.items += len(entries)
+            with stages["position"].timed() as stage:
+                parser.position(entries)
+                stage.items += len(entries)
+            with stages["summary"].timed() as stage:
+                parser.summarise(entries)
+                stage.items += len(entries)
+    results = [stages[name].result() for name in STAGES]
+
+    statements = sorted((Path(root) / "IBKR").glob("*.csv"))
+    if statements:
+        ibkr = Stage("corpus ibkr import")
+        user, _ = User.objects.get_or_create(username="corpus-ibkr")
+        for path in statements:
+            parser = ParserFactory.get_parser("IBKR", str(path), user)
+            # the parser prints every row and hands Django naive statement times
+            with ibkr.timed(), contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+                warnings.filterwarnings("ignore", "DateTimeField .* received a naive datetime", RuntimeWarning)
+                parser.parse_and_save()
+            ibkr.items += _statement_rows(path)
+        results.append(ibkr.result())
+
+    results.append({
+        "label": "corpus total",
+        "seconds": round(sum(result["seconds"] for result in results), 4),
+        "queries": sum(result["queries"] for result in results),
+        "db_seconds": round(sum(result["db_seconds"] for result in results), 4),
+        "items": stages["read"].items,
+        "files": len(files) + len(statements),
+        "peak_rss_mb": peak_rss_mb(),
+    })
+    return results
+
+
+def snapshot():
+    """What the load computed, in a stable order: the input to `digest`."""
+    funds = Fund.objects.select_related("company", "broker_account").order_by(
+        "company__name", "broker_account__broker_name", "name")
+    # grouped per fund one table at a time, joining trades and positions in one query multiplies them
+    trades = dict(Trade.objects.order_by().values_list("option__fund_id").annotate(Count("id")))
+    open_positions = dict(Position.objects.filter(active=True).order_by().values_list("fund_id").annotate(Count("id")))
+    realised = dict(Position.objects.order_by().values_list("fund_id").annotate(Sum("profit_loss")))
+    return {
+        "trades": Trade.objects.count(),
+        "positions": Position.objects.count(),
+        "open_positions": Position.objects.filter(active=True).count(),
+        "funds": {
+            f"{fund.company or fund.broker_account.broker_name}/{fund.name}": [
+                trades.get(fund.id, 0), open_positions.get(fund.id, 0), _cents(fund.total_profit),
+                _cents(realised.get(fund.id)),
+            ]
+            for fund in funds
+        },
+        "companies": [
+            [name, str(start), str(end), _cents(weekly), _cents(monthly), _cents(annually)]
+            for name, start, end, weekly, monthly, annually in CompanyProfitSummary.objects.order_by(
+                "company__name", "start_date", "end_date",
+            ).values_list("company__name", "start_date", "end_date", "weekly_profit", "monthly_profit",
+                          "annually_profit")
+        ],
+    }
+
+
+def _cents(amount):
+    return str(Decimal(amount or 0).quantize(CENT))
+
+
+def digest(state):
+    return hashlib.sha256(json.dumps(state, sort_keys=True).encode()).hexdigest()
+
+
+def save_golden(path, results, state):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment(), "digest": digest(state), "results": results, "state": state},
+                  f, indent=2)
+
+
+def load_golden(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def state_changes(state, golden_state, limit=20):
+    """Human-readable differences between two snapshots, at most `limit` of them."""
+    changes = [f"{key}: {golden_state.get(key)} -> {state[key]}"
+               for key in ("trades", "positions", "open_positions") if state[key] != golden_state.get(key)]
+    old_funds = golden_state.get("funds", {})
+    for name in sorted(state["funds"].keys() | old_funds.keys()):
+        if state["funds"].get(name) != old_funds.get(name):
+            changes.append(f"{name}: {old_funds.get(name)} -> {state['funds'].get(name)}")
+    if state["companies"] != golden_state.get("companies"):
+        changes.append("company summaries differ")
+    return changes[:limit]
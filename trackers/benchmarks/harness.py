@@ -0,0 +1,78 @@
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+class QueryCounter:
+    """Counts queries and DB time without keeping the SQL around (safe for 100k-query runs)."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+
+
+@contextmanager
+def measure(results, label, **extra):
+    """Time the block and count its queries, appending a result dict to `results`."""
+    counter = QueryCounter()
+    start = time.perf_counter()
+    with connection.execute_wrapper(counter):
+        yield
+    seconds = time.perf_counter() - start
+    results.append({
+        "label": label,
+        "seconds": round(seconds, 4),
+        "queries": counter.count,
+        "db_seconds": round(counter.seconds, 4),
+        **extra,
+    })
+
+
+@contextmanager
+def scratch_database(verbosity=0):
+    """Run the block against a fresh, migrated test database that is thrown away afterwards."""
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+
+
+def format_results(results):
+    lines = [f"{'case':<40} {'seconds':>10} {'queries':>9} {'per sec':>12}"]
+    for result in results:
+        rate = ""
+        if result.get("items") and result["seconds"]:
+            rate = f"{result['items'] / result['seconds']:,.0f}"
+        lines.append(f"{result['label']:<40} {result['seconds']:>10.3f} {result['queries']:>9} {rate:>12}")
+    return "\n".join(lines)
+
+
+def table_bytes(model):
+    """On-disk size of a model's table plus its indexes, or None where we can't tell."""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            try:
+                cursor.execute(
+                    "SELECT SUM(pgsize) FROM dbstat WHERE name = %s "
+                    "OR name IN (SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s)",
+                    [table, table],
+                )
+            except Exception:
+                return None  # sqlite built without dbstat
+        elif connection.vendor == "postgresql":
+            cursor.execute("SELECT pg_total_relation_size(%s)", [table])
+        else:
+            return None
+        return cursor.fetchone()[0]
@@ -0,0 +1,158 @@
+"""
+The benchmark suite: ingestion, the position engine, summaries, settlement and the dashboards,
+timed on synthetic books at a few scales.
+
+Each scale runs in its own scratch database (see the benchmark_suite command) in this order,
+every stage working on what the previous ones left:
+
+  generate    build the users' books (trades only, like a fresh import without the ledger)
+  ibkr import IBKR_parser.parse_and_save on a generated activity statement, for a separate user
+  replay      Position.objects.process_trades over every trade of the books
+  summaries   update_fund_summary for every trade inside deferred_summaries()
+  settlement  settle_expired_positions after the last expiry, against the seed prices as closes
+  dashboards  user_dashboard and broker_detail for the first user, cold (empty cache) and warm
+
+Results are plain dicts (see harness.measure) saved as a JSON baseline; `compare` lines a run
+up against one. Query counts are deterministic for a given scale, so any increase is reported;
+times are only flagged past a tolerance, they depend on the machine.
+"""
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import tempfile
+import warnings
+from collections import namedtuple
+
+import django
+from django.core.cache import cache
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import RequestFactory
+from django.utils import timezone
+
+from trackers import views
+from trackers.IBKR.parser import ParserFactory
+from trackers.ledger.settlement import settle_expired_positions
+from trackers.ledger.summaries import deferred_summaries
+from trackers.models import BrokerAccount, Fund, Position, UnderlyingAsset
+from trackers.utils import update_fund_summary
+from .harness import measure
+from .synthetic import build_books, write_ibkr_statement
+
+Scale = namedtuple("Scale", "users trades funds imports renders")
+
+SCALES = {
+    "1x": Scale(users=2, trades=500, funds=5, imports=100, renders=20),
+    "10x": Scale(users=5, trades=2_000, funds=10, imports=1_000, renders=20),
+    "100x": Scale(users=20, trades=5_000, funds=20, imports=10_000, renders=10),
+}
+
+
+def _render(view, user, *args, renders=1, cold=False):
+    request = RequestFactory().get("/")
+    request.user = user
+    for _ in range(renders):
+        if cold:
+            cache.clear()
+        response = view(request, *args)
+        if response.status_code != 200:
+            raise RuntimeError(f"{view.__name__} answered {response.status_code}")
+
+
+def _synthetic_closes(pairs):
+    # the books' underlyings close at their seed price every day, no Yahoo lookups in a benchmark
+    prices = dict(UnderlyingAsset.objects.filter(live_price__isnull=False).values_list("name", "live_price"))
+    return {(symbol, day): prices[symbol] for symbol, day in pairs if symbol in prices}
+
+
+def run_scale(name, scale):
+    """Run every stage at `scale` in the current database. Returns the results list."""
+    results = []
+    with measure(results, f"{name} generate", items=scale.users * scale.trades):
+        books = build_books(users=scale.users, trades=scale.trades, funds=scale.funds)
+    entries = [entry for _, book in books for entry in book]
+    entries.sort(key=lambda entry: entry[2].date)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "statement.csv")
+        rows = write_ibkr_statement(path, trades=scale.imports)
+        parser = ParserFactory.get_parser("IBKR", path, User.objects.create_user("bench-import"))
+        # the parser prints every row and hands Django naive statement times
+        with measure(results, f"{name} ibkr import", items=rows), contextlib.redirect_stdout(io.StringIO()), \
+                warnings.catch_warnings():
+            warnings.filterwarnings("ignore", "DateTimeField .* received a naive datetime", RuntimeWarning)
+            parser.parse_and_save()
+
+    with measure(results, f"{name} replay", items=len(entries)):
+        Position.objects.process_trades(entries)
+
+    funds = Fund.objects.in_bulk({fund.id for fund, _, _ in entries})
+    with measure(results, f"{name} summaries", items=len(entries)):
+        with deferred_summaries():
+            for fund, option, trade in entries:
+                update_fund_summary(funds[fund.id], trade.date, trade.total_price)
+
+    last_expiry = max(option.expiration_date for _, option, _ in entries)
+    open_positions = Position.objects.filter(active=True).count()
+    with measure(results, f"{name} settlement", items=open_positions):
+        settle_expired_positions(today=last_expiry + datetime.timedelta(days=1), closes=_synthetic_closes)
+
+    user, _ = books[0]
+    broker = BrokerAccount.objects.get(user=user)
+    for page, view, args in (("user_dashboard", views.user_dashboard, ()),
+                             ("broker_detail", views.broker_detail, (broker.slug, broker.id))):
+        with measure(results, f"{name} {page} cold", items=scale.renders):
+            _render(view, user, *args, renders=scale.renders, cold=True)
+        with measure(results, f"{name} {page} warm", items=scale.renders):
+            _render(view, user, *args, renders=scale.renders)
+    return results
+
+
+def environment():
+    return {
+        "run_at": timezone.now().isoformat(),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "machine": platform.machine(),
+    }
+
+
+def save_baseline(path, results):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2)
+
+
+def load_baseline(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["results"]
+
+
+def compare(results, baseline, tolerance=0.25):
+    """
+    [(label, seconds, baseline seconds, queries, baseline queries, regressed), ...] for every
+    result the baseline also has; regressed if the queries went up or the time by more than
+    `tolerance` (a fraction).
+    """
+    before = {result["label"]: result for result in baseline}
+    rows = []
+    for result in results:
+        old = before.get(result["label"])
+        if old is None:
+            continue
+        slower = old["seconds"] and result["seconds"] > old["seconds"] * (1 + tolerance)
+        rows.append((result["label"], result["seconds"], old["seconds"], result["queries"], old["queries"],
+                     bool(slower or result["queries"] > old["queries"])))
+    return rows
+
+
+def format_comparison(rows):
+    lines = [f"{'case':<32} {'seconds':>9} {'baseline':>9} {'change':>8} {'queries':>9} {'baseline':>9}"]
+    for label, seconds, old_seconds, queries, old_queries, regressed in rows:
+        change = f"{(seconds / old_seconds - 1) * 100:+.0f}%" if old_seconds else ""
+        flag = "  REGRESSED" if regressed else ""
+        lines.append(f"{label:<32} {seconds:>9.3f} {old_seconds:>9.3f} {change:>8} {queries:>9} {old_queries:>9}{flag}")
+    return "\n".join(lines)
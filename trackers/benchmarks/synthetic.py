@@ -0,0 +1,150 @@
+"""
+Synthetic books for benchmarks.
+
+Trades follow the shape of the issuer files: covered-call style S opens on weekly expiries,
+rolled with BC closes (sometimes in pieces), plus the odd long B/S round trip. The same
+sequences can be written out as an IBKR activity statement to benchmark the import.
+"""
+import csv
+import datetime
+import random
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from trackers.models import BrokerAccount, Fund, UnderlyingAsset, Option, Trade
+
+UNDERLYINGS = [
+    ("TSLA", 250), ("NVDA", 120), ("AAPL", 190), ("AMZN", 180), ("MSFT", 420), ("COIN", 210),
+    ("MSTR", 330), ("PLTR", 40), ("AMD", 150), ("NFLX", 650), ("META", 500), ("GOOGL", 170),
+]
+
+
+def occ_ticker(symbol, expiry, option_type, strike):
+    return f"{symbol}{expiry.strftime('%y%m%d')}{option_type}{int(strike * 1000):08d}"
+
+
+def build_trade_book(trades=100_000, funds=20, seed=7, start=datetime.date(2024, 1, 1), taken=None):
+    """
+    Create one user/broker with `funds` funds and about `trades` trades in the database.
+    Returns the created trades as (fund, option, trade) entries in date order. `taken` is a set
+    of tickers other books already use, updated with this book's.
+    """
+    rng = random.Random(seed)
+    user, _ = User.objects.get_or_create(username=f"bench-{seed}")
+    broker, _ = BrokerAccount.objects.get_or_create(user=user, broker_name="IBKR")
+
+    assets = {}
+    for symbol, price in UNDERLYINGS:
+        assets[symbol], _ = UnderlyingAsset.objects.get_or_create(name=symbol, defaults={"live_price": price})
+
+    fund_objs = Fund.objects.bulk_create([
+        Fund(name=f"F{i:03d}{seed}", slug=f"f{i:03d}{seed}", description="", broker_account=broker)
+        for i in range(funds)
+    ])
+    fund_symbols = {fund.id: UNDERLYINGS[i % len(UNDERLYINGS)] for i, fund in enumerate(fund_objs)}
+
+    options = {}
+    pending = []
+    per_fund = max(1, trades // funds)
+    for fund in fund_objs:
+        symbol, spot = fund_symbols[fund.id]
+        day = start
+        made = 0
+        while made < per_fund:
+            day += datetime.timedelta(days=1)
+            if day.weekday() >= 5:
+                continue
+            expiry = day + datetime.timedelta(days=(4 - day.weekday()) % 7 + 7)
+            strike = Decimal(int(spot * rng.uniform(1.0, 1.15)))
+            option_type = "C" if rng.random() < 0.85 else "P"
+            ticker = occ_ticker(symbol, expiry, option_type, strike)
+            option = options.get(ticker)
+            if (option is not None and option.fund is not fund) or (option is None and taken and ticker in taken):
+                # Tickers are unique across funds, two funds writing the same contract get a suffix
+                ticker = f"{ticker}-{fund.id}"
+                option = options.get(ticker)
+            if option is None:
+                option = options[ticker] = Option(
+                    ticker=ticker, fund=fund, type=option_type, strike_price=strike,
+                    expiration_date=expiry, underlying_asset=assets[symbol],
+                )
+
+            when = timezone.make_aware(datetime.datetime.combine(day, datetime.time(10, rng.randint(0, 59))))
+            quantity = rng.choice([5, 10, 20, 50, 100])
+            premium = Decimal(str(round(rng.uniform(0.3, 4.0), 2)))
+            long_trip = rng.random() < 0.1
+            open_type, close_type = ("B", "S") if long_trip else ("S", "BC")
+            pending.append((fund, option, open_type, quantity, premium, when))
+            made += 1
+
+            # Close in one or two pieces later in the week
+            pieces = [quantity] if rng.random() < 0.7 else [quantity // 2, quantity - quantity // 2]
+            for n, piece in enumerate(pieces, 1):
+                if made >= per_fund:
+                    break
+                close_price = Decimal(str(round(float(premium) * rng.uniform(0.05, 1.2), 2)))
+                pending.append((fund, option, close_type, piece, close_price, when + datetime.timedelta(hours=n)))
+                made += 1
+
+    Option.objects.bulk_create(options.values(), batch_size=2000)
+    if taken is not None:
+        taken.update(options)
+    trade_objs = []
+    for fund, option, trade_type, quantity, price, when in pending:
+        trade = Trade(option=option, trade_type=trade_type, quantity=quantity, price=price,
+                      commission=Decimal("1.05"), date=when)
+        trade.calculate_total_price()
+        trade_objs.append(trade)
+    Trade.objects.bulk_create(trade_objs, batch_size=5000)
+
+    entries = [(fund, option, trade) for (fund, option, *_), trade in zip(pending, trade_objs)]
+    entries.sort(key=lambda entry: entry[2].date)
+    return entries
+
+
+def build_books(users=2, trades=500, funds=5, seed=7, start=datetime.date(2024, 1, 1)):
+    """`users` users with a book of about `trades` trades over `funds` funds each. Returns [(user, entries), ...]."""
+    taken = set()
+    books = []
+    for n in range(users):
+        entries = build_trade_book(trades=trades, funds=funds, seed=seed + n, start=start, taken=taken)
+        books.append((User.objects.get(username=f"bench-{seed + n}"), entries))
+    return books
+
+
+def write_ibkr_statement(path, trades=1_000, seed=11, start=datetime.date(2024, 1, 1)):
+    """
+    Write an IBKR activity statement with about `trades` option trades (rolled weekly covered calls
+    on the benchmark underlyings) to `path`, in the layout IBKR_parser reads. Returns the row count.
+    """
+    rng = random.Random(seed)
+    rows = []
+    day = start
+    while len(rows) < trades:
+        day += datetime.timedelta(days=1)
+        if day.weekday() >= 5:
+            continue
+        for symbol, spot in rng.sample(UNDERLYINGS, 3):
+            expiry = day + datetime.timedelta(days=(4 - day.weekday()) % 7 + 7)
+            contract = f"{symbol} {expiry.strftime('%d%b%y').upper()} {int(spot * rng.uniform(1.0, 1.15))} C"
+            quantity = rng.choice([1, 2, 5, 10])
+            premium = round(rng.uniform(0.3, 4.0), 2)
+            close = round(premium * rng.uniform(0.05, 1.2), 2)
+            opened = datetime.datetime.combine(day, datetime.time(10, rng.randint(0, 59)))
+            for signed, price, when in ((-quantity, premium, opened), (quantity, close, opened + datetime.timedelta(hours=2))):
+                rows.append(["Trades", "Data", "Order", "Equity and Index Options", "USD", contract,
+                             when.strftime("%Y-%m-%d, %H:%M:%S"), signed, price, price, round(-signed * price * 100, 2),
+                             -1.05, "", 0, 0, "O" if signed < 0 else "C"])
+    rows = rows[:trades]
+
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Statement", "Header", "Field Name", "Field Value"])
+        writer.writerow(["Statement", "Data", "Title", "Activity Statement"])
+        writer.writerow(["Trades", "Header", "DataDiscriminator", "Asset Category", "Currency", "Symbol", "Date/Time",
+                         "Quantity", "T. Price", "C. Price", "Proceeds", "Comm/Fee", "Basis", "Realized P/L",
+                         "MTM P/L", "Code"])
+        writer.writerows(rows)
+    return len(rows)
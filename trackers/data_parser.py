@@ -4,8 +4,8 @@ from datetime import datetime
 import csv
 import logging, traceback
 from .models import Fund, Option, Trade, UnderlyingAsset, Position
-# from .parser.yieldmax import YieldMaxParser
-# from .parser.defiance import DefianceParser
+from .parser.yieldmax import YieldMaxParser
+from .parser.defiance import DefianceParser
 from django.db import transaction
 # Set up logging
 logger = logging.getLogger(__name__)
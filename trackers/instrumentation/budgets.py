@@ -0,0 +1,38 @@
+"""
+How many queries the hot views may run, counting the session and user lookups.
+
+The middleware warns when a request goes over its view's budget, and tests check the views
+against the same numbers with `assert_query_budget`. QUERY_BUDGETS in settings overrides or
+extends them per URL name.
+"""
+from django.conf import settings
+from django.urls import reverse
+
+from .metrics import measure
+
+QUERY_BUDGETS = {
+    "user_dashboard": 10,
+    "broker_detail": 10,
+    "user_fund_detail": 10,
+    "company_detail": 10,
+    "fund_detail": 10,
+}
+
+
+def budget_for(url_name):
+    if url_name is None:
+        return None
+    return {**QUERY_BUDGETS, **getattr(settings, "QUERY_BUDGETS", {})}.get(url_name)
+
+
+def assert_query_budget(client, url_name, *args, budget=None, data=None):
+    """
+    GET the view with the test `client` and fail if it runs more queries than `budget` (its
+    entry in QUERY_BUDGETS by default), listing the ones it repeated. Returns the response.
+    """
+    budget = budget if budget is not None else budget_for(url_name)
+    with measure() as metrics:
+        response = client.get(reverse(url_name, args=args), data)
+    if metrics.queries > budget:
+        raise AssertionError(f"{url_name} ran {metrics.queries} queries, its budget is {budget}\n{metrics.report()}")
+    return response
@@ -0,0 +1,58 @@
+"""
+Profiles of Celery tasks, through the task_prerun/task_postrun signals.
+
+A task run is profiled when its name is in PROFILE_TASKS (every run), or when it is in
+PROFILABLE_TASKS and was sent with a profile header:
+
+    process_company_file.apply_async(["YieldMax"], headers={"profile": True})
+
+Profiles go to the same ProfileStore as the request ones. Imported in TrackersConfig.ready().
+"""
+import logging
+
+from celery.signals import task_postrun, task_prerun
+from django.conf import settings
+
+from .profiling import Profiler
+from .store import ProfileStore
+
+logger = logging.getLogger(__name__)
+
+PROFILABLE_TASKS = (
+    "trackers.tasks.process_company_file",
+    "trackers.tasks.download_and_process_chain",
+    "trackers.market_scraper.tasks.update_trade_prices",
+)
+
+# task id -> Profiler, for the runs in progress in this worker process
+_running = {}
+
+
+def wants_profile(task):
+    if task.name in getattr(settings, "PROFILE_TASKS", ()):
+        return True
+    if task.name not in getattr(settings, "PROFILABLE_TASKS", PROFILABLE_TASKS):
+        return False
+    request = task.request
+    # custom headers are request attributes on protocol 2, under .headers on older workers
+    return bool(getattr(request, "profile", None) or (getattr(request, "headers", None) or {}).get("profile"))
+
+
+@task_prerun.connect
+def start_task_profile(task_id=None, task=None, **kwargs):
+    if task is None or not getattr(settings, "PROFILING_ENABLED", True) or not wants_profile(task):
+        return
+    _running[task_id] = Profiler().start()
+
+
+@task_postrun.connect
+def save_task_profile(task_id=None, task=None, state=None, **kwargs):
+    profiler = _running.pop(task_id, None)
+    if profiler is None:
+        return
+    profiler.stop()
+    try:
+        profile_id = ProfileStore().save(profiler.result("task", task.name, state=state, task_id=task_id))
+        logger.info(f"Profiled {task.name} [{task_id}] as {profile_id}")
+    except OSError as e:
+        logger.error(f"Could not save the profile of {task.name} [{task_id}]: {e}")
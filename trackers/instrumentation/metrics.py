@@ -0,0 +1,110 @@
+"""
+Query and render timing for a block of code: one request in the middleware, one view call in
+the query budget test helper.
+
+Queries are grouped by fingerprint, their SQL without parameters (Django keeps those apart)
+and with IN lists of any length folded into one, so a query run once per row of a loop, the
+N+1 signature, shows up as one fingerprint with a count instead of as N different queries.
+Only the fingerprints and counts are kept, not every statement.
+
+The block being measured is found through a context variable, so queries an async view runs
+through sync_to_async on another thread count towards its request too. Every connection gets
+one execute wrapper, `_dispatch`, that hands the query to whatever is measuring at the time.
+"""
+import hashlib
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+_IN_LIST = re.compile(r"\((?:%s, )+%s\)")
+
+_current = ContextVar("request_metrics", default=None)
+
+
+def fingerprint(sql):
+    return _IN_LIST.sub("(%s, ...)", sql)
+
+
+def short_hash(sql):
+    return hashlib.sha1(sql.encode()).hexdigest()[:8]
+
+
+class Metrics:
+    """Counts, DB time and template render time of the block being measured."""
+
+    def __init__(self, outer=None):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.render_seconds = 0.0
+        self.fingerprints = Counter()
+        self.outer = outer
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            seconds = time.perf_counter() - start
+            key = fingerprint(sql)
+            metrics = self
+            # blocks measured inside another one count towards both
+            while metrics is not None:
+                metrics.db_seconds += seconds
+                metrics.queries += 1
+                metrics.fingerprints[key] += 1
+                metrics = metrics.outer
+
+    @property
+    def repeated(self):
+        """[(fingerprint, times), ...] for every query run more than once, most repeated first."""
+        return [(sql, times) for sql, times in self.fingerprints.most_common() if times > 1]
+
+    def report(self, limit=5):
+        lines = [f"{self.queries} queries in {self.db_seconds * 1000:.1f} ms"]
+        lines += [f"  {times}x {sql[:300]}" for sql, times in self.repeated[:limit]]
+        return "\n".join(lines)
+
+
+def _dispatch(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def _install(connection, **kwargs):
+    if _dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_dispatch)
+
+
+connection_created.connect(_install, dispatch_uid="trackers.instrumentation.metrics")
+
+
+@contextmanager
+def measure():
+    """
+    Collect Metrics for the block, from every database connection its context runs queries on.
+    Blocks measured inside it count towards both (renders included).
+    """
+    for connection in connections.all(initialized_only=True):
+        _install(connection)
+    outer = _current.get()
+    metrics = Metrics(outer)
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+        if outer is not None:
+            outer.render_seconds += metrics.render_seconds
+
+
+def add_render_time(seconds):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.render_seconds += seconds
@@ -0,0 +1,151 @@
+"""
+Per-request query count, DB time, repeated queries and template render time.
+
+Every request gets one key=value log line (the same numbers are in `extra["request_metrics"]`
+for JSON handlers) and, in DEBUG or for staff users, a Server-Timing header the browser's
+network panel shows next to the request. Views with a query budget (see budgets.py) that go
+over it are logged as warnings with the repeated queries, which is where N+1s show up.
+
+ProfilingMiddleware profiles single requests on demand, for staff only.
+
+Both work sync and async, like Django's own middleware, so under ASGI the async views (live
+prices, option chains, the P&L stream) stay on the event loop instead of being run through
+the one shared sync thread.
+"""
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.urls import reverse
+
+from .budgets import budget_for
+from .metrics import measure, short_hash
+from .profiling import Profiler
+from .store import ProfileStore
+
+logger = logging.getLogger(__name__)
+
+
+def server_timing(metrics, total):
+    app = max(total - metrics.db_seconds - metrics.render_seconds, 0)
+    return ", ".join([
+        f'db;dur={metrics.db_seconds * 1000:.1f};desc="{metrics.queries} queries"',
+        f'dup;desc="{sum(times for _, times in metrics.repeated)} repeated"',
+        f"render;dur={metrics.render_seconds * 1000:.1f}",
+        f"app;dur={app * 1000:.1f}",
+        f"total;dur={total * 1000:.1f}",
+    ])
+
+
+class RequestMetricsMiddleware:
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        with measure() as metrics:
+            response = self.get_response(request)
+        return self.record(request, response, metrics, time.perf_counter() - start,
+                           getattr(request, "user", None))
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        with measure() as metrics:
+            response = await self.get_response(request)
+        total = time.perf_counter() - start
+        # request.user would hit the database from the event loop
+        user = await request.auser() if hasattr(request, "auser") else None
+        return self.record(request, response, metrics, total, user)
+
+    def record(self, request, response, metrics, total, user):
+        match = getattr(request, "resolver_match", None)
+        view = match.url_name if match else None
+        if settings.DEBUG or getattr(user, "is_staff", False):
+            response["Server-Timing"] = server_timing(metrics, total)
+
+        values = {
+            "method": request.method,
+            "path": request.path,
+            "view": view,
+            "status": response.status_code,
+            "queries": metrics.queries,
+            "db_ms": round(metrics.db_seconds * 1000, 1),
+            "render_ms": round(metrics.render_seconds * 1000, 1),
+            "total_ms": round(total * 1000, 1),
+            "repeated": {short_hash(sql): times for sql, times in metrics.repeated[:5]},
+        }
+        logger.info(" ".join(f"{key}={value}" for key, value in values.items() if key != "repeated")
+                    + "".join(f" dup={key}x{times}" for key, times in values["repeated"].items()),
+                    extra={"request_metrics": values})
+
+        budget = budget_for(view)
+        if budget is not None and metrics.queries > budget:
+            logger.warning(f"{view} ran {metrics.queries} queries, its budget is {budget}\n{metrics.report()}")
+        return response
+
+
+PROFILE_FLAGS = ("1", "true", "yes")
+
+
+def wants_profile(request, user):
+    """Staff asked for a profile with ?profile=1 or an X-Profile: 1 header."""
+    if not getattr(settings, "PROFILING_ENABLED", True):
+        return False
+    if not getattr(user, "is_staff", False):
+        return False
+    flag = request.GET.get("profile") or request.headers.get("X-Profile") or ""
+    return flag.lower() in PROFILE_FLAGS
+
+
+class ProfilingMiddleware:
+    """
+    Profiles the requests staff ask for (see profiling.py) into the ProfileStore and links the
+    profile in an X-Profile response header. Goes after AuthenticationMiddleware.
+
+    An async request is profiled on the event loop thread, so its samples also show whatever
+    other requests the loop ran meanwhile.
+    """
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not wants_profile(request, getattr(request, "user", None)):
+            return self.get_response(request)
+
+        with Profiler() as profiler:
+            response = self.get_response(request)
+        return self.save(request, response, profiler)
+
+    async def __acall__(self, request):
+        user = await request.auser() if hasattr(request, "auser") else None
+        if not wants_profile(request, user):
+            return await self.get_response(request)
+
+        with Profiler() as profiler:
+            response = await self.get_response(request)
+        # the store writes files, keep that off the event loop
+        return await sync_to_async(self.save, thread_sensitive=False)(request, response, profiler)
+
+    def save(self, request, response, profiler):
+        try:
+            profile_id = ProfileStore().save(profiler.result(
+                "request", f"{request.method} {request.path}", status=response.status_code,
+            ))
+        except OSError as e:
+            logger.error(f"Could not save the profile of {request.path}: {e}")
+            return response
+        response["X-Profile"] = reverse("profile_detail", args=[profile_id])
+        return response
@@ -0,0 +1,131 @@
+"""
+On-demand profiles of one request or one Celery task.
+
+A Profiler runs two profilers over the thread that starts it:
+
+  - a sampler thread that reads the thread's stack every PROFILE_SAMPLE_INTERVAL seconds and
+    counts identical stacks. They are written as folded stacks ("outer;inner;leaf count" per
+    line), the input of flamegraph.pl, speedscope and most other flame graph viewers.
+  - cProfile, for call counts and exact per-function self and total times.
+
+Queries and DB time are counted as in the request metrics. Profiles are turned on per request
+by staff (see middleware.ProfilingMiddleware) or per task (see celery_hooks.py) and saved in a
+ProfileStore (store.py).
+"""
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.utils import timezone
+
+from .metrics import measure
+
+
+def frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Sampler(threading.Thread):
+    """Counts the stacks of thread `thread_id`, one sample every `interval` seconds."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name=f"profile-sampler-{thread_id}", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class Profiler:
+    """Sample and trace the current thread between start() and stop() (or in a with block)."""
+
+    def __init__(self, interval=None, functions=None):
+        self.interval = interval or getattr(settings, "PROFILE_SAMPLE_INTERVAL", 0.005)
+        self.function_limit = functions or getattr(settings, "PROFILE_FUNCTIONS", 60)
+        self.sampler = Sampler(threading.get_ident(), self.interval)
+        self.tracer = cProfile.Profile()
+        self.started_at = None
+        self.seconds = 0.0
+        self._measure = None
+        self.metrics = None
+
+    def start(self):
+        self.started_at = timezone.now()
+        self._start = time.perf_counter()
+        self._measure = measure()
+        self.metrics = self._measure.__enter__()
+        self.sampler.start()
+        try:
+            self.tracer.enable()
+        except ValueError:  # another profiler owns the thread, keep the samples only
+            self.tracer = None
+        return self
+
+    def stop(self):
+        if self.tracer is not None:
+            self.tracer.disable()
+        self.sampler.stop()
+        self._measure.__exit__(None, None, None)
+        self.seconds = time.perf_counter() - self._start
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def functions(self):
+        """The slowest functions by total time: [{function, calls, self_ms, total_ms}, ...]."""
+        if self.tracer is None:
+            return []
+        stats = pstats.Stats(self.tracer).stats
+        rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:self.function_limit]
+        return [
+            {
+                "function": f"{name} ({os.path.basename(filename)}:{line})",
+                "calls": calls,
+                "self_ms": round(self_seconds * 1000, 3),
+                "total_ms": round(total_seconds * 1000, 3),
+            }
+            for (filename, line, name), (_, calls, self_seconds, total_seconds, _) in rows
+        ]
+
+    def result(self, kind, name, **extra):
+        """The profile as saved by ProfileStore.save; `folded` holds the sampled stacks."""
+        return {
+            "kind": kind,
+            "name": name,
+            "started_at": self.started_at.isoformat(),
+            "seconds": round(self.seconds, 4),
+            "queries": self.metrics.queries,
+            "db_seconds": round(self.metrics.db_seconds, 4),
+            "samples": self.sampler.samples,
+            "interval_ms": self.interval * 1000,
+            "functions": self.functions(),
+            "folded": self.sampler.folded(),
+            **extra,
+        }
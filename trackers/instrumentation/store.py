@@ -0,0 +1,88 @@
+"""
+Profiles on disk: <id>.json (what was profiled, timings, the function table) next to
+<id>.folded (the sampled stacks, for flame graph tools), in PROFILE_DIR.
+
+The store keeps the newest PROFILE_STORE_LIMIT profiles and deletes older ones as new ones are
+saved. Ids start with the time they were saved, so name order is age order.
+"""
+import json
+import logging
+import os
+import re
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.text import slugify
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ID = re.compile(r"^[0-9]{8}T[0-9]{12}-[a-z]+-[a-z0-9_-]*-[0-9a-f]{6}$")
+
+
+class ProfileStore:
+    def __init__(self, directory=None, limit=None):
+        self.directory = Path(directory or getattr(settings, "PROFILE_DIR", Path(settings.BASE_DIR).parent / "profiles"))
+        self.limit = limit or getattr(settings, "PROFILE_STORE_LIMIT", 50)
+
+    def path(self, profile_id, suffix):
+        if not PROFILE_ID.match(profile_id):
+            raise KeyError(profile_id)
+        return self.directory / f"{profile_id}{suffix}"
+
+    def save(self, profile):
+        """Write a Profiler.result() and return its id."""
+        profile_id = "-".join([
+            timezone.now().strftime("%Y%m%dT%H%M%S%f"),
+            profile["kind"],
+            slugify(profile["name"].replace("/", "-").replace(".", "-"))[:60],
+            uuid.uuid4().hex[:6],
+        ])
+        profile = dict(profile, id=profile_id)
+        folded = profile.pop("folded")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path(profile_id, ".folded").write_text(folded, encoding="utf-8")
+        self.path(profile_id, ".json").write_text(json.dumps(profile), encoding="utf-8")
+        self.prune()
+        return profile_id
+
+    def ids(self):
+        """Stored profile ids, newest first."""
+        if not self.directory.is_dir():
+            return []
+        return sorted((path.stem for path in self.directory.glob("*.json") if PROFILE_ID.match(path.stem)),
+                      reverse=True)
+
+    def prune(self):
+        for profile_id in self.ids()[self.limit:]:
+            for suffix in (".json", ".folded"):
+                try:
+                    os.remove(self.path(profile_id, suffix))
+                except FileNotFoundError:
+                    pass  # pruned by another process
+
+    def get(self, profile_id):
+        """The profile saved as `profile_id`, without its stacks. KeyError if there is none."""
+        try:
+            return json.loads(self.path(profile_id, ".json").read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            raise KeyError(profile_id)
+
+    def folded(self, profile_id):
+        try:
+            return self.path(profile_id, ".folded").read_text(encoding="utf-8")
+        except FileNotFoundError:
+            raise KeyError(profile_id)
+
+    def list(self):
+        """Every stored profile without its function table, newest first."""
+        profiles = []
+        for profile_id in self.ids():
+            try:
+                profile = self.get(profile_id)
+            except (KeyError, ValueError):
+                continue
+            profile.pop("functions", None)
+            profiles.append(profile)
+        return profiles
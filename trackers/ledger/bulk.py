@@ -0,0 +1,131 @@
+from django.db import connections, router
+
+
+def bulk_update_rows(objs, fields):
+    """
+    UPDATE each object's `fields` by primary key in one executemany call.
+    QuerySet.bulk_update builds a CASE WHEN per field per row, which gets slow past a few
+    thousand rows; this sends one small parameterised statement for the whole batch instead.
+    """
+    if not objs:
+        return
+    model = type(objs[0])
+    attnames = [model._meta.get_field(name).attname for name in fields]
+    update_rows(model, fields, [[getattr(obj, attname) for attname in attnames] + [obj.pk] for obj in objs])
+
+
+def update_rows(model, fields, rows):
+    """Like bulk_update_rows, for plain (value, ..., pk) tuples instead of model instances."""
+    if not rows:
+        return
+    meta = model._meta
+    connection = connections[router.db_for_write(model)]
+    qn = connection.ops.quote_name
+    columns = [meta.get_field(name) for name in fields]
+
+    sql = "UPDATE {} SET {} WHERE {} = %s".format(
+        qn(meta.db_table),
+        ", ".join(f"{qn(field.column)} = %s" for field in columns),
+        qn(meta.pk.column),
+    )
+    params = [
+        [field.get_db_prep_save(value, connection) for field, value in zip(columns, row)] + [row[-1]]
+        for row in rows
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def bulk_insert_rows(model, fields, rows):
+    """
+    INSERT plain value tuples (in `fields` order) with one executemany call, skipping model
+    instances entirely. Use it for rows nobody needs the primary keys of.
+    """
+    if not rows:
+        return
+    meta = model._meta
+    connection = connections[router.db_for_write(model)]
+    qn = connection.ops.quote_name
+    columns = [meta.get_field(name) for name in fields]
+
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        qn(meta.db_table),
+        ", ".join(qn(field.column) for field in columns),
+        ", ".join(["%s"] * len(columns)),
+    )
+    params = [
+        [field.get_db_prep_save(value, connection) for field, value in zip(columns, row)]
+        for row in rows
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def delete_rows(model, field, values):
+    """
+    DELETE rows whose `field` is in `values` with one statement, bypassing the deletion
+    collector. Only for rows nothing references anymore: cascades and signals don't run.
+    """
+    values = list(values)
+    if not values:
+        return 0
+    meta = model._meta
+    connection = connections[router.db_for_write(model)]
+    qn = connection.ops.quote_name
+    sql = "DELETE FROM {} WHERE {} IN ({})".format(
+        qn(meta.db_table), qn(meta.get_field(field).column), ", ".join(["%s"] * len(values)),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, values)
+        return cursor.rowcount
+
+
+def upsert_increment(model, key_fields, value_fields, rows, extra=None, batch_size=1000):
+    """
+    Add `value_fields` onto the rows matching `key_fields` in one INSERT ... ON CONFLICT
+    statement, inserting the ones that don't exist yet. `rows` are (keys..., values...) tuples;
+    `extra` is {field: value} written on insert only (e.g. created_at). The increment happens in
+    the database, so concurrent writers can't lose each other's updates. Needs a unique
+    constraint over `key_fields`. More than `batch_size` distinct keys go in several statements
+    to stay under the backends' parameter limits.
+    """
+    merged = {}
+    for row in rows:
+        key, values = tuple(row[:len(key_fields)]), row[len(key_fields):]
+        current = merged.get(key)
+        merged[key] = values if current is None else [a + b for a, b in zip(current, values)]
+    if not merged:
+        return 0
+
+    meta = model._meta
+    connection = connections[router.db_for_write(model)]
+    qn = connection.ops.quote_name
+    extra = extra or {}
+    fields = [meta.get_field(name) for name in (*key_fields, *value_fields, *extra)]
+    table = qn(meta.db_table)
+    keys = [qn(meta.get_field(name).column) for name in key_fields]
+    increments = [qn(meta.get_field(name).column) for name in value_fields]
+
+    if connection.vendor == "mysql":
+        conflict = "ON DUPLICATE KEY UPDATE {}".format(
+            ", ".join(f"{column} = {column} + VALUES({column})" for column in increments)
+        )
+    else:
+        # sqlite >= 3.24 and PostgreSQL share the syntax
+        conflict = "ON CONFLICT ({}) DO UPDATE SET {}".format(
+            ", ".join(keys), ", ".join(f"{column} = {table}.{column} + excluded.{column}" for column in increments)
+        )
+    placeholders = "({})".format(", ".join(["%s"] * len(fields)))
+    items = list(merged.items())
+    with connection.cursor() as cursor:
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+            sql = "INSERT INTO {} ({}) VALUES {} {}".format(
+                table, ", ".join(qn(field.column) for field in fields), ", ".join([placeholders] * len(batch)), conflict,
+            )
+            params = []
+            for key, values in batch:
+                row = (*key, *values, *extra.values())
+                params.extend(field.get_db_prep_save(value, connection) for field, value in zip(fields, row))
+            cursor.execute(sql, params)
+    return len(items)
@@ -0,0 +1,191 @@
+"""
+Position history stored as time buckets.
+
+Each position gets one append-only bucket per day it changed, holding that day's points as
+JSON. Once a month is older than POSITION_HISTORY_COMPACT_AFTER_DAYS its daily buckets are
+merged into one monthly bucket with the points packed as fixed-size binary records.
+A point is (date, remaining_quantity, average_price, profit_loss).
+
+Buckets are unique on (position, day, span), and that index serves the range read in
+`trajectory`, so a position's history for any range is one indexed query.
+"""
+import datetime
+import struct
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .bulk import bulk_insert_rows, update_rows
+from .lots import CENT, as_date
+
+DAILY = "D"
+MONTHLY = "M"
+
+# day offset from the bucket day, quantity, average price in cents, P&L in cents
+POINT = struct.Struct("<Hiiq")
+
+
+def _cents(value):
+    return int(Decimal(value).quantize(CENT) * 100)
+
+
+def _from_cents(value):
+    return Decimal(value) / 100
+
+
+def pack(bucket_day, points):
+    return b"".join(
+        POINT.pack((day - bucket_day).days, quantity, _cents(price), _cents(pnl))
+        for day, quantity, price, pnl in points
+    )
+
+
+def unpack(bucket_day, packed):
+    return [
+        (bucket_day + datetime.timedelta(days=offset), quantity, _from_cents(price), _from_cents(pnl))
+        for offset, quantity, price, pnl in POINT.iter_unpack(bytes(packed))
+    ]
+
+
+def bucket_points(day, span, points, packed):
+    """The points of one bucket row as (date, quantity, price, pnl) tuples."""
+    if span == MONTHLY:
+        return unpack(day, packed)
+    return [(day, quantity, Decimal(price), Decimal(pnl)) for quantity, price, pnl in points]
+
+
+def _json_point(quantity, price, pnl):
+    return [quantity, str(price), str(pnl)]
+
+
+def record(events):
+    """
+    Append history points. `events` are (position_id, date, remaining_quantity, price, pnl) in
+    the order they happened. Days already holding a bucket are extended, the rest are inserted.
+    """
+    from trackers.models import PositionHistoryBucket
+
+    by_bucket = {(position_id, day): points for position_id, day, points in daily_buckets(events)}
+    if not by_bucket:
+        return
+
+    existing = PositionHistoryBucket.objects.filter(
+        span=DAILY,
+        position_id__in={position_id for position_id, _ in by_bucket},
+        day__in={day for _, day in by_bucket},
+    ).values_list("id", "position_id", "day", "points")
+
+    updates = []
+    for pk, position_id, day, points in existing:
+        new_points = by_bucket.pop((position_id, day), None)
+        if new_points is not None:
+            updates.append((points + new_points, pk))
+    update_rows(PositionHistoryBucket, ["points"], updates)
+    insert_buckets([(position_id, day, points) for (position_id, day), points in by_bucket.items()])
+
+
+def insert_buckets(rows):
+    """Insert new daily buckets from (position_id, day, points) rows."""
+    from trackers.models import PositionHistoryBucket
+
+    bulk_insert_rows(PositionHistoryBucket, ["position", "day", "span", "points"],
+                     [(position_id, day, DAILY, points) for position_id, day, points in rows])
+
+
+def daily_buckets(events):
+    """Group (position_id, date, quantity, price, pnl) events into insert_buckets rows."""
+    by_bucket = defaultdict(list)
+    for position_id, day, quantity, price, pnl in events:
+        by_bucket[(position_id, as_date(day))].append(_json_point(quantity, price, pnl))
+    return [(position_id, day, points) for (position_id, day), points in by_bucket.items()]
+
+
+def trajectory(position_id, start=None, end=None):
+    """
+    A position's (date, remaining_quantity, average_price, profit_loss) points between `start`
+    and `end` inclusive, oldest first, read with a single query.
+    """
+    from trackers.models import PositionHistoryBucket
+
+    buckets = PositionHistoryBucket.objects.filter(position_id=position_id)
+    if start:
+        # A monthly bucket is keyed on the first of its month
+        buckets = buckets.filter(day__gte=start.replace(day=1))
+    if end:
+        buckets = buckets.filter(day__lte=end)
+
+    result = []
+    for day, span, points, packed in buckets.order_by("day", "span").values_list("day", "span", "points", "packed"):
+        result.extend(bucket_points(day, span, points, packed))
+    result.sort(key=lambda point: point[0])
+    if start:
+        result = [point for point in result if point[0] >= start]
+    if end:
+        result = [point for point in result if point[0] <= end]
+    return result
+
+
+def compact(before=None, chunk=500):
+    """
+    Merge the daily buckets of every month that ended before `before` (default: today minus
+    POSITION_HISTORY_COMPACT_AFTER_DAYS) into one packed monthly bucket per position.
+    Returns the number of daily buckets folded away.
+    """
+    from trackers.models import PositionHistoryBucket
+
+    if before is None:
+        days = getattr(settings, "POSITION_HISTORY_COMPACT_AFTER_DAYS", 35)
+        before = timezone.localdate() - datetime.timedelta(days=days)
+    cutoff = before.replace(day=1)
+
+    folded = 0
+    while True:
+        position_ids = list(
+            PositionHistoryBucket.objects.filter(span=DAILY, day__lt=cutoff)
+            .order_by("position_id").values_list("position_id", flat=True).distinct()[:chunk]
+        )
+        if not position_ids:
+            return folded
+        folded += _compact_positions(position_ids, cutoff)
+
+
+@transaction.atomic
+def _compact_positions(position_ids, cutoff):
+    from trackers.models import PositionHistoryBucket
+
+    rows = (PositionHistoryBucket.objects.select_for_update()
+            .filter(position_id__in=position_ids, day__lt=cutoff)
+            .order_by("position_id", "day", "span")
+            .values_list("id", "position_id", "day", "span", "points", "packed"))
+
+    months = defaultdict(list)
+    monthly_ids = {}
+    daily_ids = []
+    dirty = set()
+    for pk, position_id, day, span, points, packed in rows:
+        month = day.replace(day=1)
+        months[(position_id, month)].extend(bucket_points(day, span, points, packed))
+        if span == MONTHLY:
+            monthly_ids[(position_id, month)] = pk
+        else:
+            daily_ids.append(pk)
+            dirty.add((position_id, month))
+
+    inserts, updates = [], []
+    for (position_id, month), points in months.items():
+        if (position_id, month) not in dirty:
+            continue
+        points.sort(key=lambda point: point[0])
+        packed = pack(month, points)
+        if (position_id, month) in monthly_ids:
+            updates.append((packed, monthly_ids[(position_id, month)]))
+        else:
+            inserts.append((position_id, month, MONTHLY, [], packed))
+
+    PositionHistoryBucket.objects.filter(id__in=daily_ids).delete()
+    update_rows(PositionHistoryBucket, ["packed"], updates)
+    bulk_insert_rows(PositionHistoryBucket, ["position", "day", "span", "points", "packed"], inserts)
+    return len(daily_ids)
@@ -0,0 +1,59 @@
+"""
+Locks for applying trades.
+
+Everything that reads a (fund, option) book's open positions and then writes them back has to
+hold that book's lock inside one transaction, otherwise two writers can both close the same
+contracts. `lock_books` opens the transaction and takes the locks:
+
+* PostgreSQL: a transaction-level advisory lock per book, so unrelated books (and funds) go
+  fully in parallel and nothing is left locked after commit or rollback.
+* sqlite: one process-wide lock. sqlite has a single writer anyway, and letting two deferred
+  transactions race for it only turns into "database is locked" errors.
+* anything else: SELECT ... FOR UPDATE on the books' Option rows.
+
+Keys are locked in sorted order so two multi-book callers can't deadlock each other.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import connections, router, transaction
+
+# Advisory lock keys are two int4s, ids are folded into that range (a collision only means
+# two books share a lock)
+_INT4 = 2 ** 31
+
+_sqlite_lock = threading.RLock()
+
+
+def _book_keys(keys):
+    return sorted({(int(fund_id), int(option_id)) for fund_id, option_id in keys})
+
+
+@contextmanager
+def lock_books(keys):
+    """Run the block in a transaction holding the lock of every (fund_id, option_id) in `keys`."""
+    from trackers.models import Option
+
+    keys = _book_keys(keys)
+    using = router.db_for_write(Option)
+    vendor = connections[using].vendor
+
+    if vendor == "sqlite":
+        with _sqlite_lock, transaction.atomic(using=using):
+            yield
+        return
+
+    with transaction.atomic(using=using):
+        if vendor == "postgresql":
+            with connections[using].cursor() as cursor:
+                for fund_id, option_id in keys:
+                    cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", [fund_id % _INT4, option_id % _INT4])
+        else:
+            list(Option.objects.using(using).select_for_update()
+                 .filter(id__in={option_id for _, option_id in keys}).order_by("id").values_list("id"))
+        yield
+
+
+def lock_book(fund, option):
+    """lock_books for a single fund and option (instances or ids)."""
+    return lock_books([(getattr(fund, "id", fund), getattr(option, "id", option))])
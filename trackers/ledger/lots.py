@@ -0,0 +1,187 @@
+"""
+In-memory lot ledger.
+
+A lot is one opening trade's contracts still open (one `Position` row). Books hold the open lots
+for one (fund, option) in a deque, and closing trades are matched against them in memory.
+Nothing in this module touches the database, so a whole batch of trades can be replayed here
+and written back in bulk afterwards (see PositionManager.process_trades).
+"""
+import datetime
+from collections import deque
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.utils import timezone
+
+CENT = Decimal("0.01")
+
+FIFO = "fifo"
+LIFO = "lifo"
+HIGHEST_COST = "highest_cost"
+LOT_SELECTION_METHODS = (FIFO, LIFO, HIGHEST_COST)
+
+SHORT_TYPES = ("S", "SS")
+
+
+def as_date(value):
+    if isinstance(value, datetime.datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.date()
+    return value
+
+
+def position_terms(option_type, strike, price, quantity):
+    """
+    (breakeven, entry premium, capital at risk) of a lot opened at `price` per share for
+    `quantity` contracts. They're fixed when the lot opens, later trades only move its P&L.
+    """
+    breakeven = strike - price if option_type == "P" else strike + price
+    return breakeven, price * 100 * quantity, strike * 100 * quantity
+
+
+def annualized_yield(trade_type, profit_loss, capital_at_risk, opened, expiry):
+    """
+    A short lot's P&L so far as a yearly % of its capital at risk, over the days from opening
+    to expiry (plus a weekend or so, like the trade yields always had). None for long lots.
+    """
+    if trade_type not in SHORT_TYPES or not capital_at_risk or opened is None:
+        return None
+    days = (expiry - opened).days
+    if days <= 0:
+        return None
+    days += 2 if days < 7 else 3
+    return (profit_loss / capital_at_risk * Decimal("365") / days * 100).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+class Lot:
+    __slots__ = (
+        "position_id", "trade_type", "remaining_quantity", "price",
+        "profit_loss", "commission", "date", "active", "opened_quantity",
+    )
+
+    def __init__(self, trade_type, remaining_quantity, price, profit_loss, commission, date,
+                 position_id=None, active=True):
+        self.position_id = position_id
+        self.trade_type = trade_type
+        self.remaining_quantity = remaining_quantity
+        # what the opening trade was for, remaining_quantity goes down as it's closed
+        self.opened_quantity = remaining_quantity
+        self.price = price
+        self.profit_loss = profit_loss
+        self.commission = commission
+        self.date = date
+        self.active = active
+
+    @property
+    def is_short(self):
+        return self.trade_type in SHORT_TYPES
+
+    def __repr__(self):
+        return f"<Lot {self.trade_type} {self.remaining_quantity} @ {self.price} pos={self.position_id}>"
+
+
+class LotBook:
+    """Open lots for one (fund, option), oldest first."""
+    __slots__ = ("lots", "method")
+
+    def __init__(self, method=FIFO):
+        if method not in LOT_SELECTION_METHODS:
+            raise ValueError(f"Unknown lot selection method: {method}")
+        self.lots = deque()
+        self.method = method
+
+    def open_quantity(self):
+        return sum(lot.remaining_quantity for lot in self.lots)
+
+    def closes(self, trade_type):
+        """Does a trade of `trade_type` close lots in this book (rather than open a new one)?"""
+        if trade_type == "BC":
+            return True
+        if not self.lots:
+            return False
+        if trade_type in SHORT_TYPES:
+            return not self.lots[0].is_short
+        if trade_type == "B":
+            return self.lots[0].trade_type != "B"
+        raise ValueError(f"Unsupported trade type: {trade_type}")
+
+    def _next_lot(self):
+        if self.method == FIFO:
+            return self.lots[0]
+        if self.method == LIFO:
+            return self.lots[-1]
+        return max(self.lots, key=lambda lot: lot.price)
+
+    def open(self, trade):
+        lot = Lot(
+            trade_type=trade.trade_type,
+            remaining_quantity=abs(trade.quantity),
+            price=trade.price,
+            profit_loss=trade.total_price,
+            commission=trade.commission,
+            date=as_date(trade.date),
+        )
+        self.lots.append(lot)
+        return [lot]
+
+    def close(self, trade, label=""):
+        """
+        Match `trade` against open lots. P&L and commission are split across the lots it closes
+        in proportion to contracts, in cents, with the rounding remainder on the last lot.
+        """
+        quantity = abs(trade.quantity)
+        available = self.open_quantity()
+        if not self.lots:
+            raise ValueError(f"No existing short position to close for {label}.")
+        if quantity > available:
+            raise ValueError(f"Cannot close {quantity}, only {available} contracts available.")
+
+        touched = []
+        remaining = quantity
+        allocated_pnl = Decimal("0.00")
+        allocated_commission = Decimal("0.00")
+        while remaining > 0:
+            lot = self._next_lot()
+            closing = min(remaining, lot.remaining_quantity)
+            remaining -= closing
+            if remaining == 0:
+                pnl = trade.total_price - allocated_pnl
+                commission = trade.commission - allocated_commission
+            else:
+                pnl = (trade.total_price * closing / quantity).quantize(CENT)
+                commission = (trade.commission * closing / quantity).quantize(CENT)
+                allocated_pnl += pnl
+                allocated_commission += commission
+
+            lot.profit_loss += pnl
+            lot.commission += commission
+            lot.remaining_quantity -= closing
+            if lot.remaining_quantity == 0:
+                lot.active = False
+                self.lots.remove(lot)
+            touched.append(lot)
+        return touched
+
+
+class Ledger:
+    """All books touched by a replay, keyed by (fund_id, option_id)."""
+
+    def __init__(self, method=FIFO):
+        self.method = method
+        self.books = {}
+
+    def book(self, key):
+        book = self.books.get(key)
+        if book is None:
+            book = self.books[key] = LotBook(self.method)
+        return book
+
+    def seed(self, key, lot):
+        self.book(key).lots.append(lot)
+
+    def apply(self, key, trade, label=None):
+        """Apply one trade and return the lots it opened or touched, last one last."""
+        book = self.book(key)
+        if book.closes(trade.trade_type):
+            return book.close(trade, label=label or key)
+        return book.open(trade)
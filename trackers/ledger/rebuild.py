@@ -0,0 +1,284 @@
+"""
+Rebuild derived ledger state from the Trade table.
+
+Positions, position history, FundProfitSummary rows and Fund.total_profit are all derived from
+trades, but views and parsers maintain them incrementally and they drift. A rebuild loads every
+trade once, replays each fund through the lot ledger (in worker processes, no DB access there),
+then swaps each fund's results in, in a transaction holding the locks of all its books. A fund
+that got new or changed trades after the load is not swapped: its replay would orphan them.
+
+Trades belong to the fund of their position, or their option's fund if they have no position.
+Adjustments that never went through a Trade (e.g. contracts taken off a position by the
+holding assignment views) are not part of the replay.
+"""
+import logging
+import os
+from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from trackers.parser.utils import get_week_range, get_month_range, get_year_range
+from . import history as position_history
+from .bulk import bulk_insert_rows, delete_rows, update_rows
+from .locking import lock_books
+from .lots import CENT, Ledger, FIFO, annualized_yield, as_date, position_terms
+from .rollups import derive_company_summaries, holding_profit
+from .summaries import funds_changed
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal("0.00")
+
+# Plain values only, these get pickled to the worker processes
+TradeRow = namedtuple("TradeRow", "id option_id trade_type quantity price commission total_price date "
+                                   "option_type strike expiry underlying_price")
+
+POSITION_FIELDS = ("option_id", "trade_type", "remaining_quantity", "average_price",
+                   "profit_loss", "commission", "date", "active",
+                   "breakeven_price", "entry_premium", "capital_at_risk", "annual_yield", "entry_spot")
+
+
+def load_trades(fund_ids=None):
+    """Every trade as a TradeRow, grouped by fund id and in replay order."""
+    from trackers.models import Trade
+
+    trades = Trade.objects.annotate(
+        owner_id=Coalesce("position__fund_id", "option__fund_id"),
+    ).order_by("date", "id")
+    if fund_ids:
+        trades = trades.filter(owner_id__in=fund_ids)
+
+    by_fund = defaultdict(list)
+    rows = trades.values_list(
+        "owner_id", "id", "option_id", "trade_type", "quantity", "price", "commission",
+        "total_price", "date", "option__type", "option__strike_price", "option__expiration_date", "underlying_price",
+    )
+    for (owner_id, pk, option_id, trade_type, quantity, price, commission, total, date, option_type, strike, expiry,
+         underlying_price) in rows:
+        # Undated trades (old manual entries) count on the option's expiry
+        day = as_date(date) if date else expiry
+        by_fund[owner_id].append(TradeRow(pk, option_id, trade_type, quantity, price, commission, total, day,
+                                          option_type, strike, expiry, underlying_price))
+    for rows in by_fund.values():
+        rows.sort(key=lambda row: (row.date, row.id))
+    return by_fund
+
+
+def _position_values(lot, opening):
+    """The POSITION_FIELDS of a replayed lot, `opening` being the TradeRow that opened it."""
+    breakeven, premium, capital = position_terms(opening.option_type, opening.strike, lot.price, lot.opened_quantity)
+    return dict(zip(POSITION_FIELDS, (
+        opening.option_id, lot.trade_type, lot.remaining_quantity, lot.price,
+        lot.profit_loss, lot.commission, lot.date, lot.active,
+        breakeven, premium, capital, annualized_yield(lot.trade_type, lot.profit_loss, capital, lot.date, opening.expiry),
+        opening.underlying_price,
+    )))
+
+
+def replay_fund(fund_id, rows, method=FIFO):
+    """
+    Pure function run in the workers: replay one fund's trades and return its derived state.
+    Positions are referred to by their index in `positions`.
+    """
+    ledger = Ledger(method)
+    index = {}
+    positions, links, history = [], {}, []
+    summaries = defaultdict(lambda: [ZERO, ZERO, ZERO])
+    buckets = {}
+    total = ZERO
+    try:
+        for row in rows:
+            touched = ledger.apply(row.option_id, row, label=row.option_id)
+            for lot in touched:
+                if lot not in index:
+                    index[lot] = len(positions)
+                    positions.append((lot, row))
+                history.append((index[lot], row.date, lot.remaining_quantity, lot.price, lot.profit_loss))
+            links[row.id] = index[touched[-1]]
+
+            ranges = buckets.get(row.date)
+            if ranges is None:
+                ranges = buckets[row.date] = (get_week_range(row.date), get_month_range(row.date),
+                                              get_year_range(row.date))
+            for column, bucket in enumerate(ranges):
+                summaries[bucket][column] += row.total_price
+            total += row.total_price
+    except ValueError as e:
+        return {"fund_id": fund_id, "error": f"trade {row.id}: {e}"}
+
+    return {
+        "fund_id": fund_id,
+        "error": None,
+        "positions": [_position_values(lot, opening) for lot, opening in positions],
+        "links": links,
+        "history": history,
+        "summaries": {bucket: tuple(values) for bucket, values in summaries.items()},
+        "trade_profit": total,
+    }
+
+
+def replay_all(by_fund, method=FIFO, workers=None):
+    """Replay every fund, across a process pool when there is more than one fund and CPU."""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(by_fund) <= 1:
+        return [replay_fund(fund_id, rows, method) for fund_id, rows in by_fund.items()]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(replay_fund, fund_id, rows, method) for fund_id, rows in by_fund.items()]
+        return [future.result() for future in futures]
+
+
+def live_state(fund_id):
+    """The same shape as a replay result, read from what is currently stored."""
+    from trackers.models import Fund, Position, FundProfitSummary
+
+    positions = list(Position.objects.filter(fund_id=fund_id).values(*POSITION_FIELDS))
+    summaries = {
+        (row["start_date"], row["end_date"]): (row["weekly"], row["monthly"], row["annually"])
+        for row in FundProfitSummary.objects.filter(fund_id=fund_id).values("start_date", "end_date").annotate(
+            weekly=Sum("weekly_profit"), monthly=Sum("monthly_profit"), annually=Sum("annually_profit"),
+        )
+    }
+    total = Fund.objects.filter(pk=fund_id).values_list("total_profit", flat=True).first()
+    return {"positions": positions, "summaries": summaries, "total_profit": total}
+
+
+def _cents(values):
+    # sqlite keeps whatever precision was written, compare at the field's 2 places
+    return tuple(value.quantize(CENT) if isinstance(value, Decimal) else value for value in values)
+
+
+def _position_key(position):
+    return _cents(position[field] for field in POSITION_FIELDS)
+
+
+def diff_fund(result, live):
+    """Differences between a rebuilt fund and its stored state, as readable lines."""
+    lines = []
+    rebuilt = Counter(map(_position_key, result["positions"]))
+    stored = Counter(map(_position_key, live["positions"]))
+    if rebuilt != stored:
+        lines.append(f"positions: {sum(rebuilt.values())} rebuilt vs {sum(stored.values())} stored, "
+                     f"{sum((rebuilt - stored).values())} missing, {sum((stored - rebuilt).values())} unexpected")
+
+    for bucket in sorted(set(result["summaries"]) | set(live["summaries"])):
+        want = result["summaries"].get(bucket, (ZERO, ZERO, ZERO))
+        have = live["summaries"].get(bucket, (ZERO, ZERO, ZERO))
+        if _cents(want) != _cents(have):
+            lines.append(f"summary {bucket[0]}..{bucket[1]}: rebuilt {want} stored {have}")
+
+    if _cents([result["total_profit"]]) != _cents([live["total_profit"] or ZERO]):
+        lines.append(f"total_profit: rebuilt {result['total_profit']} stored {live['total_profit']}")
+    return lines
+
+
+def fund_books(fund_id):
+    """Every (fund_id, option_id) book a writer can touch for the fund: its options and its positions'."""
+    from trackers.models import Option, Position
+
+    books = {(fund_id, option_id) for option_id in Option.objects.filter(fund_id=fund_id).values_list("id", flat=True)}
+    return books | set(Position.objects.filter(fund_id=fund_id).values_list("fund_id", "option_id").distinct())
+
+
+def written_since(fund_id, since):
+    """Whether any of the fund's trades were created or changed after `since`."""
+    from trackers.models import Trade
+
+    return Trade.objects.annotate(
+        owner_id=Coalesce("position__fund_id", "option__fund_id"),
+    ).filter(owner_id=fund_id, updated_at__gt=since).exists()
+
+
+def swap(results, since=None):
+    """
+    Replace the stored derived state of every fund in `results` with the rebuilt one, a fund at a
+    time under the locks of its books. Funds with trades written after `since` (the load) are
+    left as they are; returns their ids.
+    """
+    from trackers.models import Fund, Position, PositionHistoryBucket, FundProfitSummary, Trade
+
+    swapped, changed = [], []
+    created_at = timezone.now()
+    for result in results:
+        fund_id = result["fund_id"]
+        with lock_books(fund_books(fund_id)):
+            if since is not None and written_since(fund_id, since):
+                changed.append(fund_id)
+                continue
+            # Trade.position cascades, so unlink and clear history first; then nothing points at
+            # the old positions and they can go in one statement instead of through the collector
+            Trade.objects.filter(position__fund_id=fund_id).update(position=None)
+            PositionHistoryBucket.objects.filter(position__fund_id=fund_id).delete()
+            delete_rows(Position, "fund", [fund_id])
+            FundProfitSummary.objects.filter(fund_id=fund_id).delete()
+            funds_changed([fund_id])
+
+            positions = Position.objects.bulk_create([
+                Position(fund_id=fund_id, **values) for values in result["positions"]
+            ], batch_size=2000)
+            ids = [position.id for position in positions]
+
+            update_rows(Trade, ["position"], [(ids[i], trade_id) for trade_id, i in result["links"].items()])
+            position_history.insert_buckets(position_history.daily_buckets(
+                (ids[i], day, quantity, price, pnl) for i, day, quantity, price, pnl in result["history"]
+            ))
+            bulk_insert_rows(
+                FundProfitSummary,
+                ["fund", "start_date", "end_date", "weekly_profit", "monthly_profit", "annually_profit", "created_at"],
+                [(fund_id, start, end, weekly, monthly, annually, created_at)
+                 for (start, end), (weekly, monthly, annually) in result["summaries"].items()],
+            )
+            Fund.objects.filter(pk=fund_id).update(total_profit=result["total_profit"])
+        swapped.append(fund_id)
+
+    # Issuer summaries are sums of their funds', redo the ones these funds belong to
+    company_ids = set(Fund.objects.filter(id__in=swapped, company__isnull=False).values_list("company_id", flat=True))
+    if company_ids:
+        with transaction.atomic():
+            derive_company_summaries(company_ids)
+    return changed
+
+
+def rebuild(fund_ids=None, method=FIFO, workers=None, verify=False):
+    """
+    Rebuild (or with verify=True just diff) the derived state of `fund_ids`, or every fund.
+    Returns (results, diffs). Funds whose trades don't replay cleanly, or that got trades while
+    they were being replayed, are reported with an error, not swapped.
+    """
+    from trackers.models import Fund
+
+    if not fund_ids:
+        fund_ids = list(Fund.objects.values_list("id", flat=True))
+    started = timezone.now()
+    by_fund = load_trades(fund_ids)
+    for fund_id in fund_ids:
+        by_fund.setdefault(fund_id, [])
+
+    results = replay_all(by_fund, method=method, workers=workers)
+    good = [result for result in results if not result["error"]]
+    holdings = holding_profit([result["fund_id"] for result in good])
+    for result in good:
+        # Holding.sell books realized stock profit into the fund total as well
+        result["total_profit"] = result["trade_profit"] + holdings.get(result["fund_id"], ZERO)
+    for result in results:
+        if result["error"]:
+            logger.warning("Fund %s not rebuilt: %s", result["fund_id"], result["error"])
+
+    diffs = {}
+    if verify:
+        for result in good:
+            lines = diff_fund(result, live_state(result["fund_id"]))
+            if lines:
+                diffs[result["fund_id"]] = lines
+    else:
+        changed = set(swap(good, since=started))
+        for result in good:
+            if result["fund_id"] in changed:
+                result["error"] = "trades changed during the rebuild, run it again"
+                logger.warning("Fund %s not swapped: %s", result["fund_id"], result["error"])
+    logger.info("Replayed %s funds (%s failed) in %s", len(good), len(results) - len(good), timezone.now() - started)
+    return results, diffs
@@ -0,0 +1,250 @@
+"""
+Profit summary rollups recomputed from the Trade table.
+
+The summary rows are normally kept up to date by increments (ledger/summaries.py), so a
+missed, edited or deleted trade leaves them wrong until something recomputes them. A rollup
+does that with one GROUP BY over trades per level (fund, broker account): each trade is
+bucketed by its local date with TruncWeek/TruncMonth/TruncYear in the current timezone, and
+the week, month and year rows are written back as absolute values.
+
+Company (issuer) summaries are never incremented directly. They are derived from the fund
+summaries grouped by Fund.company, for just the companies and periods whose fund rows
+changed, so issuer pages read one row per period instead of adding up every fund.
+
+Incremental refreshes only look at trades whose `updated_at` is past the last run's
+watermark: the funds they belong to get every bucket in the years they touch recomputed (a
+year row needs the whole year anyway). Deleted trades and trades moved between funds leave no
+trace there, so a full refresh is still needed for those.
+"""
+import datetime
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Max, Min, Q, Sum, When
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth, TruncWeek, TruncYear
+from django.utils import timezone
+
+from trackers.parser.utils import get_week_range, get_month_range, get_year_range
+from .bulk import update_rows
+from .summaries import PROFIT_FIELDS, ZERO, brokers_changed, funds_changed
+
+logger = logging.getLogger(__name__)
+
+STATE_NAME = "profit_summaries"
+LEVELS = ("fund", "broker")
+
+
+def _owner(level):
+    """The trade's owner at `level`, going through its position's fund, or its option's fund if it has none."""
+    path = {"fund": "id", "broker": "broker_account_id"}[level]
+    return Case(
+        When(position__isnull=False, then=F(f"position__fund__{path}")),
+        default=F(f"option__fund__{path}"),
+    )
+
+
+def _summary_model(level):
+    from trackers.models import BrokerAccountProfitSummary, CompanyProfitSummary, FundProfitSummary
+
+    return {
+        "fund": (FundProfitSummary, "fund"),
+        "company": (CompanyProfitSummary, "company"),
+        "broker": (BrokerAccountProfitSummary, "broker"),
+    }[level]
+
+
+def _trades(level, tz):
+    from trackers.models import Trade
+
+    # Undated trades (old manual entries) count on the option's expiry, like the ledger rebuild
+    return Trade.objects.annotate(
+        owner=_owner(level),
+        day=Coalesce(TruncDate("date", tzinfo=tz), F("option__expiration_date")),
+    ).filter(owner__isnull=False)
+
+
+def rollup(level, owner_ids=None, window=None, tz=None):
+    """
+    Week, month and year profit per owner at `level`, from one GROUP BY over the trades.
+    Returns {(owner_id, start, end): [weekly, monthly, annually]}. `window` is a (first, last)
+    day range; buckets only partly inside it are left out since they'd be incomplete.
+    """
+    tz = tz or timezone.get_current_timezone()
+    trades = _trades(level, tz)
+    if owner_ids is not None:
+        trades = trades.filter(owner__in=owner_ids)
+    if window:
+        trades = trades.filter(day__range=window)
+
+    rows = trades.values(
+        "owner", week=TruncWeek("day"), month=TruncMonth("day"), year=TruncYear("day"),
+    ).annotate(total=Sum("total_price")).order_by()
+
+    sums = defaultdict(lambda: [ZERO, ZERO, ZERO])
+    for row in rows:
+        total = row["total"] or ZERO
+        for column, (start, end) in enumerate((
+            get_week_range(row["week"]), get_month_range(row["month"]), get_year_range(row["year"]),
+        )):
+            if window and (start < window[0] or end > window[1]):
+                continue
+            sums[(row["owner"], start, end)][column] += total
+    return sums
+
+
+def _in_scope(queryset, owner_field, owner_ids=None, window=None, periods=None):
+    if owner_ids is not None:
+        queryset = queryset.filter(**{f"{owner_field}__in": owner_ids})
+    if window:
+        queryset = queryset.filter(start_date__gte=window[0], end_date__lte=window[1])
+    if periods is not None:
+        match = Q(pk__in=[])
+        for start, end in set(periods):
+            match |= Q(start_date=start, end_date=end)
+        queryset = queryset.filter(match)
+    return queryset
+
+
+@transaction.atomic
+def write(level, sums, owner_ids=None, window=None, periods=None):
+    """
+    Make the stored summaries at `level` match `sums` within the scope (owners, window or
+    exact (start, end) periods) it was computed for: upsert the new values, delete rows in
+    scope that no longer have anything behind them.
+    """
+    model, owner_field = _summary_model(level)
+    scope = _in_scope(model.objects.all(), owner_field, owner_ids, window, periods)
+
+    owner_column = f"{owner_field}_id"
+    stale = {pk: key[0] for pk, *key in scope.values_list("pk", owner_column, "start_date", "end_date")
+             if tuple(key) not in sums}
+    scope.filter(pk__in=stale).delete()
+    changed = {owner_id for owner_id, _, _ in sums} | set(stale.values())
+    if level == "fund":
+        funds_changed(changed)
+    elif level == "broker":
+        brokers_changed(changed)
+
+    model.objects.bulk_create(
+        [model(**{owner_column: owner_id}, start_date=start, end_date=end, **dict(zip(PROFIT_FIELDS, values)))
+         for (owner_id, start, end), values in sums.items()],
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=[owner_field, "start_date", "end_date"],
+        update_fields=list(PROFIT_FIELDS),
+    )
+    return len(sums), len(stale)
+
+
+def derive_company_summaries(company_ids=None, window=None, periods=None):
+    """
+    Company summaries as the sum of their funds' summaries, for `company_ids` (or all) within
+    `window` / `periods` (or every period). One GROUP BY over FundProfitSummary.
+    """
+    from trackers.models import FundProfitSummary
+
+    rows = _in_scope(FundProfitSummary.objects.filter(fund__company__isnull=False), "fund__company",
+                     company_ids, window, periods)
+    rows = rows.values_list("fund__company", "start_date", "end_date").annotate(
+        *(Sum(name) for name in PROFIT_FIELDS)
+    ).order_by()
+    sums = {(company_id, start, end): [value or ZERO for value in values]
+            for company_id, start, end, *values in rows}
+    return write("company", sums, company_ids, window, periods)
+
+
+def holding_profit(fund_ids):
+    """Realized stock profit per fund, which Holding.sell books into the fund total as well."""
+    from trackers.models import Holding
+
+    rows = (Holding.objects.filter(fund_id__in=fund_ids)
+            .values("fund_id").annotate(total=Sum("realized_profit")))
+    return {row["fund_id"]: row["total"] or ZERO for row in rows}
+
+
+def refresh_fund_totals(fund_ids=None):
+    """Fund.total_profit recomputed as the sum of the fund's trades plus its realized holdings."""
+    from trackers.models import Fund
+
+    trades = _trades("fund", timezone.get_current_timezone())
+    funds = Fund.objects.all()
+    if fund_ids is not None:
+        trades = trades.filter(owner__in=fund_ids)
+        funds = funds.filter(id__in=fund_ids)
+    fund_ids = list(funds.values_list("id", flat=True))
+    totals = dict(trades.values_list("owner").annotate(total=Sum("total_price")).order_by())
+    holdings = holding_profit(fund_ids)
+    update_rows(Fund, ["total_profit"], [((totals.get(fund_id) or ZERO) + holdings.get(fund_id, ZERO), fund_id)
+                                         for fund_id in fund_ids])
+    funds_changed(fund_ids)
+
+
+def _window(first, last):
+    """Every day of the years `first`..`last` plus the edges of the weeks straddling them."""
+    return get_week_range(get_year_range(first)[0])[0], get_week_range(get_year_range(last)[1])[1]
+
+
+def dirty_scope(since, tz=None):
+    """
+    (fund_ids, company_ids, broker_ids, window) touched by trades updated after `since`,
+    or None if there are none.
+    """
+    from trackers.models import Fund
+
+    tz = tz or timezone.get_current_timezone()
+    changed = _trades("fund", tz).filter(updated_at__gt=since)
+    span = changed.aggregate(first=Min("day"), last=Max("day"))
+    if span["first"] is None:
+        return None
+    fund_ids = set(changed.values_list("owner", flat=True).distinct())
+    owners = Fund.objects.filter(id__in=fund_ids).values_list("company_id", "broker_account_id")
+    return (
+        fund_ids,
+        {company_id for company_id, _ in owners if company_id},
+        {broker_id for _, broker_id in owners if broker_id},
+        _window(span["first"], span["last"]),
+    )
+
+
+def refresh_rollups(full=False, tz=None):
+    """
+    Bring the fund and broker summaries (and fund totals) in line with the trades and the
+    company summaries in line with the funds': everything with full=True or on the first run,
+    otherwise only what changed since the last run. The fund leaderboard is re-ranked after.
+    Returns {level: (buckets written, stale rows deleted), "ranked": funds ranked}.
+    """
+    from trackers.models import RollupState
+
+    tz = tz or timezone.get_current_timezone()
+    state, _ = RollupState.objects.get_or_create(name=STATE_NAME)
+    # Trades saved by transactions still open at the last run may carry an older timestamp
+    lookback = datetime.timedelta(minutes=getattr(settings, "ROLLUP_LOOKBACK_MINUTES", 10))
+    started = timezone.now()
+
+    results = {}
+    with transaction.atomic():
+        if full or state.refreshed_at is None:
+            for level in LEVELS:
+                results[level] = write(level, rollup(level, tz=tz))
+            results["company"] = derive_company_summaries()
+            refresh_fund_totals()
+        else:
+            scope = dirty_scope(state.refreshed_at - lookback, tz=tz)
+            if scope:
+                fund_ids, company_ids, broker_ids, window = scope
+                for level, owner_ids in zip(LEVELS, (fund_ids, broker_ids)):
+                    results[level] = write(level, rollup(level, owner_ids, window, tz=tz), owner_ids, window)
+                results["company"] = derive_company_summaries(company_ids, window)
+                refresh_fund_totals(fund_ids)
+
+        # the fund leaderboard is ranked from the summaries just written
+        from trackers.analytics.leaderboard import refresh_leaderboard
+
+        results["ranked"] = refresh_leaderboard()
+        state.refreshed_at = started
+        state.save(update_fields=["refreshed_at"])
+
+    logger.info("Refreshed %s profit rollups: %s", "full" if full else "incremental", results)
+    return results
@@ -0,0 +1,192 @@
+"""
+Settlement of option positions at expiry.
+
+Every active position whose option has expired gets closed the way the broker would: an
+offsetting trade (BC for shorts, S for longs) at the contract's intrinsic value against the
+underlying's close on the expiration date (or the session before it, when the contract expires
+on an exchange holiday such as Good Friday). Out of the money that is zero, i.e. expired
+worthless; in the money it books the exercise value as a cash settlement. Closes are looked up
+per (underlying, expiry) with `expiry_closes` (Yahoo history, cached since they never change);
+positions whose close isn't known, or isn't final yet, are counted as unpriced and left for
+the next run. The live price is never used, a run catching up on older expiries would settle
+them at today's price.
+
+Everything is done in bulk: one query for the positions, one INSERT for the trades, one UPDATE
+for the positions, and the summary deltas flushed together as one upsert.
+"""
+import datetime
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Case, DecimalField, F, Value, When
+from django.utils import timezone
+
+from trackers.live.upstream import UpstreamUnavailable, guarded
+from trackers.scheduling.market_calendar import EXCHANGE_TZ, REGULAR_CLOSE, is_trading_day, session
+from . import history as position_history
+from .lots import SHORT_TYPES, annualized_yield
+from .locking import lock_books
+from .summaries import deferred_summaries
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal("0.00")
+CENT = Decimal("0.01")
+CLOSE_TTL = 60 * 60 * 24 * 30
+
+COLUMNS = (
+    "id", "fund_id", "option_id", "trade_type", "remaining_quantity", "average_price", "profit_loss",
+    "option__type", "option__strike_price", "option__expiration_date", "option__underlying_asset__name",
+    "option__underlying_asset__yahoo_ticker", "capital_at_risk", "date",
+)
+
+
+def fetch_close(symbol, day):
+    """Blocking Yahoo lookup of `symbol`'s close on `day`, or None if it has none for that day."""
+    import yfinance as yf
+
+    data = yf.Ticker(symbol).history(start=day, end=day + datetime.timedelta(days=1))
+    return None if data.empty else float(data["Close"].iloc[-1])
+
+
+def close_is_final(day, now=None):
+    """Has the session of `day` closed? False for days the market didn't open."""
+    hours = session(day)
+    return bool(hours) and (now or timezone.now()) >= hours[1]
+
+
+def settlement_day(expiry):
+    """The session whose close settles contracts expiring on `expiry`: that day, or the last one before it."""
+    day = expiry
+    while not is_trading_day(day):
+        day -= datetime.timedelta(days=1)
+    return day
+
+
+def expiry_closes(pairs, now=None):
+    """
+    {(symbol, expiry): close} for the (symbol, expiry) pairs whose settlement close (see
+    settlement_day) is final at `now` and known.
+    """
+    closes = {}
+    for symbol, expiry in sorted(pairs):
+        day = settlement_day(expiry)
+        if not close_is_final(day, now):
+            continue
+        key = f"close:{symbol.upper()}:{day.isoformat()}"
+        close = cache.get(key)
+        if close is None:
+            try:
+                close = guarded("yahoo", fetch_close, symbol, day)
+            except UpstreamUnavailable as e:
+                logger.warning(f"No close for {symbol} on {day}: {e}")
+                continue
+            if close is None:
+                continue
+            cache.set(key, close, CLOSE_TTL)
+        closes[(symbol, expiry)] = Decimal(str(close)).quantize(CENT)
+    return closes
+
+
+def intrinsic_value(option_type, strike, spot):
+    if option_type == "C":
+        return max(spot - strike, ZERO)
+    return max(strike - spot, ZERO)
+
+
+def settle_positions(positions, closes=expiry_closes):
+    """
+    Close every active position in the `positions` queryset at intrinsic value against its
+    underlying's close on the expiration date, as given by `closes` (see expiry_closes).
+    Returns {"worthless": n, "exercised": n, "unpriced": n, "trades": [Trade, ...]}.
+    """
+    from trackers.analytics.dashboards import invalidate_dashboards
+    from trackers.models import Fund, Position, Trade
+    from trackers.utils import update_fund_summary
+
+    positions = positions.filter(active=True)
+    keys = set(positions.values_list("fund_id", "option_id"))
+    result = {"worthless": 0, "exercised": 0, "unpriced": 0, "trades": []}
+    if not keys:
+        return result
+
+    # looked up before taking the locks, a slow upstream shouldn't hold up trading on these books
+    prices = closes({
+        (yahoo_ticker or name, expiry) for name, yahoo_ticker, expiry in positions.order_by().values_list(
+            "option__underlying_asset__name", "option__underlying_asset__yahoo_ticker", "option__expiration_date",
+        ).distinct()
+    })
+
+    with lock_books(keys):
+        # Re-read under the locks, a manual close may have beaten us to some of them
+        rows = list(positions.values_list(*COLUMNS))
+
+        trades, pnl_changes, yields, points = [], {}, {}, []
+        deltas = defaultdict(lambda: ZERO)
+        for (position_id, fund_id, option_id, trade_type, quantity, average_price, profit_loss,
+             option_type, strike, expiry, name, yahoo_ticker, capital_at_risk, opened) in rows:
+            spot = prices.get((yahoo_ticker or name, expiry))
+            if spot is None:
+                result["unpriced"] += 1
+                continue
+            value = intrinsic_value(option_type, strike, spot).quantize(Decimal("0.01"))
+            result["exercised" if value else "worthless"] += 1
+
+            trade = Trade(
+                position_id=position_id,
+                option_id=option_id,
+                trade_type="BC" if trade_type in SHORT_TYPES else "S",
+                quantity=quantity,
+                price=value,
+                date=datetime.datetime.combine(expiry, REGULAR_CLOSE, tzinfo=EXCHANGE_TZ),
+                active=False,
+                underlying_price=spot,
+            )
+            trade.calculate_total_price()
+            trades.append(trade)
+            if trade.total_price:
+                pnl_changes[position_id] = trade.total_price
+                yields[position_id] = annualized_yield(trade_type, profit_loss + trade.total_price, capital_at_risk,
+                                                       opened, expiry)
+                deltas[(fund_id, expiry)] += trade.total_price
+            points.append((position_id, expiry, 0, average_price, profit_loss + trade.total_price))
+
+        if not trades:
+            return result
+
+        result["trades"] = Trade.objects.bulk_create(trades)
+        Position.objects.filter(id__in=[trade.position_id for trade in trades]).update(
+            active=False,
+            remaining_quantity=0,
+            profit_loss=F("profit_loss") + Case(
+                *[When(id=position_id, then=Value(change)) for position_id, change in pnl_changes.items()],
+                default=Value(ZERO),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+            annual_yield=Case(
+                *[When(id=position_id, then=Value(value)) for position_id, value in yields.items()],
+                default=F("annual_yield"),
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            ),
+        )
+        position_history.record(points)
+        invalidate_dashboards(fund_ids={fund_id for fund_id, _ in keys})
+
+        funds = Fund.objects.in_bulk({fund_id for fund_id, _ in deltas})
+        with deferred_summaries():
+            for (fund_id, day), delta in deltas.items():
+                update_fund_summary(funds[fund_id], day, delta)
+
+    logger.info("Settled %s worthless and %s exercised positions (%s unpriced)",
+                result["worthless"], result["exercised"], result["unpriced"])
+    return result
+
+
+def settle_expired_positions(today=None, closes=expiry_closes):
+    """Settle every active position whose option expired before `today`."""
+    from trackers.models import Position
+
+    today = today or timezone.localdate()
+    return settle_positions(Position.objects.filter(option__expiration_date__lt=today), closes=closes)
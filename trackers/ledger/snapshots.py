@@ -0,0 +1,76 @@
+"""
+Period close: freeze finished week, month and year summaries into ProfitSnapshot.
+
+Every summary row whose period ended before the cutoff and has no snapshot yet is copied with
+one INSERT ... SELECT per summary table, skipping rows already frozen. Running it again is a
+no-op, and a run that was skipped (or a period that only got its first trade late) is simply
+picked up by the next one, so nothing depends on the job firing on the closing day.
+"""
+import datetime
+import logging
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .summaries import PROFIT_FIELDS
+
+logger = logging.getLogger(__name__)
+
+
+def _sources():
+    from trackers.models import BrokerAccountProfitSummary, CompanyProfitSummary, FundProfitSummary
+
+    return (
+        ("fund", FundProfitSummary, "fund"),
+        ("company", CompanyProfitSummary, "company"),
+        ("broker", BrokerAccountProfitSummary, "broker"),
+    )
+
+
+def close_periods(today=None):
+    """
+    Snapshot every summary period that ended before `today` minus PERIOD_CLOSE_GRACE_DAYS
+    (late imports and the nightly settlement still land in it until then).
+    Returns {level: snapshots written}.
+    """
+    from trackers.models import ProfitSnapshot
+
+    today = today or timezone.localdate()
+    cutoff = today - datetime.timedelta(days=getattr(settings, "PERIOD_CLOSE_GRACE_DAYS", 1))
+    closed_at = timezone.now()
+
+    meta = ProfitSnapshot._meta
+    using = router.db_for_write(ProfitSnapshot)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    columns = ", ".join(qn(meta.get_field(name).column) for name in (
+        "level", "owner_id", "start_date", "end_date", *PROFIT_FIELDS, "closed_at",
+    ))
+    keys = ", ".join(qn(meta.get_field(name).column) for name in ("level", "owner_id", "start_date", "end_date"))
+
+    written = {}
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        for level, model, owner in _sources():
+            source = model._meta
+            select = "SELECT %s, {}, {}, {}, {}, %s FROM {} WHERE {} < %s".format(
+                qn(source.get_field(owner).column),
+                qn(source.get_field("start_date").column),
+                qn(source.get_field("end_date").column),
+                ", ".join(qn(source.get_field(name).column) for name in PROFIT_FIELDS),
+                qn(source.db_table),
+                qn(source.get_field("end_date").column),
+            )
+            if connection.vendor == "mysql":
+                sql = f"INSERT IGNORE INTO {qn(meta.db_table)} ({columns}) {select}"
+            else:
+                sql = f"INSERT INTO {qn(meta.db_table)} ({columns}) {select} ON CONFLICT ({keys}) DO NOTHING"
+            cursor.execute(sql, [
+                level,
+                connection.ops.adapt_datetimefield_value(closed_at),
+                connection.ops.adapt_datefield_value(cutoff),
+            ])
+            written[level] = cursor.rowcount
+
+    logger.info("Closed periods ending before %s: %s", cutoff, written)
+    return written
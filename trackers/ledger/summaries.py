@@ -0,0 +1,213 @@
+"""
+Weekly, monthly and yearly profit summaries for funds, companies and broker accounts.
+
+A trade's profit lands in three rows per owner: its week's weekly_profit, its month's
+monthly_profit and its year's annually_profit. All three are written with one upsert against
+the (owner, start_date, end_date) unique constraint, adding in the database rather than in
+Python, so parallel imports neither duplicate rows nor lose each other's increments.
+
+Company summaries are not incremented, they are re-derived from their funds' rows for the
+periods a fund change touched (see ledger/rollups.py).
+
+Batch jobs wrap their work in `deferred_summaries()`: inside it the same calls only add to an
+in-memory accumulator keyed by (owner, period, period start), which is written out as one
+upsert per summary table (plus one UPDATE for the fund totals) right before the transaction
+commits. Summary writes then scale with the buckets touched instead of with the trades.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from django.utils import timezone
+
+from trackers.parser.utils import get_week_range, get_month_range, get_year_range
+from .bulk import upsert_increment
+from .lots import as_date
+
+ZERO = Decimal("0.00")
+PROFIT_FIELDS = ("weekly_profit", "monthly_profit", "annually_profit")
+PERIODS = ("week", "month", "year")
+
+_accumulator = ContextVar("summary_accumulator", default=None)
+
+
+def period_ranges(trade_date):
+    day = as_date(trade_date)
+    return get_week_range(day), get_month_range(day), get_year_range(day)
+
+
+def period_of(start, end):
+    """Which kind of summary row (start, end) is: "week", "month" or "year"."""
+    if (end - start).days == 6:
+        return "week"
+    return "year" if (start.month, end.month) == (1, 12) else "month"
+
+
+def period_rows(owner_id, trade_date, amount):
+    """The three (owner, start, end, weekly, monthly, annually) rows `amount` adds to."""
+    rows = []
+    for column, (start, end) in enumerate(period_ranges(trade_date)):
+        amounts = [ZERO, ZERO, ZERO]
+        amounts[column] = amount
+        rows.append((owner_id, start, end, *amounts))
+    return rows
+
+
+def _owner_field(model):
+    return next(field.name for field in model._meta.get_fields() if field.many_to_one)
+
+
+def _upsert(model, rows):
+    return upsert_increment(model, (_owner_field(model), "start_date", "end_date"), PROFIT_FIELDS, rows,
+                            extra={"created_at": timezone.now()})
+
+
+def funds_changed(fund_ids):
+    """Tell cached readers of these funds' summaries (chart series, dashboards) to reload after commit."""
+    from trackers.analytics.dashboards import invalidate_dashboards
+    from trackers.analytics.series import invalidate_fund_series
+
+    invalidate_fund_series(fund_ids)
+    invalidate_dashboards(fund_ids=fund_ids)
+
+
+def brokers_changed(broker_ids):
+    """Same for broker account summaries, which only the dashboards read."""
+    from trackers.analytics.dashboards import invalidate_dashboards
+
+    invalidate_dashboards(broker_ids=broker_ids)
+
+
+def _owners_changed(model, owner_ids):
+    from trackers.models import BrokerAccountProfitSummary, FundProfitSummary
+
+    if model is FundProfitSummary:
+        funds_changed(owner_ids)
+    elif model is BrokerAccountProfitSummary:
+        brokers_changed(owner_ids)
+
+
+def _update_fund_totals(totals):
+    from trackers.models import Fund
+
+    totals = {fund_id: amount for fund_id, amount in totals.items() if amount}
+    if not totals:
+        return 0
+    return Fund.objects.filter(pk__in=totals).update(total_profit=F("total_profit") + Case(
+        *[When(pk=fund_id, then=Value(amount)) for fund_id, amount in totals.items()],
+        default=Value(ZERO),
+        output_field=DecimalField(max_digits=15, decimal_places=2),
+    ))
+
+
+class SummaryAccumulator:
+    """Summary deltas collected in memory until `flush`."""
+
+    def __init__(self):
+        # model -> {(owner_id, period, start): [end, amount]}
+        self.deltas = defaultdict(dict)
+        self.fund_totals = defaultdict(lambda: ZERO)
+        # company_id -> {(start, end), ...} to re-derive after the fund rows are written
+        self.companies = defaultdict(set)
+        self.entries = 0
+
+    def add(self, model, owner_id, trade_date, amount):
+        buckets = self.deltas[model]
+        for period, (start, end) in zip(PERIODS, period_ranges(trade_date)):
+            bucket = buckets.get((owner_id, period, start))
+            if bucket is None:
+                buckets[(owner_id, period, start)] = [end, amount]
+            else:
+                bucket[1] += amount
+        self.entries += 1
+
+    def add_fund_total(self, fund_id, amount):
+        self.fund_totals[fund_id] += amount
+
+    def touch_company(self, company_id, trade_date):
+        self.companies[company_id].update(period_ranges(trade_date))
+
+    def flush(self):
+        """Write everything collected so far, one upsert per summary model. Returns the bucket count."""
+        written = 0
+        for model, buckets in self.deltas.items():
+            rows = []
+            for (owner_id, period, start), (end, amount) in buckets.items():
+                amounts = [ZERO, ZERO, ZERO]
+                amounts[PERIODS.index(period)] = amount
+                rows.append((owner_id, start, end, *amounts))
+            written += _upsert(model, rows)
+            _owners_changed(model, {owner_id for owner_id, _, _ in buckets})
+        _update_fund_totals(self.fund_totals)
+        if self.companies:
+            from .rollups import derive_company_summaries
+
+            derive_company_summaries(set(self.companies), periods=set().union(*self.companies.values()))
+        self.deltas.clear()
+        self.fund_totals.clear()
+        self.companies.clear()
+        self.entries = 0
+        return written
+
+
+@contextmanager
+def deferred_summaries(using=None):
+    """
+    Run the block in a transaction and collect summary updates made inside it, flushing them
+    in bulk just before commit. Nested uses share the outermost accumulator. If the block raises
+    nothing is written, together with the rest of the transaction.
+    """
+    accumulator = _accumulator.get()
+    if accumulator is not None:
+        yield accumulator
+        return
+
+    accumulator = SummaryAccumulator()
+    token = _accumulator.set(accumulator)
+    try:
+        with transaction.atomic(using=using):
+            yield accumulator
+            accumulator.flush()
+    finally:
+        _accumulator.reset(token)
+
+
+def add_profits(model, entries):
+    """
+    Add (owner_id, trade_date, amount) entries to a summary model: one upsert, or into the
+    active accumulator inside deferred_summaries().
+    """
+    accumulator = _accumulator.get()
+    if accumulator is not None:
+        for owner_id, trade_date, amount in entries:
+            accumulator.add(model, owner_id, trade_date, Decimal(amount))
+        return 0
+    rows = [row for owner_id, trade_date, amount in entries
+            for row in period_rows(owner_id, trade_date, Decimal(amount))]
+    _owners_changed(model, {row[0] for row in rows})
+    return _upsert(model, rows)
+
+
+def add_fund_profit(fund_id, amount):
+    """Fund.total_profit += amount, as an UPDATE so it can't race another writer (or deferred)."""
+    from trackers.models import Fund
+
+    accumulator = _accumulator.get()
+    if accumulator is not None:
+        accumulator.add_fund_total(fund_id, Decimal(amount))
+        return 0
+    return Fund.objects.filter(pk=fund_id).update(total_profit=F("total_profit") + Decimal(amount))
+
+
+def refresh_company(company_id, trade_date):
+    """Re-derive a company's summaries for the periods `trade_date` falls in (or defer it)."""
+    from .rollups import derive_company_summaries
+
+    accumulator = _accumulator.get()
+    if accumulator is not None:
+        accumulator.touch_company(company_id, trade_date)
+        return None
+    return derive_company_summaries({company_id}, periods=period_ranges(trade_date))
@@ -0,0 +1,53 @@
+import logging
+
+from celery import shared_task
+
+from . import rollups, settlement, snapshots
+from .history import compact
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def compact_position_history():
+    """Pack last month's (and any older) daily history buckets into monthly ones."""
+    try:
+        folded = compact()
+        logger.info(f"Compacted {folded} daily position history buckets.")
+        return f"Compacted {folded} buckets"
+    except Exception as e:
+        logger.error(f"Failed to compact position history: {e}", exc_info=True)
+        return "Compaction failed"
+
+
+@shared_task
+def settle_expired_positions():
+    """Close yesterday's (and any older) expired positions at intrinsic value."""
+    try:
+        result = settlement.settle_expired_positions()
+        return f"Settled {result['worthless']} worthless, {result['exercised']} exercised, {result['unpriced']} unpriced"
+    except Exception as e:
+        logger.error(f"Failed to settle expired positions: {e}", exc_info=True)
+        return "Settlement failed"
+
+
+@shared_task
+def refresh_profit_rollups(full=False):
+    """Recompute the profit summaries touched by trades changed since the last run (or all of them)."""
+    try:
+        results = rollups.refresh_rollups(full=full)
+        return f"Refreshed rollups: {results}"
+    except Exception as e:
+        logger.error(f"Failed to refresh profit rollups: {e}", exc_info=True)
+        return "Rollup refresh failed"
+
+
+@shared_task
+def close_profit_periods():
+    """Freeze every finished week, month and year summary that isn't frozen yet."""
+    try:
+        written = snapshots.close_periods()
+        return f"Closed periods: {written}"
+    except Exception as e:
+        logger.error(f"Failed to close profit periods: {e}", exc_info=True)
+        return "Period close failed"
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .pnl import mark_item
+from .quotes import PriceFeedFactory, get_quotes, refresh_quotes
+from .upstream import UpstreamUnavailable, call_upstream
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """One open stream: a user's book plus the queue the stream reads events from."""
+
+    def __init__(self, book, max_pending=100):
+        self.book = book
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.last_pnl = {}
+
+    @property
+    def symbols(self):
+        return set(self.book)
+
+    def snapshot(self, quotes):
+        items = []
+        for symbol, book_items in self.book.items():
+            quote = quotes.get(symbol)
+            if not quote:
+                continue
+            for item in book_items:
+                pnl = mark_item(item, quote["price"])
+                self.last_pnl[(item["kind"], item["id"])] = pnl
+                items.append({"kind": item["kind"], "id": item["id"], "symbol": symbol, "pnl": pnl})
+        return {"type": "snapshot", "quotes": quotes, "items": items}
+
+    def push(self, symbol, quote):
+        """Queue the P&L deltas caused by a new quote for `symbol`."""
+        items = []
+        total_delta = 0.0
+        for item in self.book.get(symbol, []):
+            key = (item["kind"], item["id"])
+            pnl = mark_item(item, quote["price"])
+            delta = round(pnl - self.last_pnl.get(key, pnl), 2)
+            self.last_pnl[key] = pnl
+            total_delta += delta
+            items.append({"kind": item["kind"], "id": item["id"], "pnl": pnl, "delta": delta})
+
+        event = {
+            "type": "delta",
+            "symbol": symbol,
+            "price": quote["price"],
+            "items": items,
+            "total_delta": round(total_delta, 2),
+        }
+        if self.queue.full():
+            # Slow consumer, drop the oldest event rather than grow without bound
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+
+class PriceHub:
+    """
+    Fans quote updates out to every open stream in this process.
+    One refresh loop fetches each subscribed symbol once per interval, no matter how many
+    tabs are watching it, and only pushes when the cached price actually moved.
+
+    The refresh runs on the upstream pool with a timeout (see upstream.call_upstream), never on
+    the thread that serves the sync views: a slow feed only delays the next push.
+    """
+
+    def __init__(self, feed=None, interval=None, timeout=None):
+        # kept for the hub's lifetime, the synthetic feed's walk continues from tick to tick
+        self.feed = feed or PriceFeedFactory.get_feed()
+        self.interval = interval or getattr(settings, "LIVE_REFRESH_SECONDS", 5)
+        self.timeout = timeout or getattr(settings, "LIVE_REFRESH_TIMEOUT_SECONDS", 10)
+        self.subscribers = defaultdict(set)
+        self.last_prices = {}
+        self._task = None
+
+    def subscribe(self, subscription):
+        for symbol in subscription.symbols:
+            self.subscribers[symbol].add(subscription)
+        self.ensure_running()
+
+    def unsubscribe(self, subscription):
+        for symbol in subscription.symbols:
+            subscribers = self.subscribers.get(symbol)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self.subscribers[symbol]
+                self.last_prices.pop(symbol, None)
+
+    def ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def run(self):
+        while self.subscribers:
+            try:
+                await self.tick()
+            except Exception as e:
+                logger.error(f"Live price tick failed: {e}", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    async def tick(self):
+        symbols = list(self.subscribers)
+        if not symbols:
+            return
+        try:
+            await call_upstream(f"{self.feed.name}-feed", refresh_quotes, symbols, self.feed, timeout=self.timeout)
+        except UpstreamUnavailable as e:
+            # whatever the cache already has still goes out
+            logger.warning(f"Live price refresh failed: {e}")
+        quotes = await sync_to_async(get_quotes, thread_sensitive=False)(symbols)
+
+        for symbol, quote in quotes.items():
+            if self.last_prices.get(symbol) == quote["price"]:
+                continue
+            self.last_prices[symbol] = quote["price"]
+            for subscription in list(self.subscribers.get(symbol, ())):
+                subscription.push(symbol, quote)
+
+
+_hub = None
+
+
+def get_hub():
+    global _hub
+    if _hub is None:
+        _hub = PriceHub()
+    return _hub
@@ -0,0 +1,66 @@
+from collections import defaultdict
+
+from trackers.models import Position, Holding
+
+
+def _symbol(asset):
+    return (asset.yahoo_ticker or asset.name).upper()
+
+
+def build_user_book(user):
+    """
+    Load a user's open positions and holdings once, as plain dicts grouped by underlying symbol.
+    The live stream marks these against new prices without touching the database again.
+    """
+    book = defaultdict(list)
+
+    positions = Position.objects.filter(
+        fund__broker_account__user=user, active=True, remaining_quantity__gt=0
+    ).select_related("option__underlying_asset", "fund")
+    for position in positions:
+        option = position.option
+        book[_symbol(option.underlying_asset)].append({
+            "kind": "position",
+            "id": position.id,
+            "fund": position.fund.name,
+            "ticker": option.ticker,
+            "type": option.type,
+            "strike": float(option.strike_price),
+            "short": position.trade_type in ["S", "SS"],
+            "quantity": position.remaining_quantity,
+            "profit_loss": float(position.profit_loss),
+        })
+
+    holdings = Holding.objects.filter(
+        fund__broker_account__user=user, quantity__gt=0
+    ).select_related("asset", "fund")
+    for holding in holdings:
+        book[_symbol(holding.asset)].append({
+            "kind": "holding",
+            "id": holding.id,
+            "fund": holding.fund.name,
+            "quantity": float(holding.quantity),
+            "total_cost": float(holding.total_cost),
+            "realized_profit": float(holding.realized_profit),
+        })
+
+    return dict(book)
+
+
+def mark_item(item, price):
+    """
+    P&L of one book item at `price`.
+    Holdings are marked to market. Option positions are marked to intrinsic value,
+    since we only have a live price for the underlying.
+    """
+    if item["kind"] == "holding":
+        return round(item["realized_profit"] + price * item["quantity"] - item["total_cost"], 2)
+
+    if item["type"] == "C":
+        intrinsic = max(0.0, price - item["strike"])
+    else:
+        intrinsic = max(0.0, item["strike"] - price)
+    value = intrinsic * 100 * item["quantity"]
+    if item["short"]:
+        value = -value
+    return round(item["profit_loss"] + value, 2)
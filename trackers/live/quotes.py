@@ -0,0 +1,123 @@
+import logging
+import random
+import time
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .upstream import UpstreamUnavailable, guarded
+
+logger = logging.getLogger(__name__)
+
+QUOTE_KEY_PREFIX = "quote:"
+QUOTE_TTL = 60 * 60 * 24
+
+
+def quote_key(symbol):
+    return f"{QUOTE_KEY_PREFIX}{symbol.upper()}"
+
+
+def get_quote(symbol):
+    """Return the cached quote for a symbol, or None if we never saw one."""
+    return cache.get(quote_key(symbol))
+
+
+def get_quotes(symbols):
+    """Return {symbol: quote} for every symbol that has a cached quote."""
+    keys = {quote_key(symbol): symbol for symbol in symbols}
+    found = cache.get_many(list(keys))
+    return {keys[key]: quote for key, quote in found.items()}
+
+
+async def aget_quote(symbol):
+    return await cache.aget(quote_key(symbol))
+
+
+def set_quote(symbol, price, source="live"):
+    quote = {
+        "symbol": symbol.upper(),
+        "price": round(float(price), 2),
+        "ts": time.time(),
+        "source": source,
+    }
+    cache.set(quote_key(symbol), quote, QUOTE_TTL)
+    return quote
+
+
+class PriceFeed(ABC):
+    name = None
+
+    @abstractmethod
+    def fetch(self, symbols):
+        """Return {symbol: price} for the given symbols. Missing symbols are skipped."""
+        pass
+
+
+def fetch_last_close(symbol):
+    """Blocking Yahoo lookup of the latest close for one symbol, or None."""
+    import yfinance as yf
+
+    data = yf.Ticker(symbol).history(period="1d")
+    return None if data.empty else float(data["Close"].iloc[-1])
+
+
+class YahooPriceFeed(PriceFeed):
+    name = "yahoo"
+
+    def fetch(self, symbols):
+        prices = {}
+        for symbol in symbols:
+            try:
+                price = guarded("yahoo", fetch_last_close, symbol)
+            except UpstreamUnavailable as e:
+                logger.warning(f"Price fetch failed for {symbol}: {e}")
+                continue
+            if price is not None:
+                prices[symbol] = price
+        return prices
+
+
+class SyntheticPriceFeed(PriceFeed):
+    """
+    Local random-walk feed for development and tests.
+    Starts every symbol at its seed price (or 100) and moves it by up to `step` percent per fetch.
+    """
+    name = "synthetic"
+
+    def __init__(self, seed_prices=None, step=0.5, seed=None):
+        self.prices = {symbol.upper(): float(price) for symbol, price in (seed_prices or {}).items()}
+        self.step = step
+        self.random = random.Random(seed)
+        self.calls = 0
+
+    def fetch(self, symbols):
+        self.calls += 1
+        prices = {}
+        for symbol in symbols:
+            current = self.prices.get(symbol, 100.0)
+            move = self.random.uniform(-self.step, self.step) / 100
+            self.prices[symbol] = max(0.01, current * (1 + move))
+            prices[symbol] = self.prices[symbol]
+        return prices
+
+
+class PriceFeedFactory:
+    @staticmethod
+    def get_feed(name=None):
+        name = name or getattr(settings, "LIVE_PRICE_FEED", "yahoo")
+        feeds = {
+            "yahoo": YahooPriceFeed,
+            "synthetic": SyntheticPriceFeed,
+        }
+        feed_class = feeds.get(name)
+        if not feed_class:
+            raise ValueError(f"No price feed named {name}")
+        return feed_class()
+
+
+def refresh_quotes(symbols, feed=None):
+    """Fetch fresh prices for `symbols` once and write them to the quote cache."""
+    feed = feed or PriceFeedFactory.get_feed()
+    prices = feed.fetch(sorted(set(symbols)))
+    return {symbol: set_quote(symbol, price, source=feed.name) for symbol, price in prices.items()}
@@ -0,0 +1,183 @@
+"""
+Guarded calls to slow upstream market-data services (Yahoo).
+
+Every call runs on a small shared thread pool with a hard timeout, behind a per-service
+circuit breaker. Views use `cached_upstream` so a slow or failing upstream degrades to the
+last good (stale) value instead of holding a worker.
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamUnavailable(Exception):
+    """Upstream is timing out, failing or saturated, and we have nothing cached to fall back to."""
+    pass
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through. After `failure_threshold` failures in a row the circuit opens and
+    calls are refused for `reset_timeout` seconds. Then one trial call is let through (half-open):
+    success closes the circuit again, failure re-opens it.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                if self.opened_at is None:
+                    logger.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+                self.opened_at = time.monotonic()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(
+                name,
+                failure_threshold=getattr(settings, "UPSTREAM_FAILURE_THRESHOLD", 5),
+                reset_timeout=getattr(settings, "UPSTREAM_RESET_SECONDS", 30),
+            )
+        return _breakers[name]
+
+
+class BoundedExecutor:
+    """Thread pool that refuses new work instead of queueing it once `max_pending` calls are in flight."""
+
+    def __init__(self, max_workers, max_pending):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upstream")
+        self.max_pending = max_pending
+        self.pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                return None
+            self.pending += 1
+        future = self.pool.submit(fn, *args, **kwargs)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _future):
+        with self._lock:
+            self.pending -= 1
+
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        workers = getattr(settings, "UPSTREAM_MAX_WORKERS", 4)
+        _executor = BoundedExecutor(max_workers=workers, max_pending=workers * 2)
+    return _executor
+
+
+async def call_upstream(service, fn, *args, timeout=None, passthrough=(ValueError,)):
+    """
+    Run blocking `fn(*args)` on the upstream pool with a hard timeout.
+    Exceptions listed in `passthrough` are caller errors (bad symbol, bad expiry): they are
+    re-raised without counting against the circuit.
+    """
+    breaker = get_breaker(service)
+    if not breaker.allow():
+        raise UpstreamUnavailable(f"{service} circuit is open")
+
+    future = get_executor().submit(fn, *args)
+    if future is None:
+        raise UpstreamUnavailable(f"{service} has too many calls in flight")
+
+    timeout = timeout or getattr(settings, "UPSTREAM_TIMEOUT_SECONDS", 3)
+    try:
+        result = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+    except passthrough:
+        breaker.record_success()
+        raise
+    except Exception as e:
+        breaker.record_failure()
+        raise UpstreamUnavailable(f"{service} call failed: {e!r}") from e
+    breaker.record_success()
+    return result
+
+
+async def cached_upstream(key, service, fn, *args, fresh_for=15, keep_for=60 * 60 * 24):
+    """
+    Return (value, stale) for `fn(*args)`, serving from cache while it is younger than `fresh_for`.
+    When upstream is slow or down we fall back to the last cached value and flag it stale.
+    """
+    cached = await cache.aget(key)
+    if cached and time.time() - cached["ts"] < fresh_for:
+        return cached["value"], False
+
+    try:
+        value = await call_upstream(service, fn, *args)
+    except UpstreamUnavailable as e:
+        if cached:
+            logger.info(f"Serving stale {key}: {e}")
+            return cached["value"], True
+        raise
+
+    await cache.aset(key, {"value": value, "ts": time.time()}, keep_for)
+    return value, False
+
+
+def guarded(service, fn, *args):
+    """Blocking variant for code already running off the event loop (Celery, the live hub)."""
+    breaker = get_breaker(service)
+    if not breaker.allow():
+        raise UpstreamUnavailable(f"{service} circuit is open")
+    try:
+        result = fn(*args)
+    except Exception as e:
+        breaker.record_failure()
+        raise UpstreamUnavailable(f"{service} call failed: {e!r}") from e
+    breaker.record_success()
+    return result
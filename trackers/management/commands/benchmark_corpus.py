@@ -0,0 +1,52 @@
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from trackers.benchmarks.corpus import digest, load_corpus, load_golden, save_golden, snapshot, state_changes
+from trackers.benchmarks.harness import scratch_database, format_results
+from trackers.benchmarks.suite import compare, format_comparison
+
+
+class Command(BaseCommand):
+    help = "Load the real issuer files and IBKR statements into a fresh database, timing each stage, against a golden digest"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--root", default=Path(settings.MEDIA_ROOT) / "excel_files")
+        parser.add_argument("--golden", default=getattr(settings, "BENCHMARK_CORPUS_GOLDEN",
+                                                        Path(settings.BASE_DIR).parent / "benchmarks" / "corpus.json"))
+        parser.add_argument("--save", action="store_true", help="Write this run's timings and digest as the golden file")
+        parser.add_argument("--tolerance", type=float, default=0.25,
+                            help="Slowdown (fraction) past which a stage counts as regressed")
+        parser.add_argument("--fail-on-regression", action="store_true")
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            results = load_corpus(options["root"])
+            state = snapshot()
+        total = results[-1]
+        self.stdout.write(f"{total['files']} files, {total['items']} rows, {state['trades']} trades, "
+                          f"{total['queries']} queries, peak RSS {total['peak_rss_mb']} MB")
+        self.stdout.write(format_results(results))
+        self.stdout.write(f"digest {digest(state)}")
+
+        path = options["golden"]
+        if options["save"]:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            save_golden(path, results, state)
+            self.stdout.write(f"Saved the golden output to {path}")
+            return
+        if not os.path.exists(path):
+            return
+
+        golden = load_golden(path)
+        rows = compare(results, golden["results"], options["tolerance"])
+        self.stdout.write(f"\nAgainst {path}:")
+        self.stdout.write(format_comparison(rows))
+        if digest(state) != golden["digest"]:
+            changes = "\n".join(state_changes(state, golden["state"]))
+            raise CommandError(f"The computed P&L differs from {path}:\n{changes}")
+        regressed = [row[0] for row in rows if row[-1]]
+        if regressed and options["fail_on_regression"]:
+            raise CommandError(f"Regressed: {', '.join(regressed)}")
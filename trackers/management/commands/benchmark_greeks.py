@@ -0,0 +1,50 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from trackers.analytics import greeks as bs
+
+
+class Command(BaseCommand):
+    help = "Time the vectorised implied-vol solve and Greeks over a synthetic book of option contracts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--contracts", type=int, default=100_000)
+        parser.add_argument("--funds", type=int, default=200)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        n = options["contracts"]
+        rng = np.random.default_rng(7)
+        spot = rng.uniform(20, 600, n)
+        strike = spot * rng.uniform(0.8, 1.25, n)
+        years = rng.integers(1, 60, n) / 365.0
+        is_call = rng.random(n) < 0.8
+        true_vol = rng.uniform(0.2, 1.5, n)
+        premium = bs.price(spot, strike, years, 0.04, true_vol, is_call)
+        size = -100.0 * rng.integers(1, 50, n)
+        fund = rng.integers(0, options["funds"], n)
+
+        timings = []
+        for _ in range(options["repeat"]):
+            start = time.perf_counter()
+            iv = bs.implied_vol(premium, spot, strike, years, 0.04, is_call)
+            per_share = bs.greeks(spot, strike, years, 0.04, np.where(np.isnan(iv), 0.6, iv), is_call)
+            net = {name: np.bincount(fund, weights=values * size) for name, values in per_share.items()}
+            timings.append(time.perf_counter() - start)
+
+        solved = ~np.isnan(iv)
+        # Vol is only pinned down where the premium moves with it; skip near-zero-vega contracts
+        sensitive = solved & (bs.greeks(spot, strike, years, 0.04, true_vol, is_call)["vega"] > 1.0)
+        error = np.abs(iv[sensitive] - true_vol[sensitive])
+        best = min(timings)
+        self.stdout.write(
+            f"{n:,} contracts, {options['funds']} funds: best {best * 1000:.0f} ms, "
+            f"median {sorted(timings)[len(timings) // 2] * 1000:.0f} ms ({n / best:,.0f} contracts/s)"
+        )
+        self.stdout.write(
+            f"IV solved for {solved.sum():,} ({solved.mean():.2%}), max abs error {error.max():.2e} "
+            f"where vega > 1 cent per vol point, "
+            f"net delta of fund 0: {net['delta'][0]:,.0f} shares"
+        )
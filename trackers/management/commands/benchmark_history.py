@@ -0,0 +1,50 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from trackers.benchmarks.harness import measure, scratch_database, table_bytes
+from trackers.benchmarks.synthetic import build_trade_book
+from trackers.ledger.history import compact, trajectory
+from trackers.models import Position, PositionHistoryBucket
+
+
+class Command(BaseCommand):
+    help = "Measure position history storage per position and trajectory read latency, before and after compaction"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--trades", type=int, default=100_000)
+        parser.add_argument("--funds", type=int, default=20)
+        parser.add_argument("--reads", type=int, default=2_000)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            entries = build_trade_book(trades=options["trades"], funds=options["funds"])
+            Position.objects.process_trades(entries)
+            positions = list(Position.objects.values_list("id", "date"))
+            sample = random.Random(1).sample(positions, min(options["reads"], len(positions)))
+
+            self.report("daily buckets", positions, sample)
+            results = []
+            with measure(results, "compact"):
+                folded = compact(before=timezone.localdate())
+            self.stdout.write(f"compacted {folded} daily buckets in {results[0]['seconds']:.2f}s")
+            self.report("packed monthly buckets", positions, sample)
+
+    def report(self, label, positions, sample):
+        size = table_bytes(PositionHistoryBucket)
+        rows = PositionHistoryBucket.objects.count()
+        per_position = f"{size / len(positions):.1f} bytes/position" if size else "size n/a"
+        self.stdout.write(f"{label}: {rows} rows for {len(positions)} positions, {per_position}")
+
+        start = time.perf_counter()
+        for position_id, opened in sample:
+            trajectory(position_id)
+        full = (time.perf_counter() - start) / len(sample) * 1000
+
+        start = time.perf_counter()
+        for position_id, opened in sample:
+            trajectory(position_id, opened, opened.replace(day=28))
+        ranged = (time.perf_counter() - start) / len(sample) * 1000
+        self.stdout.write(f"  trajectory read: {full:.3f} ms all history, {ranged:.3f} ms date range")
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+
+from trackers.benchmarks.harness import measure, scratch_database, format_results
+from trackers.benchmarks.synthetic import build_trade_book
+from trackers.ledger.lots import Ledger, LOT_SELECTION_METHODS, FIFO
+from trackers.models import Position, PositionHistoryBucket, Trade
+
+
+class Command(BaseCommand):
+    help = "Benchmark per-trade process_trade against batch lot-ledger replay on a synthetic book"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--trades", type=int, default=100_000)
+        parser.add_argument("--funds", type=int, default=20)
+        parser.add_argument("--per-trade-sample", type=int, default=2_000,
+                            help="Trades to push through process_trade one by one (extrapolated to --trades)")
+        parser.add_argument("--method", choices=LOT_SELECTION_METHODS, default=FIFO)
+
+    def handle(self, *args, **options):
+        results = []
+        with scratch_database():
+            entries = build_trade_book(trades=options["trades"], funds=options["funds"])
+            total = len(entries)
+            self.stdout.write(f"Synthetic book: {total} trades across {options['funds']} funds")
+
+            sample = entries[:options["per_trade_sample"]]
+            with measure(results, f"process_trade x {len(sample)}", items=len(sample)):
+                for fund, option, trade in sample:
+                    Position.objects.process_trade(fund, option, trade, method=options["method"])
+            per_trade = results[-1]
+            results.append({
+                "label": f"process_trade x {total} (extrapolated)",
+                "seconds": round(per_trade["seconds"] * total / max(len(sample), 1), 4),
+                "queries": per_trade["queries"] * total // max(len(sample), 1),
+                "items": total,
+            })
+
+            PositionHistoryBucket.objects.all().delete()
+            Position.objects.all().delete()
+            Trade.objects.update(position=None)
+
+            with measure(results, f"ledger in memory x {total}", items=total):
+                ledger = Ledger(options["method"])
+                for fund, option, trade in entries:
+                    ledger.apply((fund.id, option.id), trade)
+
+            with measure(results, f"process_trades batch x {total}", items=total):
+                Position.objects.process_trades(entries, method=options["method"])
+
+        self.stdout.write(format_results(results))
@@ -0,0 +1,49 @@
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from trackers.benchmarks.harness import scratch_database, format_results
+from trackers.benchmarks.suite import SCALES, compare, format_comparison, load_baseline, run_scale, save_baseline
+
+
+class Command(BaseCommand):
+    help = "Time import, replay, summaries, settlement and dashboard renders on synthetic books, against a JSON baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", nargs="+", choices=SCALES, default=["1x"])
+        parser.add_argument("--baseline", default=getattr(settings, "BENCHMARK_BASELINE",
+                                                          Path(settings.BASE_DIR).parent / "benchmarks" / "baseline.json"))
+        parser.add_argument("--save", action="store_true", help="Write this run's results into the baseline")
+        parser.add_argument("--tolerance", type=float, default=0.25,
+                            help="Slowdown (fraction) past which a case counts as regressed")
+        parser.add_argument("--fail-on-regression", action="store_true")
+
+    def handle(self, *args, **options):
+        results = []
+        for name in options["scale"]:
+            scale = SCALES[name]
+            self.stdout.write(f"{name}: {scale.users} users x {scale.trades} trades over {scale.funds} funds, "
+                              f"{scale.imports} imported rows")
+            with scratch_database():
+                results += run_scale(name, scale)
+        self.stdout.write(format_results(results))
+
+        path = options["baseline"]
+        baseline = load_baseline(path) if os.path.exists(path) else []
+        rows = compare(results, baseline, options["tolerance"])
+        if rows:
+            self.stdout.write(f"\nAgainst {path}:")
+            self.stdout.write(format_comparison(rows))
+
+        if options["save"]:
+            # keep the baseline's other scales
+            labels = {result["label"] for result in results}
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            save_baseline(path, [result for result in baseline if result["label"] not in labels] + results)
+            self.stdout.write(f"Saved {len(results)} results to {path}")
+
+        regressed = [row[0] for row in rows if row[-1]]
+        if regressed and options["fail_on_regression"]:
+            raise CommandError(f"Regressed: {', '.join(regressed)}")
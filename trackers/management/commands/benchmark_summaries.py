@@ -0,0 +1,57 @@
+from contextlib import nullcontext
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+
+from trackers.benchmarks.harness import measure, scratch_database, format_results
+from trackers.benchmarks.synthetic import build_trade_book
+from trackers.ledger.summaries import PROFIT_FIELDS, deferred_summaries
+from trackers.models import Fund, FundProfitSummary
+from trackers.parser.utils import get_week_range, get_month_range, get_year_range
+from trackers.utils import update_fund_summary
+
+
+def legacy_update_fund_summary(fund, trade_date, total_price):
+    """The old read-modify-write path: get_or_create + save per period, then save the fund."""
+    total_price = Decimal(total_price)
+    for column, (start, end) in zip(
+        PROFIT_FIELDS,
+        (get_week_range(trade_date), get_month_range(trade_date), get_year_range(trade_date)),
+    ):
+        summary, _ = FundProfitSummary.objects.get_or_create(fund=fund, start_date=start, end_date=end)
+        setattr(summary, column, getattr(summary, column) + total_price)
+        summary.save()
+    fund.total_profit += total_price
+    fund.save()
+
+
+class Command(BaseCommand):
+    help = "Benchmark the fund profit summary upserts, immediate and deferred, against the old get_or_create/save path"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--trades", type=int, default=20_000)
+        parser.add_argument("--funds", type=int, default=20)
+
+    def handle(self, *args, **options):
+        results = []
+        with scratch_database():
+            entries = build_trade_book(trades=options["trades"], funds=options["funds"])
+            total = len(entries)
+            self.stdout.write(f"Synthetic book: {total} trades across {options['funds']} funds")
+
+            for label, update, deferred in (("get_or_create + save", legacy_update_fund_summary, False),
+                                            ("upsert", update_fund_summary, False),
+                                            ("deferred upsert", update_fund_summary, True)):
+                FundProfitSummary.objects.all().delete()
+                Fund.objects.update(total_profit=0)
+                funds = Fund.objects.in_bulk()
+                with measure(results, f"{label} x {total}", items=total):
+                    with deferred_summaries() if deferred else nullcontext():
+                        for fund, option, trade in entries:
+                            update(funds[fund.id], trade.date.date(), trade.total_price)
+                totals = FundProfitSummary.objects.aggregate(*(Sum(name) for name in PROFIT_FIELDS))
+                self.stdout.write(f"  {label}: {FundProfitSummary.objects.count()} summary rows, "
+                                  f"totals {[str(value) for value in totals.values()]}")
+
+        self.stdout.write(format_results(results))
@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from trackers.ledger.lots import LOT_SELECTION_METHODS, FIFO
+from trackers.ledger.rebuild import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute positions, position history, fund summaries and fund totals from the Trade table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fund", type=int, action="append", dest="funds",
+                            help="Only rebuild this fund id (repeatable)")
+        parser.add_argument("--workers", type=int, default=None,
+                            help="Worker processes for the replay (default: one per CPU, 1 runs inline)")
+        parser.add_argument("--method", choices=LOT_SELECTION_METHODS, default=FIFO)
+        parser.add_argument("--verify", action="store_true",
+                            help="Diff rebuilt state against what is stored, without writing anything")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        results, diffs = rebuild(
+            fund_ids=options["funds"],
+            method=options["method"],
+            workers=options["workers"],
+            verify=options["verify"],
+        )
+        seconds = time.perf_counter() - start
+
+        for result in results:
+            if result["error"]:
+                self.stdout.write(self.style.ERROR(f"Fund {result['fund_id']} skipped: {result['error']}"))
+
+        trades = sum(len(result.get("links", ())) for result in results)
+        if options["verify"]:
+            for fund_id, lines in diffs.items():
+                self.stdout.write(self.style.WARNING(f"Fund {fund_id} drifted:"))
+                for line in lines:
+                    self.stdout.write(f"  {line}")
+            checked = len(results) - sum(1 for result in results if result["error"])
+            self.stdout.write(self.style.SUCCESS(
+                f"Verified {checked} funds ({trades} trades) in {seconds:.2f}s, {len(diffs)} drifted"
+            ))
+            if diffs:
+                raise CommandError(f"{len(diffs)} funds drifted from their trades")
+        else:
+            rebuilt = sum(1 for result in results if not result["error"])
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} funds ({trades} trades) in {seconds:.2f}s"))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from trackers.ledger.rollups import refresh_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute fund, company and broker profit summaries from the Trade table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true",
+                            help="Recompute every bucket instead of only those touched since the last run")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        results = refresh_rollups(full=options["full"])
+        seconds = time.perf_counter() - start
+        ranked = results.pop("ranked")
+        if not results:
+            self.stdout.write("No trades changed since the last refresh")
+        for level, (written, deleted) in results.items():
+            self.stdout.write(f"{level}: {written} buckets written, {deleted} stale rows deleted")
+        self.stdout.write(f"{ranked} funds ranked")
+        self.stdout.write(self.style.SUCCESS(f"Done in {seconds:.2f}s"))
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_history_to_buckets(apps, schema_editor):
+    """One daily bucket per (position, date) holding that day's rows, in the order they were written."""
+    PositionHistory = apps.get_model('trackers', 'PositionHistory')
+    PositionHistoryBucket = apps.get_model('trackers', 'PositionHistoryBucket')
+
+    buckets = []
+    current = None
+    rows = PositionHistory.objects.order_by('position_id', 'date', 'id').values_list(
+        'position_id', 'date', 'remaining_quantity', 'average_price', 'profit_loss',
+    )
+    for position_id, day, quantity, price, pnl in rows.iterator(chunk_size=5000):
+        if current is None or (current.position_id, current.day) != (position_id, day):
+            current = PositionHistoryBucket(position_id=position_id, day=day, span='D', points=[])
+            buckets.append(current)
+        current.points.append([quantity, str(price), str(pnl)])
+        if len(buckets) >= 5000:
+            PositionHistoryBucket.objects.bulk_create(buckets[:-1])
+            buckets = buckets[-1:]
+    PositionHistoryBucket.objects.bulk_create(buckets)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackers', '0004_alter_holding_broker_account_alter_holding_fund'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PositionHistoryBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('span', models.CharField(choices=[('D', 'Daily'), ('M', 'Monthly (packed)')], default='D', max_length=1)),
+                ('points', models.JSONField(blank=True, default=list)),
+                ('packed', models.BinaryField(blank=True, null=True)),
+                ('position', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='history_buckets', to='trackers.position')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='positionhistorybucket',
+            constraint=models.UniqueConstraint(fields=('position', 'day', 'span'), name='unique_position_history_bucket'),
+        ),
+        migrations.RunPython(copy_history_to_buckets, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='PositionHistory',
+        ),
+    ]
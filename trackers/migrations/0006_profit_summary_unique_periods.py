@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:54
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+PROFIT_FIELDS = ('weekly_profit', 'monthly_profit', 'annually_profit')
+
+
+def merge_duplicate_summaries(apps, schema_editor):
+    """Fold duplicate (owner, start_date, end_date) rows into the oldest one, summing the profits."""
+    for model_name, owner in (
+        ('FundProfitSummary', 'fund'),
+        ('CompanyProfitSummary', 'company'),
+        ('BrokerAccountProfitSummary', 'broker'),
+    ):
+        model = apps.get_model('trackers', model_name)
+        duplicates = (
+            model.objects.values(owner, 'start_date', 'end_date')
+            .annotate(rows=Count('id'), keep=Min('id'), **{f'total_{name}': Sum(name) for name in PROFIT_FIELDS})
+            .filter(rows__gt=1)
+        )
+        for group in duplicates:
+            rows = model.objects.filter(**{owner: group[owner]}, start_date=group['start_date'], end_date=group['end_date'])
+            rows.exclude(id=group['keep']).delete()
+            rows.filter(id=group['keep']).update(**{name: group[f'total_{name}'] for name in PROFIT_FIELDS})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackers', '0005_position_history_buckets'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_summaries, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='brokeraccountprofitsummary',
+            constraint=models.UniqueConstraint(fields=('broker', 'start_date', 'end_date'), name='unique_brokeraccount_profit_summary'),
+        ),
+        migrations.AddConstraint(
+            model_name='companyprofitsummary',
+            constraint=models.UniqueConstraint(fields=('company', 'start_date', 'end_date'), name='unique_company_profit_summary'),
+        ),
+        migrations.AddConstraint(
+            model_name='fundprofitsummary',
+            constraint=models.UniqueConstraint(fields=('fund', 'start_date', 'end_date'), name='unique_fund_profit_summary'),
+        ),
+    ]
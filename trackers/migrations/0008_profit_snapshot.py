@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:02
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackers', '0007_trade_updated_at_rollup_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfitSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.CharField(choices=[('fund', 'Fund'), ('company', 'Company'), ('broker', 'Broker account')], max_length=10)),
+                ('owner_id', models.BigIntegerField()),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('weekly_profit', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('monthly_profit', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('annually_profit', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('closed_at', models.DateTimeField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('level', 'owner_id', 'start_date', 'end_date'), name='unique_profit_snapshot')],
+            },
+        ),
+    ]
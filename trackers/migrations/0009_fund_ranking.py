@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:06
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackers', '0008_profit_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FundRanking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('week', 'Week'), ('month', 'Month'), ('year', 'Year'), ('all', 'All time')], max_length=10)),
+                ('start_date', models.DateField(blank=True, null=True)),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('profit', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+                ('rank', models.PositiveIntegerField()),
+                ('reverse_rank', models.PositiveIntegerField()),
+                ('ranked_at', models.DateTimeField()),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fund_rankings', to='trackers.company')),
+                ('fund', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rankings', to='trackers.fund')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['company', 'period', 'rank'], name='trackers_fu_company_97de0e_idx')],
+                'constraints': [models.UniqueConstraint(fields=('fund', 'period'), name='unique_fund_ranking')],
+            },
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:10
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+# Frozen copies of trackers.ledger.lots.position_terms and annualized_yield as they were when
+# this migration was written, so later changes to the ledger can't change or break it
+
+
+def position_terms(option_type, strike, price, quantity):
+    breakeven = strike - price if option_type == "P" else strike + price
+    return breakeven, price * 100 * quantity, strike * 100 * quantity
+
+
+def annualized_yield(trade_type, profit_loss, capital_at_risk, opened, expiry):
+    if trade_type not in ("S", "SS") or not capital_at_risk or opened is None:
+        return None
+    days = (expiry - opened).days
+    if days <= 0:
+        return None
+    days += 2 if days < 7 else 3
+    return (profit_loss / capital_at_risk * Decimal("365") / days * 100).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+def backfill_position_analytics(apps, schema_editor):
+    """Fill the new columns for existing positions, sized by the trade that opened each one."""
+    Position = apps.get_model('trackers', 'Position')
+    Trade = apps.get_model('trackers', 'Trade')
+    opening = Trade.objects.filter(position=OuterRef('pk')).order_by('date', 'id').values('quantity')[:1]
+    positions = Position.objects.select_related('option').annotate(opened=Subquery(opening))
+
+    batch = []
+    for position in positions.iterator(chunk_size=2000):
+        option = position.option
+        quantity = abs(position.opened or 0) or position.remaining_quantity
+        position.breakeven_price, position.entry_premium, position.capital_at_risk = position_terms(
+            option.type, option.strike_price, position.average_price, quantity,
+        )
+        position.annual_yield = annualized_yield(position.trade_type, position.profit_loss, position.capital_at_risk,
+                                                 position.date, option.expiration_date)
+        batch.append(position)
+        if len(batch) == 2000:
+            Position.objects.bulk_update(batch, ['breakeven_price', 'entry_premium', 'capital_at_risk', 'annual_yield'])
+            batch = []
+    Position.objects.bulk_update(batch, ['breakeven_price', 'entry_premium', 'capital_at_risk', 'annual_yield'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackers', '0009_fund_ranking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='position',
+            name='annual_yield',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='position',
+            name='breakeven_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='position',
+            name='capital_at_risk',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True),
+        ),
+        migrations.AddField(
+            model_name='position',
+            name='entry_premium',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.RunPython(backfill_position_analytics, migrations.RunPython.noop),
+    ]
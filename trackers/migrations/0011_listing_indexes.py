@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackers', '0010_position_analytics'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='position',
+            index=models.Index(fields=['fund', 'date', 'id'], name='trackers_po_fund_id_00a5e5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['date', 'id'], name='trackers_tr_date_fa69dd_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:59
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_entry_spots(apps, schema_editor):
+    """Existing trades and positions get the option's price snapshot, the entry spot used so far."""
+    Option = apps.get_model('trackers', 'Option')
+    Position = apps.get_model('trackers', 'Position')
+    Trade = apps.get_model('trackers', 'Trade')
+    snapshot = Subquery(Option.objects.filter(pk=OuterRef('option_id')).values('price')[:1])
+    Trade.objects.filter(underlying_price__isnull=True).update(underlying_price=snapshot)
+    Position.objects.filter(entry_spot__isnull=True).update(entry_spot=snapshot)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackers', '0011_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='position',
+            name='entry_spot',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='trade',
+            name='underlying_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.RunPython(backfill_entry_spots, migrations.RunPython.noop),
+    ]
@@ -31,8 +31,14 @@ from django.utils.text import slugify
 from datetime import timedelta, date, datetime
 from django.contrib.auth.models import User
 from django.db.models import UniqueConstraint
+from django.db.models.functions import Coalesce, Floor
 
 from .parser.utils import get_week_range, get_month_range, get_year_range
+from .ledger.lots import Ledger, Lot, FIFO, annualized_yield, as_date, position_terms
+from .ledger.bulk import bulk_update_rows
+from .ledger import history as position_history
+from .ledger.locking import lock_books
+from .ledger.summaries import ZERO, period_of
 
 class Company(models.Model):
     name = models.CharField(max_length=255, unique=True)
@@ -49,55 +55,6 @@ class Company(models.Model):
         super().save(*args, **kwargs)
 
 
-    def save_weekly_snapshot(self):
-        """Save weekly profit snapshot on Sundays."""
-        today = date.today()
-        if today.weekday() == 6:  # Sunday
-            CompanyProfitSummary.objects.create(
-                company=self,
-                start_date=today - timedelta(days=6),  # Last Monday
-                end_date=today,
-                weekly_profit=self.weekly_profit,
-                monthly_profit=self.monthly_profit,
-                annually_profit=self.annually_profit,
-            )
-            # Reset weekly profit for the new week
-            self.weekly_profit = 0
-            self.save()
-
-    def save_monthly_snapshot(self):
-        """Save monthly profit snapshot at the end of the month."""
-        today = date.today()
-        last_day_of_month = (today.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-        if today == last_day_of_month:
-            CompanyProfitSummary.objects.create(
-                company=self,
-                start_date=today.replace(day=1),  # First day of the month
-                end_date=today,
-                weekly_profit=self.weekly_profit,
-                monthly_profit=self.monthly_profit,
-                annually_profit=self.annually_profit,
-            )
-            # Reset monthly profit
-            self.monthly_profit = 0
-            self.save()
-
-    def save_annual_snapshot(self):
-        """Save annual profit snapshot on December 31st."""
-        today = date.today()
-        if today.month == 12 and today.day == 31:
-            CompanyProfitSummary.objects.create(
-                company=self,
-                start_date=today.replace(month=1, day=1),  # First day of the year
-                end_date=today,
-                weekly_profit=self.weekly_profit,
-                monthly_profit=self.monthly_profit,
-                annually_profit=self.annually_profit,
-            )
-            # Reset annual profit
-            self.annually_profit = 0
-            self.save()
-    
     def get_current_week_summary(self):
         today = datetime.today()
         start, end = get_week_range(today)
@@ -113,6 +70,24 @@ class Company(models.Model):
         start, end = get_year_range(today)
         return self.company_profit_summaries.filter(start_date=start, end_date=end).first()
 
+    @classmethod
+    def current_summaries(cls, company_ids, today=None):
+        """
+        {company_id: {"week": summary, "month": summary, "year": summary}} for the periods
+        containing `today`, read in one query (companies without a row get None).
+        """
+        today = today or date.today()
+        periods = {"week": get_week_range(today), "month": get_month_range(today), "year": get_year_range(today)}
+        match = models.Q()
+        for start, end in periods.values():
+            match |= models.Q(start_date=start, end_date=end)
+
+        result = {company_id: dict.fromkeys(periods) for company_id in company_ids}
+        by_range = {dates: name for name, dates in periods.items()}
+        for summary in CompanyProfitSummary.objects.filter(match, company_id__in=company_ids):
+            result[summary.company_id][by_range[(summary.start_date, summary.end_date)]] = summary
+        return result
+
 class CompanyProfitSummary(models.Model):
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name="company_profit_summaries")
     start_date = models.DateField()
@@ -124,6 +99,11 @@ class CompanyProfitSummary(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['company', 'start_date', 'end_date'], name='unique_company_profit_summary'),
+        ]
+
     def __str__(self):
         return f"Profit Summary for {self.company.name} on {self.start_date} -- {self.end_date}"
 
@@ -150,6 +130,80 @@ class UnderlyingAsset(models.Model):
         self.live_price_updated_at = datetime.now()
         self.save()
 
+def _money():
+    return models.DecimalField(max_digits=15, decimal_places=2)
+
+
+def _broker_sum(queryset, expression):
+    """Correlated SUM(expression) over `queryset` (rows with a `broker` annotation) for the outer BrokerAccount."""
+    total = (queryset.filter(broker=models.OuterRef("pk")).order_by().values("broker")
+             .annotate(total=models.Sum(expression, output_field=_money())).values("total"))
+    return Coalesce(models.Subquery(total), models.Value(ZERO), output_field=_money())
+
+
+class FundQuerySet(models.QuerySet):
+    def with_period_profits(self, today=None):
+        """
+        Annotate each fund with `week_profit`, `month_profit` and `year_profit`: its summary for
+        the period containing `today`, 0 without one. Subqueries on the unique
+        (fund, start_date, end_date) index, so listing funds stays one query.
+        """
+        today = today or now().date()
+        return self.annotate(**{
+            name: Coalesce(
+                models.Subquery(FundProfitSummary.objects.filter(
+                    fund=models.OuterRef("pk"), start_date=start, end_date=end,
+                ).values(column)[:1]),
+                models.Value(ZERO),
+                output_field=_money(),
+            )
+            for name, column, (start, end) in zip(
+                ("week_profit", "month_profit", "year_profit"),
+                ("weekly_profit", "monthly_profit", "annually_profit"),
+                (get_week_range(today), get_month_range(today), get_year_range(today)),
+            )
+        })
+
+
+class BrokerAccountQuerySet(models.QuerySet):
+    def with_profit_summaries(self, today=None):
+        """
+        Annotate each account with the week, month and year option profit of its funds, their
+        all-time option total and the realized plus unrealized gain/loss of their holdings.
+        Conditional SUMs in correlated subqueries, so it stays one query however many funds there are.
+        """
+        today = today or now().date()
+        periods = (get_week_range(today), get_month_range(today), get_year_range(today))
+        current = models.Q()
+        for start, end in periods:
+            current |= models.Q(start_date=start, end_date=end)
+        summaries = FundProfitSummary.objects.filter(current).annotate(broker=models.F("fund__broker_account"))
+        profits = {
+            name: _broker_sum(summaries, models.Case(
+                models.When(start_date=start, end_date=end, then=models.F(column)), default=models.Value(ZERO),
+            ))
+            for name, column, (start, end) in zip(
+                ("weekly_profit", "monthly_profit", "yearly_profit"),
+                ("weekly_profit", "monthly_profit", "annually_profit"),
+                periods,
+            )
+        }
+
+        holdings = Holding.objects.annotate(broker=models.F("fund__broker_account"))
+        # unrealized is 0 without a live price or with nothing left, like Holding.unrealized_profit
+        unrealized = models.Case(
+            models.When(models.Q(asset__live_price__isnull=True) | models.Q(asset__live_price=0) | models.Q(quantity=0),
+                        then=models.Value(ZERO)),
+            default=models.F("asset__live_price") * models.F("quantity") - models.F("total_cost"),
+            output_field=_money(),
+        )
+        return self.annotate(
+            **profits,
+            options_profit=_broker_sum(Fund.objects.annotate(broker=models.F("broker_account")), models.F("total_profit")),
+            holding_profit_loss=_broker_sum(holdings, models.F("realized_profit") + unrealized),
+        )
+
+
 class BrokerAccount(models.Model):
     BROKER_CHOICES = [
         ("IBKR", "Interactive Brokers"),
@@ -162,6 +216,8 @@ class BrokerAccount(models.Model):
     account_number = models.CharField(max_length=50, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = BrokerAccountQuerySet.as_manager()
+
     class Meta:
         unique_together = ("user", "broker_name") 
     
@@ -173,6 +229,19 @@ class BrokerAccount(models.Model):
             self.slug = slugify(self.broker_name)
         super().save(*args, **kwargs)
 
+    @property
+    def profit_summary(self):
+        """The P&L of an account loaded with BrokerAccount.objects.with_profit_summaries()."""
+        return {
+            "weekly": self.weekly_profit,
+            "monthly": self.monthly_profit,
+            "yearly": self.yearly_profit,
+            "total_all_time_options": self.options_profit,
+            "holding_profit_loss": self.holding_profit_loss,
+            "combined_total_all_time": self.options_profit + self.holding_profit_loss,
+            "name": self.broker_name,
+        }
+
 class BrokerAccountProfitSummary(models.Model):
     broker = models.ForeignKey(BrokerAccount, on_delete=models.CASCADE, related_name="brokeraccount_profit_summaries")
     start_date = models.DateField()
@@ -184,6 +253,11 @@ class BrokerAccountProfitSummary(models.Model):
     
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['broker', 'start_date', 'end_date'], name='unique_brokeraccount_profit_summary'),
+        ]
+
     def __str__(self):
         return f"BrokerAccount Summary for {self.broker.broker_name} on {self.start_date} -- {self.end_date}"
 
@@ -200,6 +274,8 @@ class Fund(models.Model):
 
     total_profit = models.DecimalField(max_digits=15, decimal_places=2, default=decimal.Decimal('0.00'))
 
+    objects = FundQuerySet.as_manager()
+
     class Meta:
         constraints = [
             UniqueConstraint(fields=['name', 'broker_account'], name='unique_fund_name_per_broker'),
@@ -219,66 +295,9 @@ class Fund(models.Model):
         super().save(*args, **kwargs)
 
     @property
-    def get_current_week_summary(self):
-        today = datetime.today()
-        start, end = get_week_range(today)
-        return self.fund_profit_summaries.filter(start_date=start, end_date=end).first() or decimal.Decimal(0.0)
-    @property
-    def get_current_month_summary(self):
-        today = datetime.today()
-        start, end = get_month_range(today)
-        return self.fund_profit_summaries.filter(start_date=start, end_date=end).first()
-    @property
-    def get_current_year_summary(self):
-        today = datetime.today()
-        start, end = get_year_range(today)
-        return self.fund_profit_summaries.filter(start_date=start, end_date=end).first()
-    @property
     def active_positions_count(self):
         return self.positions.filter(active=True).count()
 
-    @classmethod
-    def get_user_profit_summaries(cls, broker):
-        today = now().date()
-        week_start, week_end = get_week_range(today)
-        month_start, month_end = get_month_range(today)
-        year_start, year_end = get_year_range(today)
-
-        funds = cls.objects.filter(broker_account=broker).prefetch_related('fund_profit_summaries')
-        
-        total_weekly = Decimal('0.00')
-        total_monthly = Decimal('0.00')
-        total_yearly = Decimal('0.00')
-        total_all_time_options = Decimal('0.00')
-        total_holding_profit_loss = Decimal('0.00')
-        combined_total_all_time = Decimal('0.00')
-        
-        for fund in funds:
-            total_all_time_options += fund.total_profit
-
-            weekly = fund.fund_profit_summaries.filter(start_date=week_start, end_date=week_end).first()
-            monthly = fund.fund_profit_summaries.filter(start_date=month_start, end_date=month_end).first()
-            yearly = fund.fund_profit_summaries.filter(start_date=year_start, end_date=year_end).first()
-
-            total_weekly += weekly.weekly_profit if weekly else Decimal('0.00')
-            total_monthly += monthly.monthly_profit if monthly else Decimal('0.00')
-            total_yearly += yearly.annually_profit if yearly else Decimal('0.00')
-
-            # Add holding profit/loss
-            for holding in fund.holdings.all():
-                total_holding_profit_loss += holding.total_gain_loss
-
-        combined_total_all_time = total_all_time_options + total_holding_profit_loss
-        return {
-            "weekly": total_weekly,
-            "monthly": total_monthly,
-            "yearly": total_yearly,
-            "total_all_time_options": total_all_time_options,
-            "holding_profit_loss": total_holding_profit_loss,
-            "combined_total_all_time": combined_total_all_time,
-            "name": broker.broker_name
-        }
-
 class FundProfitSummary(models.Model):
     fund = models.ForeignKey(Fund, on_delete=models.CASCADE, related_name="fund_profit_summaries")
     start_date = models.DateField()
@@ -290,6 +309,12 @@ class FundProfitSummary(models.Model):
     
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # one row per fund and period, the summary upserts (ledger/summaries.py) rely on it
+        constraints = [
+            UniqueConstraint(fields=['fund', 'start_date', 'end_date'], name='unique_fund_profit_summary'),
+        ]
+
     def __str__(self):
         return f"Profit Summary for {self.fund.name} on {self.start_date} -- {self.end_date}"
     
@@ -317,6 +342,17 @@ class Option(models.Model):
 
     def __str__(self):
         return self.ticker
+
+    @staticmethod
+    def underlying_prices(option_ids):
+        """{option_id: its underlying's live price, or the option's price snapshot without one}."""
+        return {
+            option_id: live if live is not None else snapshot
+            for option_id, live, snapshot in Option.objects.filter(id__in=set(option_ids)).values_list(
+                "id", "underlying_asset__live_price", "price",
+            )
+        }
+
     def update_current_price(self, price):
         self.price = price
         self.save()
@@ -364,36 +400,6 @@ class Option(models.Model):
         elif self.type == "C":  # Call
             return self.strike_price + premium
         return None
-    
-    @property
-    def annual_yield(self):
-        print(">> Calculating annual_yield for:", self.ticker)
-        try:
-            trades = self.trades.filter(trade_type__in=["S", "SS"]).order_by("date")
-            if not trades.exists():
-                print("No qualifying trades for yield.")
-                return None
-
-            first_trade = trades.first()
-            days_held = (self.expiration_date - first_trade.date.date()).days
-
-            if days_held <= 0:
-                print("Invalid days_held:", days_held)
-                return None
-
-            total_credit = sum(t.total_price for t in trades)
-            if total_credit <= 0:
-                print("Invalid total_credit:", total_credit)
-                return None
-
-            # Use Decimal for all numeric literals
-            annual_yield = (total_credit / Decimal("100")) * (Decimal("365") / Decimal(days_held)) * Decimal("100")
-            return round(annual_yield, 2)
-
-        except Exception as e:
-            print("annual_yield error:", e)
-            return None
-
 
 
 class Trade(models.Model):
@@ -413,13 +419,30 @@ class Trade(models.Model):
     active = models.BooleanField(default=True)
 
     commission = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    # the underlying when the trade was recorded, entry spot of the lots it opens (analytics/risk.py)
+    underlying_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    # what the incremental summary rollups key off (ledger/rollups.py)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # keyset pages of a fund's trades, newest first (trackers/pagination.py)
+            models.Index(fields=['date', 'id']),
+        ]
 
     def save(self, *args, **kwargs):
+        self.calculate_total_price()
+        if self._state.adding and self.underlying_price is None:
+            self.underlying_price = Option.underlying_prices([self.option_id]).get(self.option_id)
+        super().save(*args, **kwargs)
+
+    def calculate_total_price(self):
+        """Signed cash flow of the trade net of commission. Call it yourself before bulk_create."""
         self.total_price = self.quantity * (self.price * 100)
         if self.trade_type in ["B", "BC"]:  # Buy or Short Sell
             self.total_price = -self.total_price
         self.total_price -= self.commission
-        super().save(*args, **kwargs)
+        return self.total_price
 
     def __str__(self):
         return f"{self.trade_type} {self.quantity} of {self.option.ticker}"
@@ -457,184 +480,143 @@ class Trade(models.Model):
 
         return annual_yield.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
 
-class PositionManager(models.Manager):
-    # @transaction.atomic
-    def process_trade(self, fund, option, trade):
+def _replay_order(trade, index):
+    # Trades replay by date, undated ones last, ties keep the order they were given in
+    return (trade.date is None, trade.date or datetime.min, index)
+
+def _moneyness(price):
+    """% the strike is out of the money against `price` (negative in the money), NULL without a price."""
+    strike = models.F("option__strike_price")
+    return models.Case(
+        models.When(models.Q(**{f"{price}__isnull": True}) | models.Q(**{price: 0}), then=models.Value(None)),
+        models.When(option__type="C", then=(strike - models.F(price)) * 100 / models.F(price)),
+        default=(models.F(price) - strike) * 100 / models.F(price),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+class PositionQuerySet(models.QuerySet):
+    def with_moneyness(self):
+        """
+        Annotate `moneyness_now` (against the underlying's live price) and `moneyness_at_snapshot`
+        (against the option's price snapshot, whole %) in SQL, with the option, underlying and
+        broker joined in, so a positions table is one query however long it is.
+        """
+        return self.select_related("option__underlying_asset", "fund__broker_account").annotate(
+            moneyness_now=_moneyness("option__underlying_asset__live_price"),
+            moneyness_at_snapshot=Floor(_moneyness("option__price")),
+        )
+
+
+class PositionManager(models.Manager.from_queryset(PositionQuerySet)):
+    def process_trade(self, fund, option, trade, method=FIFO):
         """
         Process a trade and update or create a position accordingly.
 
         Args:
             trade (Trade): The trade instance to process.
+        Returns the position the trade opened, or the last one it closed against.
         """
-        # Fetch the existing position for the given option and fund
-        position = self.filter(option=option, fund=fund, active=True).first()
-        if trade.trade_type == "BC":
-            # Get all active short positions sorted by oldest first (FIFO approach)
-            positions = self.filter(option=option, fund=fund, active=True).order_by('date')
-
-            if not positions:
-                raise ValueError(f"No existing short position to close for {option}.")
-
-            remaining_quantity_to_close = trade.quantity  # Track how much is left to close
-
-            for position in positions:
-                if remaining_quantity_to_close <= 0:
-                    break  # We have closed all needed contracts
-
-                # Determine how much we can close from this position
-                closing_quantity = min(remaining_quantity_to_close, abs(position.remaining_quantity))
-
-                # Calculate profit/loss
-                proportional_total_price = Decimal((closing_quantity / trade.quantity)) * trade.total_price
-                position.profit_loss += proportional_total_price
-
-                # Trade.Position
-                trade.position = position
-
-                # Update remaining quantity
-                position.remaining_quantity -= closing_quantity
-                remaining_quantity_to_close -= closing_quantity
-
-                # addint commission of trade 
-                position.commission += trade.commission * abs(trade.quantity)
-
-                # If position is fully closed, mark it inactive
-                if position.remaining_quantity <= 0:
-                    position.active = False
-
-                position.save()
-
-            # If after processing all positions, we still have contracts left to close, raise an error
-            if remaining_quantity_to_close > 0:
-                raise ValueError(f"Cannot close {trade.quantity}, only {trade.quantity - remaining_quantity_to_close} contracts available.")
-
-            print(f"Successfully closed {trade.quantity} of {option}")
-            
-        elif trade.trade_type in ["S", "SS"]:
-            # closing the position
-            if position and not (position.trade_type in ["S", "SS"]):
-                # Get all active short positions sorted by oldest first (FIFO approach)
-                positions = self.filter(option=option, fund=fund, active=True).order_by('date')
+        return self.process_trades([(fund, option, trade)], method=method)[0]
 
-                if not positions:
-                    raise ValueError(f"No existing short position to close for {option}.")
-
-                remaining_quantity_to_close = trade.quantity  # Track how much is left to close
-
-                for position in positions:
-                    if remaining_quantity_to_close <= 0:
-                        break  # We have closed all needed contracts
-
-                    # Determine how much we can close from this position
-                    closing_quantity = min(remaining_quantity_to_close, abs(position.remaining_quantity))
-
-                    # Calculate profit/loss
-                    proportional_total_price = Decimal((closing_quantity / trade.quantity)) * trade.total_price
-                    position.profit_loss += proportional_total_price
-
-                    # Trade.Position
-                    trade.position = position
-
-                    # Update remaining quantity
-                    position.remaining_quantity -= closing_quantity
-                    remaining_quantity_to_close -= closing_quantity
-
-                    # addint commission of trade 
-                    position.commission += trade.commission * abs(trade.quantity)
-
-                    # If position is fully closed, mark it inactive
-                    if position.remaining_quantity == 0:
-                        position.active = False
-
-                    position.save()
+    def process_trades(self, entries, method=FIFO):
+        """
+        Replay a batch of (fund, option, trade) entries in date order through the in-memory lot
+        ledger, then write positions, trade links and history rows with bulk operations.
 
-                # If after processing all positions, we still have contracts left to close, raise an error
-                if remaining_quantity_to_close > 0:
-                    raise ValueError(f"Cannot close {trade.quantity}, only {trade.quantity - remaining_quantity_to_close} contracts available.")
+        Lot selection for closing trades is `method`: FIFO, LIFO or HIGHEST_COST.
+        Returns the position for each entry, in the order given.
 
-                print(f"Successfully closed {trade.quantity} of {option}")
-            else:
-                # Create a new short position
-                position = Position.objects.create(
-                    option=option,
-                    fund=fund,
-                    remaining_quantity=abs(trade.quantity),  # Negative for short positions
-                    average_price=trade.price,
-                    profit_loss=trade.total_price,
-                    trade_type=trade.trade_type,
-                    date=trade.date,
-                    commission=trade.commission * abs(trade.quantity),
+        Runs in one transaction holding the lock of every (fund, option) book in the batch, so
+        concurrent imports and manual entries can't close the same contracts twice.
+        """
+        entries = list(entries)
+        keys = {(fund.id, option.id) for fund, option, _ in entries}
+        with lock_books(keys):
+            from trackers.analytics.dashboards import invalidate_dashboards
+
+            # bulk writes send no signals
+            invalidate_dashboards(fund_ids={fund_id for fund_id, _ in keys})
+            return self._replay(entries, keys, method)
+
+    def _replay(self, entries, keys, method):
+        ledger = Ledger(method)
+        rows = {}
+
+        # One query for every open lot the batch can touch
+        open_positions = self.select_related("option").filter(
+            active=True,
+            fund_id__in={fund_id for fund_id, _ in keys},
+            option_id__in={option_id for _, option_id in keys},
+        ).order_by("date", "id")
+        for position in open_positions:
+            key = (position.fund_id, position.option_id)
+            if key not in keys:
+                continue
+            lot = Lot(
+                position_id=position.id,
+                trade_type=position.trade_type,
+                remaining_quantity=position.remaining_quantity,
+                price=position.average_price,
+                profit_loss=position.profit_loss,
+                commission=position.commission,
+                date=position.date,
+            )
+            ledger.seed(key, lot)
+            rows[lot] = position
+
+        order = sorted(range(len(entries)), key=lambda i: _replay_order(entries[i][2], i))
+        last_lot = [None] * len(entries)
+        touched_lots = {}
+        history = []
+        for i in order:
+            fund, option, trade = entries[i]
+            touched = ledger.apply((fund.id, option.id), trade, label=option)
+            for lot in touched:
+                if lot not in rows:
+                    rows[lot] = Position(option=option, fund=fund, entry_spot=trade.underlying_price)
+                touched_lots[lot] = rows[lot]
+                history.append((lot, trade.date, lot.remaining_quantity, lot.price, lot.profit_loss))
+            last_lot[i] = touched[-1]
+
+        # Write lots back: new ones in one INSERT, changed ones in one UPDATE
+        created, updated = [], []
+        for lot, position in touched_lots.items():
+            option = position.option
+            position.trade_type = lot.trade_type
+            position.remaining_quantity = lot.remaining_quantity
+            position.average_price = lot.price
+            position.profit_loss = lot.profit_loss
+            position.commission = lot.commission
+            position.date = lot.date
+            position.active = lot.active
+            if lot.position_id is None:
+                position.breakeven_price, position.entry_premium, position.capital_at_risk = position_terms(
+                    option.type, option.strike_price, lot.price, lot.opened_quantity,
                 )
-                        
-        elif trade.trade_type == "B":
-            # closing the position
-            if position and not trade.trade_type == position.trade_type:
-                # Get all active short positions sorted by oldest first (FIFO approach)
-                positions = self.filter(option=option, fund=fund, active=True).order_by('date')
-
-                if not positions:
-                    raise ValueError(f"No existing short position to close for {option}.")
-
-                remaining_quantity_to_close = trade.quantity  # Track how much is left to close
-
-                for position in positions:
-                    if remaining_quantity_to_close <= 0:
-                        break  # We have closed all needed contracts
-
-                    # Determine how much we can close from this position
-                    closing_quantity = min(remaining_quantity_to_close, abs(position.remaining_quantity))
-
-                    # Calculate profit/loss
-                    proportional_total_price = Decimal((closing_quantity / trade.quantity)) * trade.total_price
-                    position.profit_loss += proportional_total_price
-
-                    # Trade.Position
-                    trade.position = position
-
-                    # Update remaining quantity
-                    position.remaining_quantity -= closing_quantity
-                    remaining_quantity_to_close -= closing_quantity
-
-                    # addint commission of trade 
-                    position.commission += trade.commission / abs(trade.quantity)
-
-                    # If position is fully closed, mark it inactive
-                    if position.remaining_quantity == 0:
-                        position.active = False
-
-                    position.save()
-
-                # If after processing all positions, we still have contracts left to close, raise an error
-                if remaining_quantity_to_close > 0:
-                    raise ValueError(f"Cannot close {trade.quantity}, only {trade.quantity - remaining_quantity_to_close} contracts available.")
-
-                print(f"Successfully closed {trade.quantity} of {option}")
-
+                created.append(position)
             else:
-                # Create a new short position
-                position = Position.objects.create(
-                    option=option,
-                    fund=fund,
-                    remaining_quantity=abs(trade.quantity),  # Negative for short positions
-                    average_price=trade.price,
-                    profit_loss=trade.total_price,
-                    trade_type=trade.trade_type,
-                    date=trade.date,
-                    commission=trade.commission * abs(trade.quantity),
-                )
-        else:
-            raise ValueError(f"Unsupported trade type: {trade.trade_type}")
-        
-        
-        # Create a history entry after the position is saved
-        PositionHistory.objects.create(
-            position=position,
-            date=trade.date,
-            remaining_quantity=position.remaining_quantity,
-            average_price=position.average_price,
-            profit_loss=position.profit_loss,
-        )
-        return position
+                updated.append(position)
+            position.annual_yield = annualized_yield(lot.trade_type, lot.profit_loss, position.capital_at_risk,
+                                                     lot.date, option.expiration_date)
+        self.bulk_create(created)
+        bulk_update_rows(updated, ["remaining_quantity", "profit_loss", "commission", "active", "annual_yield"])
+        for lot in touched_lots:
+            lot.position_id = rows[lot].id
+
+        trades = []
+        for i, (fund, option, trade) in enumerate(entries):
+            trade.position = rows[last_lot[i]]
+            if trade.pk:
+                trades.append(trade)
+        bulk_update_rows(trades, ["position"])
+
+        position_history.record([
+            (rows[lot].id, date, remaining_quantity, price, profit_loss)
+            for lot, date, remaining_quantity, price, profit_loss in history
+        ])
+        return [rows[lot] for lot in last_lot]
+
 class Position(models.Model):
     TRADE_TYPES = [
         ("B", "Buy"),
@@ -653,7 +635,21 @@ class Position(models.Model):
     date = models.DateField()
     active = models.BooleanField(default=True)
     commission = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+
+    # set when the lot opens (see ledger/lots.py position_terms), yield whenever its P&L moves
+    breakeven_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    entry_premium = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    capital_at_risk = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True)
+    annual_yield = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    # the opening trade's underlying_price, what the Greeks imply volatility against
+    entry_spot = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+
     objects = PositionManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['fund', 'date', 'id']),
+        ]
     def close_quantity(self, quantity, closing_price):
         if quantity > self.remaining_quantity:
             raise ValueError("Cannot close more than the remaining quantity.")
@@ -668,62 +664,133 @@ class Position(models.Model):
         return f"{self.remaining_quantity} of {self.option.ticker} in {self.fund.name}"
 
     @property
-    def annual_yield(self):
-        trades = list(
-            self.option.trades.filter(option__fund=self.fund).order_by("date")[:2]
-        )
+    def total_return(self):
+        return (self.profit_loss / (self.average_price * self.remaining_quantity)) if self.remaining_quantity else None
 
-        if not trades:
-            return None
+    def trajectory(self, start=None, end=None):
+        """(date, remaining_quantity, average_price, profit_loss) points between start and end."""
+        return position_history.trajectory(self.id, start, end)
 
-        # Calculate duration (including trade day)
-        trade_day = trades[0].date.date()
-        expiry_day = self.option.expiration_date
-        days_to_expiry = (expiry_day - trade_day).days  # include trade day
 
-        # Ensure minimum 1 day duration
-        if days_to_expiry <= 0:
-            return None
+class PositionHistoryBucket(models.Model):
+    """
+    A position's history points for one day, or for a whole month once compacted.
+    Read and written through trackers.ledger.history, not directly.
+    """
+    SPANS = [
+        ("D", "Daily"),
+        ("M", "Monthly (packed)"),
+    ]
+    # The unique index below starts with position, no need for a second one on the FK
+    position = models.ForeignKey(Position, on_delete=models.CASCADE, related_name="history_buckets", db_index=False)
+    day = models.DateField()
+    span = models.CharField(max_length=1, choices=SPANS, default="D")
+    points = models.JSONField(default=list, blank=True)
+    packed = models.BinaryField(null=True, blank=True)
 
-        # Optional: add weekend buffer (if it's a short duration trade)
-        if days_to_expiry < 7:
-            days_to_expiry += 2  # simulate weekend
-        else:
-            days_to_expiry += 3
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['position', 'day', 'span'], name='unique_position_history_bucket'),
+        ]
 
-        # === If only 1 trade (open position) ===
-        if len(trades) == 1:
-            return trades[0].annual_yield
+    def __str__(self):
+        return f"{self.position_id} history on {self.day} ({self.span})"
+
+class ProfitSnapshot(models.Model):
+    """
+    A week, month or year summary frozen as it stood when the period closed, for funds,
+    companies and broker accounts alike. Written by ledger/snapshots.py, never updated.
+    """
+    LEVELS = [
+        ("fund", "Fund"),
+        ("company", "Company"),
+        ("broker", "Broker account"),
+    ]
+    level = models.CharField(max_length=10, choices=LEVELS)
+    owner_id = models.BigIntegerField()
+    start_date = models.DateField()
+    end_date = models.DateField()
 
-        # === If 2 trades (closed position) ===
-        trade1, trade2 = trades
+    weekly_profit = models.DecimalField(max_digits=12, decimal_places=2, default=decimal.Decimal('0.00'))
+    monthly_profit = models.DecimalField(max_digits=12, decimal_places=2, default=decimal.Decimal('0.00'))
+    annually_profit = models.DecimalField(max_digits=12, decimal_places=2, default=decimal.Decimal('0.00'))
 
-        net_premium = trade1.total_price + trade2.total_price  # sell - buy
-        if net_premium <= 0:
-            return None
+    closed_at = models.DateTimeField()
 
-        quantity = abs(trade1.quantity)  # or trade2, they should match
-        capital_at_risk = self.option.strike_price * Decimal("100") * quantity
-        if capital_at_risk <= 0:
-            return None
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['level', 'owner_id', 'start_date', 'end_date'], name='unique_profit_snapshot'),
+        ]
 
-        yield_percent = (net_premium / capital_at_risk) * (Decimal("365") / days_to_expiry) * Decimal("100")
-        return yield_percent.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    def __str__(self):
+        return f"{self.get_level_display()} {self.owner_id} closed {self.start_date} -- {self.end_date}"
 
     @property
-    def total_return(self):
-        return (self.profit_loss / (self.average_price * self.remaining_quantity)) if self.remaining_quantity else None
+    def period(self):
+        return period_of(self.start_date, self.end_date)
 
 
-class PositionHistory(models.Model):
-    position = models.ForeignKey(Position, on_delete=models.CASCADE, related_name="history")
-    date = models.DateField()
-    remaining_quantity = models.IntegerField()
-    average_price = models.DecimalField(max_digits=10, decimal_places=2)
-    profit_loss = models.DecimalField(max_digits=12, decimal_places=2)
+class RollupState(models.Model):
+    """Watermark of an incremental rollup: trades updated after `refreshed_at` still need folding in."""
+    name = models.CharField(max_length=50, unique=True)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} refreshed at {self.refreshed_at}"
+
+
+class FundRanking(models.Model):
+    """
+    Where an issuer fund stands among its company's funds for the current week, month, year
+    and all time. Recomputed in full by analytics/leaderboard.py after each rollup refresh.
+    """
+    PERIODS = [
+        ("week", "Week"),
+        ("month", "Month"),
+        ("year", "Year"),
+        ("all", "All time"),
+    ]
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name="fund_rankings")
+    fund = models.ForeignKey("Fund", on_delete=models.CASCADE, related_name="rankings")
+    period = models.CharField(max_length=10, choices=PERIODS)
+    # None for all time
+    start_date = models.DateField(null=True, blank=True)
+    end_date = models.DateField(null=True, blank=True)
+
+    profit = models.DecimalField(max_digits=15, decimal_places=2, default=decimal.Decimal('0.00'))
+    rank = models.PositiveIntegerField()  # 1 = best
+    reverse_rank = models.PositiveIntegerField()  # 1 = worst
+    ranked_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['fund', 'period'], name='unique_fund_ranking'),
+        ]
+        indexes = [
+            models.Index(fields=['company', 'period', 'rank']),
+        ]
 
     def __str__(self):
-        return f"{self.remaining_quantity} of {self.position}"
+        return f"{self.fund} #{self.rank} at {self.company} ({self.get_period_display()})"
+
+    @classmethod
+    def leaders(cls, company_ids):
+        """
+        {company_id: {period: {"best": ranking, "worst": ranking}}} for every period, read in one
+        query (ties go to the fund that sorts first by name; a single fund is both).
+        """
+        result = {company_id: {period: {"best": None, "worst": None} for period, _ in cls.PERIODS}
+                  for company_id in company_ids}
+        rankings = (cls.objects.filter(models.Q(rank=1) | models.Q(reverse_rank=1), company_id__in=company_ids)
+                    .select_related("fund").order_by("fund__name"))
+        for ranking in rankings:
+            slots = result[ranking.company_id][ranking.period]
+            if ranking.rank == 1 and slots["best"] is None:
+                slots["best"] = ranking
+            if ranking.reverse_rank == 1 and slots["worst"] is None:
+                slots["worst"] = ranking
+        return result
+
 
 class Holding(models.Model):
     broker_account = models.ForeignKey(
@@ -0,0 +1,217 @@
+"""
+Issuer daily trade files (YieldMax, Defiance): "Date,Fund,Ticker,Type,Qty/Par Value,Exec Price".
+
+A file is loaded in stages, each one working on the whole file:
+
+  read      the CSV rows (BOM, padded or missing header and trailing empty columns tolerated)
+  parse     option trades as Records; blank rows, equity trades (CUSIP tickers) and unknown
+            trade types are dropped, "Expired" prices are 0
+  resolve   the company, funds, underlyings and options, created in bulk where missing
+  write     the trades, bulk created; rows already imported from an earlier run are skipped
+  position  Position.objects.process_trades over the new trades
+  summary   fund, company and period summaries, in one deferred flush
+
+parse_csv runs them all, the write stages in one transaction. benchmarks/corpus.py times them
+one by one.
+"""
+import csv
+import datetime
+import logging
+import re
+from collections import Counter, namedtuple
+from decimal import Decimal, InvalidOperation
+from string import digits
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from trackers.ledger.lots import Ledger, Lot
+from trackers.ledger.summaries import ZERO, deferred_summaries
+from trackers.models import Company, Fund, Option, Position, Trade, UnderlyingAsset
+from trackers.utils import update_fund_summary
+
+logger = logging.getLogger(__name__)
+
+Record = namedtuple("Record", "date fund ticker underlying option_type strike expiry trade_type quantity price")
+
+# "TSLA 250328C00250000", "SPXW  250326P05790000", "2AMD  250221P00145010" (adjusted contract)
+OCC_TICKER = re.compile(r"^(?P<root>[A-Z0-9.]+)\s+(?P<expiry>\d{6})(?P<type>[CP])(?P<strike>\d{8})$")
+TRADE_TYPES = {code for code, _ in Trade.TRADE_TYPES}
+EXPIRED_PRICES = {"EXPIRED", "-"}
+# the files carry the trade day only
+TRADE_TIME = datetime.time(16, 0)
+
+
+class BaseParser:
+    company_name = None
+    description = ""
+
+    def parse_csv(self, file_path):
+        """Load one file. Returns the (fund, option, trade) entries it added."""
+        records = self.parse(self.read(file_path))
+        with transaction.atomic():
+            entries = self.write(self.resolve(records))
+            self.position(entries)
+            self.summarise(entries)
+        logger.info(f"{self.company_name}: {len(entries)} trades from {file_path}")
+        return entries
+
+    def read(self, file_path):
+        with open(file_path, newline="", encoding="utf-8-sig") as f:
+            rows = list(csv.reader(f))
+        # one older export has no header row
+        if rows and rows[0] and rows[0][0].strip().lower() == "date":
+            rows = rows[1:]
+        return rows
+
+    def parse(self, rows):
+        records = []
+        for row in rows:
+            record = self.parse_row(row)
+            if record is not None:
+                records.append(record)
+        if len(records) < len(rows):
+            logger.debug(f"{self.company_name}: skipped {len(rows) - len(records)} of {len(rows)} rows")
+        return records
+
+    def parse_row(self, row):
+        """A Record for an option trade row, None for anything else."""
+        if len(row) < 6:
+            return None
+        day, fund, ticker, trade_type, quantity, price = (cell.strip() for cell in row[:6])
+        match = OCC_TICKER.match(ticker.upper())
+        trade_type = trade_type.upper()
+        if not (day and fund and match) or trade_type not in TRADE_TYPES:
+            return None
+        try:
+            date = datetime.datetime.strptime(day, "%m/%d/%Y").date()
+            quantity = abs(int(Decimal(quantity.replace(",", ""))))
+            if price.upper() in EXPIRED_PRICES:
+                price = Decimal("0.00")
+            else:
+                price = Decimal(price.replace(",", "")).quantize(Decimal("0.01"))
+        except (ValueError, InvalidOperation):
+            return None
+        if not quantity:
+            return None
+
+        root, expiry = match["root"], match["expiry"]
+        return Record(
+            date=timezone.make_aware(datetime.datetime.combine(date, TRADE_TIME)),
+            fund=fund.upper(),
+            ticker=f"{root} {expiry}{match['type']}{match['strike']}",
+            underlying=root.lstrip(digits) or root,
+            option_type=match["type"],
+            strike=Decimal(match["strike"]) / 1000,
+            expiry=datetime.datetime.strptime(expiry, "%y%m%d").date(),
+            trade_type=trade_type,
+            quantity=quantity,
+            price=price,
+        )
+
+    def resolve(self, records):
+        """[(fund, option, record), ...], creating whatever the records need that doesn't exist yet."""
+        if not records:
+            return []
+        company, _ = Company.objects.get_or_create(name=self.company_name, defaults={"description": self.description})
+
+        names = {record.fund for record in records}
+        funds = {fund.name: fund for fund in Fund.objects.filter(company=company, name__in=names)}
+        funds.update((fund.name, fund) for fund in Fund.objects.bulk_create([
+            Fund(name=name, slug=slugify(name), description="", company=company)
+            for name in sorted(names - funds.keys())
+        ]))
+
+        symbols = {record.underlying for record in records}
+        assets = {}
+        for asset in UnderlyingAsset.objects.filter(name__in=symbols).order_by("id"):
+            assets.setdefault(asset.name, asset)
+        assets.update((asset.name, asset) for asset in UnderlyingAsset.objects.bulk_create([
+            UnderlyingAsset(name=symbol, yahoo_ticker=symbol) for symbol in sorted(symbols - assets.keys())
+        ]))
+
+        # Tickers are unique across funds: a fund writing a contract another fund already
+        # holds gets it under "<ticker>-<fund>"
+        tickers = {record.ticker for record in records} | {f"{record.ticker}-{record.fund}" for record in records}
+        options = Option.objects.in_bulk(tickers, field_name="ticker")
+        new_options = []
+        resolved = []
+        for record in records:
+            fund = funds[record.fund]
+            ticker = record.ticker
+            option = options.get(ticker)
+            if option is not None and option.fund_id != fund.id:
+                ticker = f"{record.ticker}-{fund.name}"
+                option = options.get(ticker)
+            if option is None:
+                option = options[ticker] = Option(
+                    ticker=ticker, fund=fund, type=record.option_type, strike_price=record.strike,
+                    expiration_date=record.expiry, underlying_asset=assets[record.underlying],
+                )
+                new_options.append(option)
+            resolved.append((fund, option, record))
+        Option.objects.bulk_create(new_options, batch_size=2000)
+        return resolved
+
+    def write(self, resolved):
+        """Bulk create the trades, skipping rows an earlier import of the same file already wrote."""
+        if not resolved:
+            return []
+        existing = Counter(Trade.objects.filter(
+            option__in={option.id for _, option, _ in resolved},
+            date__in={record.date for _, _, record in resolved},
+        ).values_list("option_id", "trade_type", "quantity", "price", "date"))
+        spots = Option.underlying_prices(option.id for _, option, _ in resolved)
+
+        entries = []
+        for fund, option, record in resolved:
+            key = (option.id, record.trade_type, record.quantity, record.price, record.date)
+            if existing[key]:
+                existing[key] -= 1
+                continue
+            trade = Trade(option=option, trade_type=record.trade_type, quantity=record.quantity,
+                          price=record.price, date=record.date, underlying_price=spots.get(option.id))
+            trade.calculate_total_price()
+            entries.append((fund, option, trade))
+        Trade.objects.bulk_create([trade for _, _, trade in entries], batch_size=5000)
+        return entries
+
+    def position(self, entries):
+        """
+        Replay the new trades into positions. Closes the books can't cover (contracts opened
+        before the issuer's files start) are left without a position; their cash still counts.
+        """
+        covered = self.coverable(entries)
+        if len(covered) < len(entries):
+            logger.warning(f"{self.company_name}: {len(entries) - len(covered)} closing trades with no open contracts")
+        if covered:
+            Position.objects.process_trades(covered)
+
+    def coverable(self, entries):
+        """The entries the lot ledger can apply on top of the open positions, checked in memory."""
+        keys = {(fund.id, option.id) for fund, option, _ in entries}
+        ledger = Ledger()
+        open_lots = Position.objects.filter(
+            active=True,
+            fund_id__in={fund_id for fund_id, _ in keys},
+            option_id__in={option_id for _, option_id in keys},
+        ).order_by("date", "id").values_list("fund_id", "option_id", "trade_type", "remaining_quantity")
+        for fund_id, option_id, trade_type, quantity in open_lots:
+            if (fund_id, option_id) in keys:
+                ledger.seed((fund_id, option_id), Lot(trade_type, quantity, ZERO, ZERO, ZERO, None))
+
+        covered = []
+        # the order process_trades replays them in
+        for fund, option, trade in sorted(entries, key=lambda entry: entry[2].date):
+            try:
+                ledger.apply((fund.id, option.id), trade)
+            except ValueError:
+                continue
+            covered.append((fund, option, trade))
+        return covered
+
+    def summarise(self, entries):
+        with deferred_summaries():
+            for fund, _, trade in entries:
+                update_fund_summary(fund, trade.date, trade.total_price)
@@ -0,0 +1,6 @@
+from .base_parser import BaseParser
+
+
+class DefianceParser(BaseParser):
+    company_name = "Defiance"
+    description = "Defiance option income ETFs"
@@ -0,0 +1,6 @@
+from .base_parser import BaseParser
+
+
+class YieldMaxParser(BaseParser):
+    company_name = "YieldMax"
+    description = "YieldMax option income ETFs"
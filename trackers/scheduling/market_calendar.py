@@ -0,0 +1,113 @@
+"""
+US equity/options exchange calendar (NYSE rules), computed rather than looked up so it never
+needs a yearly data update.
+"""
+import datetime
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+EXCHANGE_TZ = ZoneInfo("America/New_York")
+REGULAR_OPEN = datetime.time(9, 30)
+REGULAR_CLOSE = datetime.time(16, 0)
+EARLY_CLOSE = datetime.time(13, 0)
+
+
+def _nth_weekday(year, month, weekday, n):
+    """n-th `weekday` (Mon=0) of a month; n=-1 for the last one."""
+    if n > 0:
+        first = datetime.date(year, month, 1)
+        return first + datetime.timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    if month == 12:
+        last = datetime.date(year, 12, 31)
+    else:
+        last = datetime.date(year, month + 1, 1) - datetime.timedelta(days=1)
+    return last - datetime.timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year):
+    """Gregorian Easter Sunday (anonymous computus)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return datetime.date(year, month, day + 1)
+
+
+def _observed(day):
+    """Saturday holidays are observed on Friday, Sunday holidays on Monday."""
+    if day.weekday() == 5:
+        return day - datetime.timedelta(days=1)
+    if day.weekday() == 6:
+        return day + datetime.timedelta(days=1)
+    return day
+
+
+@lru_cache(maxsize=32)
+def holidays(year):
+    days = set()
+    new_year = datetime.date(year, 1, 1)
+    # NYSE does not close on Friday Dec 31 when New Year's Day is a Saturday
+    if new_year.weekday() != 5:
+        days.add(_observed(new_year))
+    days.add(_nth_weekday(year, 1, 0, 3))   # Martin Luther King Jr. Day
+    days.add(_nth_weekday(year, 2, 0, 3))   # Washington's Birthday
+    days.add(_easter(year) - datetime.timedelta(days=2))  # Good Friday
+    days.add(_nth_weekday(year, 5, 0, -1))  # Memorial Day
+    if year >= 2022:
+        days.add(_observed(datetime.date(year, 6, 19)))  # Juneteenth
+    days.add(_observed(datetime.date(year, 7, 4)))
+    days.add(_nth_weekday(year, 9, 0, 1))   # Labor Day
+    days.add(_nth_weekday(year, 11, 3, 4))  # Thanksgiving
+    days.add(_observed(datetime.date(year, 12, 25)))
+    return frozenset(days)
+
+
+@lru_cache(maxsize=32)
+def early_closes(year):
+    days = set()
+    july_3 = datetime.date(year, 7, 3)
+    if july_3.weekday() < 5 and july_3 not in holidays(year):
+        days.add(july_3)
+    days.add(_nth_weekday(year, 11, 3, 4) + datetime.timedelta(days=1))  # Black Friday
+    christmas_eve = datetime.date(year, 12, 24)
+    if christmas_eve.weekday() < 5 and christmas_eve not in holidays(year):
+        days.add(christmas_eve)
+    return frozenset(days)
+
+
+def is_trading_day(day):
+    return day.weekday() < 5 and day not in holidays(day.year)
+
+
+def session(day):
+    """(open, close) as aware datetimes in exchange time, or None when the market is closed all day."""
+    if not is_trading_day(day):
+        return None
+    close = EARLY_CLOSE if day in early_closes(day.year) else REGULAR_CLOSE
+    return (
+        datetime.datetime.combine(day, REGULAR_OPEN, tzinfo=EXCHANGE_TZ),
+        datetime.datetime.combine(day, close, tzinfo=EXCHANGE_TZ),
+    )
+
+
+def is_open(moment):
+    moment = moment.astimezone(EXCHANGE_TZ)
+    hours = session(moment.date())
+    return bool(hours) and hours[0] <= moment < hours[1]
+
+
+def trading_days_between(start, end):
+    """Trading days in (start, end], e.g. 0 when an option expires today."""
+    count = 0
+    day = start
+    while day < end:
+        day += datetime.timedelta(days=1)
+        if is_trading_day(day):
+            count += 1
+    return count
@@ -0,0 +1,117 @@
+"""
+Decides which underlyings are worth refreshing right now.
+
+Only underlyings behind open positions or holdings are tracked. Each gets a refresh interval from
+the trading session and its own risk: faster around the open and close, and faster for contracts
+close to expiry or to the money. Nothing is refreshed outside market hours except one closing pass.
+"""
+import datetime
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
+
+from trackers.models import Position, Holding, UnderlyingAsset
+from trackers.analytics.dashboards import invalidate_dashboards
+from trackers.live.quotes import PriceFeedFactory, refresh_quotes
+from . import market_calendar
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def tracked_underlyings(today):
+    """{asset_id: {"expiry": nearest expiry, "strikes": [...]}} for everything we hold or have open."""
+    tracked = defaultdict(lambda: {"expiry": None, "strikes": []})
+    positions = Position.objects.filter(
+        active=True, remaining_quantity__gt=0, option__expiration_date__gte=today
+    ).values_list("option__underlying_asset_id", "option__expiration_date", "option__strike_price")
+    for asset_id, expiry, strike in positions:
+        info = tracked[asset_id]
+        if info["expiry"] is None or expiry < info["expiry"]:
+            info["expiry"] = expiry
+        info["strikes"].append(strike)
+
+    for asset_id in Holding.objects.filter(quantity__gt=0).values_list("asset_id", flat=True).distinct():
+        tracked[asset_id]
+    return dict(tracked)
+
+
+def refresh_interval(moment, hours, info, price):
+    """Seconds between refreshes for one underlying at `moment` during the session `hours`."""
+    fast = _setting("MARKET_REFRESH_FAST_SECONDS", 120)
+    medium = _setting("MARKET_REFRESH_MEDIUM_SECONDS", 300)
+    base = _setting("MARKET_REFRESH_BASE_SECONDS", 900)
+    edge = datetime.timedelta(minutes=_setting("MARKET_EDGE_MINUTES", 30))
+
+    open_at, close_at = hours
+    if moment - open_at < edge or close_at - moment < edge:
+        return fast
+
+    interval = base
+    if info["expiry"] is not None:
+        days_left = market_calendar.trading_days_between(moment.date(), info["expiry"])
+        if days_left <= 1:
+            return fast
+        if days_left <= 5:
+            interval = medium
+
+    if price and info["strikes"]:
+        distance = min(abs(strike - price) / price for strike in info["strikes"])
+        if distance <= Decimal("0.02"):
+            return fast
+        if distance <= Decimal("0.05"):
+            interval = min(interval, medium)
+    return interval
+
+
+def due_underlyings(moment=None):
+    """Tracked underlyings whose last refresh is older than their interval."""
+    moment = (moment or timezone.now()).astimezone(market_calendar.EXCHANGE_TZ)
+    hours = market_calendar.session(moment.date())
+    if not hours or moment < hours[0]:
+        return []
+
+    tracked = tracked_underlyings(moment.date())
+    if not tracked:
+        return []
+
+    due = []
+    for asset in UnderlyingAsset.objects.filter(id__in=tracked):
+        updated_at = asset.live_price_updated_at
+        if moment >= hours[1]:
+            # One closing pass per day to pick up the official close
+            if updated_at is None or updated_at < hours[1]:
+                due.append(asset)
+            continue
+        interval = refresh_interval(moment, hours, tracked[asset.id], asset.live_price)
+        if updated_at is None or (moment - updated_at).total_seconds() >= interval:
+            due.append(asset)
+    return due
+
+
+def refresh_underlyings(assets, feed=None):
+    """
+    Fetch each asset once, then write prices back in bulk. Returns the refreshed assets.
+    Only the underlyings' live prices move: Option.price is the underlying at trade time.
+    """
+    by_symbol = {asset.yahoo_ticker or asset.name.upper(): asset for asset in assets}
+    quotes = refresh_quotes(by_symbol, feed or PriceFeedFactory.get_feed())
+    refreshed_at = timezone.now()
+
+    refreshed = []
+    for symbol, quote in quotes.items():
+        asset = by_symbol[symbol]
+        asset.live_price = Decimal(str(quote["price"]))
+        asset.live_price_updated_at = refreshed_at
+        refreshed.append(asset)
+
+    UnderlyingAsset.objects.bulk_update(refreshed, ["live_price", "live_price_updated_at"])
+    # holding P&L on the dashboards is marked at the live price
+    invalidate_dashboards(asset_ids=[asset.id for asset in refreshed])
+    return refreshed
@@ -0,0 +1,55 @@
+import datetime
+import logging
+
+from celery import shared_task
+from django.conf import settings
+from django.utils import timezone
+
+from trackers.csv_downloader.factory import FactoryScraper
+from . import market_calendar
+from .planner import due_underlyings, refresh_underlyings
+
+logger = logging.getLogger(__name__)
+
+# Local exchange time after which each issuer's daily holdings file is available
+DEFAULT_PUBLISH_TIMES = {
+    "YieldMax": "17:00",
+    "Defiance": "17:30",
+}
+
+
+@shared_task
+def refresh_market_data():
+    try:
+        due = due_underlyings(timezone.now())
+        if not due:
+            return "Nothing due"
+        refreshed = refresh_underlyings(due)
+        logger.info(f"Refreshed {len(refreshed)} of {len(due)} due underlyings.")
+        return f"Refreshed {len(refreshed)} underlyings"
+    except Exception as e:
+        logger.error(f"Failed to refresh market data: {e}", exc_info=True)
+        return "Refresh failed"
+
+
+@shared_task
+def download_published_issuer_files():
+    """Download each issuer's file once per trading day, after its publish time."""
+    moment = timezone.now().astimezone(market_calendar.EXCHANGE_TZ)
+    if not market_calendar.is_trading_day(moment.date()):
+        return "Market closed today"
+
+    downloaded = []
+    publish_times = getattr(settings, "ISSUER_PUBLISH_TIMES", DEFAULT_PUBLISH_TIMES)
+    for company, published in publish_times.items():
+        if moment.time() < datetime.time.fromisoformat(published):
+            continue
+        try:
+            scraper = FactoryScraper.get_scraper(company)
+            if scraper.file_path.exists():
+                continue
+            scraper.download()
+            downloaded.append(company)
+        except Exception as e:
+            logger.error(f"Failed to download {company} file: {e}", exc_info=True)
+    return f"Downloaded {', '.join(downloaded) or 'nothing'}"
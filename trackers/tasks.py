@@ -13,6 +13,9 @@ from .file_manager import FileManagerFactory
 from .data_parser import ParserFactory, TransactionProcessor
 from .csv_downloader.tasks import download_daily_trades
 from .market_scraper.tasks import update_trade_prices
+from .scheduling.tasks import refresh_market_data, download_published_issuer_files
+from .ledger.tasks import compact_position_history, settle_expired_positions, refresh_profit_rollups, close_profit_periods
+from .analytics.tasks import warm_dashboards
 logger = logging.getLogger(__name__)
 
 @shared_task
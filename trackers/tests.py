@@ -1,3 +1,985 @@
-from django.test import TestCase
+import asyncio
+import io
+import os
+import time
+import datetime
+import tempfile
+import threading
+import warnings
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
+from celery.signals import task_postrun, task_prerun
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from trackers.models import (
+    BrokerAccount, BrokerAccountProfitSummary, Company, Fund, FundProfitSummary, FundRanking, UnderlyingAsset, Holding, Option, Position, PositionHistoryBucket, ProfitSnapshot, Trade,
+)
+from trackers.ledger.lots import LIFO
+from trackers.ledger.rebuild import rebuild
+from trackers.ledger.rollups import refresh_rollups
+from trackers.ledger.history import compact
+from trackers.ledger.locking import lock_book
+from trackers.ledger.settlement import expiry_closes, settle_expired_positions
+from trackers.ledger.snapshots import close_periods
+from trackers.ledger.summaries import deferred_summaries
+from trackers.analytics import dashboards, greeks as bs
+from trackers.analytics.leaderboard import refresh_leaderboard
+from trackers.analytics.risk import user_greeks
+from trackers.benchmarks.corpus import digest, load_corpus, snapshot
+from trackers.benchmarks.suite import Scale, compare, run_scale
+from trackers.IBKR.parser import ParserFactory
+from trackers.instrumentation.budgets import assert_query_budget
+from trackers.instrumentation.store import ProfileStore
+from trackers.live.hub import PriceHub, Subscription
+from trackers.live.pnl import build_user_book
+from trackers.live.quotes import SyntheticPriceFeed
+from trackers.live.upstream import UpstreamUnavailable, cached_upstream, get_breaker
+from trackers.parser.yieldmax import YieldMaxParser
+from trackers.scheduling.market_calendar import EXCHANGE_TZ
+from trackers.scheduling.planner import due_underlyings, refresh_underlyings
+from trackers.tasks import process_company_file
+from trackers.utils import update_Broker_summary, update_fund_summary
+
+
+class LivePriceHubTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("trader", password="x")
+        broker = BrokerAccount.objects.create(user=self.user, broker_name="IBKR")
+        fund = Fund.objects.create(name="TSLY", broker_account=broker)
+        asset = UnderlyingAsset.objects.create(name="TSLA")
+        Holding.objects.create(
+            broker_account=broker, fund=fund, asset=asset,
+            quantity=Decimal("10"), average_price=Decimal("100"), total_cost=Decimal("1000"),
+        )
+
+    def test_one_fetch_per_tick_for_many_subscribers(self):
+        feed = SyntheticPriceFeed({"TSLA": 100}, seed=1)
+        hub = PriceHub(feed=feed, interval=1)
+        book = build_user_book(self.user)
+        tabs = [Subscription(book) for _ in range(100)]
+        for tab in tabs:
+            for symbol in tab.symbols:
+                hub.subscribers[symbol].add(tab)
+
+        async_to_sync(hub.tick)()
+        async_to_sync(hub.tick)()
+
+        self.assertEqual(feed.calls, 2)
+        for tab in tabs:
+            self.assertEqual(tab.queue.qsize(), 2)
+        event = tabs[0].queue.get_nowait()
+        self.assertEqual(event["symbol"], "TSLA")
+        self.assertEqual(event["items"][0]["pnl"], round(event["price"] * 10 - 1000, 2))
+
+    @override_settings(LIVE_PRICE_FEED="synthetic")
+    def test_the_feed_is_kept_across_ticks(self):
+        hub = PriceHub(interval=1)
+        hub.subscribers["TSLA"].add(Subscription(build_user_book(self.user)))
+        async_to_sync(hub.tick)()
+        async_to_sync(hub.tick)()
+        self.assertEqual(hub.feed.calls, 2)
+
+    def test_a_slow_feed_times_out_off_the_request_thread(self):
+        released = threading.Event()
+        self.addCleanup(released.set)
+
+        class SlowFeed(SyntheticPriceFeed):
+            def fetch(self, symbols):
+                released.wait(5)
+                return {}
+
+        hub = PriceHub(feed=SlowFeed(), interval=1, timeout=0.1)
+        tab = Subscription(build_user_book(self.user))
+        hub.subscribers["TSLA"].add(tab)
+        start = time.perf_counter()
+        with self.assertLogs("trackers.live.hub", "WARNING"):
+            async_to_sync(hub.tick)()
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertTrue(tab.queue.empty())
+
+
+@override_settings(UPSTREAM_TIMEOUT_SECONDS=0.05, UPSTREAM_FAILURE_THRESHOLD=2)
+class UpstreamGuardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_slow_upstream_serves_stale_then_opens_circuit(self):
+        fetch = async_to_sync(cached_upstream)
+        self.assertEqual(fetch("chain:test", "slow-service", lambda: "fresh", fresh_for=0), ("fresh", False))
+
+        def slow():
+            time.sleep(0.2)
+            return "late"
+
+        self.assertEqual(fetch("chain:test", "slow-service", slow, fresh_for=0), ("fresh", True))
+        self.assertEqual(fetch("chain:test", "slow-service", slow, fresh_for=0), ("fresh", True))
+        self.assertEqual(get_breaker("slow-service").state, "open")
+
+        with self.assertRaises(UpstreamUnavailable):
+            fetch("chain:other", "slow-service", lambda: "never called")
+
+
+class MarketRefreshPlannerTests(TestCase):
+    def setUp(self):
+        broker = BrokerAccount.objects.create(user=User.objects.create_user("trader"), broker_name="IBKR")
+        fund = Fund.objects.create(name="TSLY", broker_account=broker)
+        self.tsla = UnderlyingAsset.objects.create(name="TSLA", live_price=Decimal("250"))
+        self.idle = UnderlyingAsset.objects.create(name="IDLE", live_price=Decimal("10"))
+        option = Option.objects.create(
+            ticker="TSLA260116C00300000", fund=fund, type="C", strike_price=Decimal("300"),
+            expiration_date=datetime.date(2026, 1, 16), underlying_asset=self.tsla,
+        )
+        Position.objects.create(
+            option=option, fund=fund, remaining_quantity=1, average_price=Decimal("2"),
+            trade_type="S", date=datetime.date(2026, 1, 2),
+        )
+
+    def at(self, *args):
+        return datetime.datetime(*args, tzinfo=EXCHANGE_TZ)
+
+    def test_only_tracked_underlyings_in_market_hours(self):
+        self.assertEqual(due_underlyings(self.at(2026, 1, 10, 12)), [])  # Saturday
+        self.assertEqual(due_underlyings(self.at(2026, 1, 19, 12)), [])  # MLK day
+        self.assertEqual(due_underlyings(self.at(2026, 1, 12, 8)), [])   # before the open
+        self.assertEqual(due_underlyings(self.at(2026, 1, 12, 12)), [self.tsla])
+
+    def test_interval_tightens_near_expiry(self):
+        self.tsla.live_price_updated_at = self.at(2026, 1, 12, 12)
+        self.tsla.save()
+        # 20% out of the money, four trading days out: medium interval at midday
+        self.assertEqual(due_underlyings(self.at(2026, 1, 12, 12, 3)), [])
+        self.assertEqual(due_underlyings(self.at(2026, 1, 12, 12, 5)), [self.tsla])
+        self.tsla.live_price_updated_at = self.at(2026, 1, 15, 12)
+        self.tsla.save()
+        # One trading day to expiry: fast interval
+        self.assertEqual(due_underlyings(self.at(2026, 1, 15, 12, 3)), [self.tsla])
+
+    def test_refresh_moves_live_prices_only(self):
+        Option.objects.update(price=Decimal("240"))
+        refresh_underlyings([self.tsla], SyntheticPriceFeed({"TSLA": 260}, step=0))
+        self.tsla.refresh_from_db()
+        self.assertEqual(self.tsla.live_price, Decimal("260"))
+        # the snapshot taken when the option was traded stays
+        self.assertEqual(Option.objects.get().price, Decimal("240"))
+
+
+class LedgerTestCase(TestCase):
+    def setUp(self):
+        broker = BrokerAccount.objects.create(user=User.objects.create_user("writer"), broker_name="IBKR")
+        self.fund = Fund.objects.create(name="NVDY", broker_account=broker)
+        self.option = Option.objects.create(
+            ticker="NVDA260116C00150000", fund=self.fund, type="C", strike_price=Decimal("150"),
+            expiration_date=datetime.date(2026, 1, 16), underlying_asset=UnderlyingAsset.objects.create(name="NVDA"),
+        )
+
+    def trade(self, trade_type, quantity, price, day):
+        return Trade.objects.create(
+            option=self.option, trade_type=trade_type, quantity=quantity, price=Decimal(price),
+            commission=Decimal("1.00"), date=datetime.datetime(2026, 1, day, 10, tzinfo=datetime.timezone.utc),
+        )
+
+
+class LotLedgerTests(LedgerTestCase):
+    def test_partial_close_splits_pnl_in_cents(self):
+        first = Position.objects.process_trade(self.fund, self.option, self.trade("S", 2, "1.00", 2))
+        second = Position.objects.process_trade(self.fund, self.option, self.trade("S", 2, "2.00", 5))
+        closing = self.trade("BC", 3, "0.50", 6)
+        Position.objects.process_trade(self.fund, self.option, closing)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertFalse(first.active)
+        self.assertEqual(second.remaining_quantity, 1)
+        # BC 3 @ 0.50 is -151.00, split 2/3 and 1/3 with the remainder on the last lot
+        self.assertEqual(first.profit_loss, Decimal("199.00") - Decimal("100.67"))
+        self.assertEqual(second.profit_loss, Decimal("399.00") - Decimal("50.33"))
+        self.assertEqual(closing.position, second)
+
+    def test_batch_matches_lifo(self):
+        trades = [self.trade("S", 2, "1.00", 2), self.trade("S", 2, "2.00", 5), self.trade("BC", 2, "0.50", 6)]
+        positions = Position.objects.process_trades([(self.fund, self.option, t) for t in trades], method=LIFO)
+        self.assertEqual(positions[2], positions[1])
+        self.assertEqual(Position.objects.filter(active=True).get(), positions[0])
+        self.assertEqual(Trade.objects.get(pk=trades[2].pk).position, positions[1])
+
+    def test_over_close_raises(self):
+        Position.objects.process_trade(self.fund, self.option, self.trade("S", 1, "1.00", 2))
+        with self.assertRaises(ValueError):
+            Position.objects.process_trade(self.fund, self.option, self.trade("BC", 2, "0.50", 3))
+
+
+class PositionAnalyticsTests(LedgerTestCase):
+    def test_analytics_are_stored_and_tables_query_once(self):
+        position = Position.objects.process_trade(self.fund, self.option, self.trade("S", 2, "1.00", 2))
+        self.assertEqual((position.breakeven_price, position.entry_premium, position.capital_at_risk),
+                         (Decimal("151.00"), Decimal("200.00"), Decimal("30000.00")))
+        self.assertEqual(position.annual_yield, Decimal("14.24"))  # 199 / 30000 over 14 days + 3
+        Position.objects.process_trade(self.fund, self.option, self.trade("BC", 1, "0.50", 5))
+        self.assertEqual(Position.objects.get().annual_yield, Decimal("10.59"))  # 148 left
+
+        self.option.underlying_asset.live_price = Decimal("120")
+        self.option.underlying_asset.save()
+        self.assertEqual(Position.objects.with_moneyness().get().moneyness_now, Decimal("25.00"))
+
+        self.client.force_login(self.fund.broker_account.user)
+        url = reverse("user_fund_detail", args=[self.fund.broker_account.broker_name, self.fund.id, self.fund.slug])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertContains(self.client.get(url, {"all": "true"}), "25.00%")
+        for day in range(6, 12):
+            Position.objects.process_trade(self.fund, self.option, self.trade("S", 1, "1.00", day))
+        with self.assertNumQueries(len(queries)):
+            self.client.get(url, {"all": "true"})
+
+
+@override_settings(LISTING_PAGE_SIZE=2)
+class KeysetPaginationTests(LedgerTestCase):
+    def test_feeds_walk_every_row_once_newest_first(self):
+        trades = [self.trade("S", 1, "1.00", day) for day in (2, 5, 5, 9)]
+        undated = self.trade("S", 1, "1.00", 9)
+        Trade.objects.filter(pk=undated.pk).update(date=None)
+        self.client.force_login(self.fund.broker_account.user)
+
+        url, seen, cursor = reverse("fund_trades_feed", args=[self.fund.id]), [], None
+        while True:
+            page = self.client.get(url, {"all": "true", **({"cursor": cursor} if cursor else {})}).json()
+            seen += [row["id"] for row in page["results"]]
+            cursor = page["next"]
+            if not cursor:
+                break
+        self.assertEqual(seen, [trades[3].id, trades[2].id, trades[1].id, trades[0].id, undated.id])
+        self.assertEqual(self.client.get(url, {"cursor": "nope"}).status_code, 400)
+
+        for trade in trades:
+            Position.objects.process_trade(self.fund, self.option, trade)
+        page = self.client.get(reverse("fund_positions_feed", args=[self.fund.id]), {"all": "true", "size": 3}).json()
+        self.assertEqual([row["date"] for row in page["results"]], ["2026-01-09", "2026-01-05", "2026-01-05"])
+        detail = reverse("user_fund_detail", args=[self.fund.broker_account.broker_name, self.fund.id, self.fund.slug])
+        self.assertEqual(len(self.client.get(detail, {"all": "true", "cursor": page["next"]}).context["positions"]), 1)
+
+
+class QueryBudgetTests(LedgerTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_hot_views_stay_within_their_query_budgets(self):
+        company = Company.objects.create(name="YieldMax", description="")
+        for n in range(5):
+            issuer_fund = Fund.objects.create(name=f"Y{n}", company=company)
+            update_fund_summary(issuer_fund, datetime.date.today(), Decimal("10"))
+        for day in range(2, 12):
+            Position.objects.process_trade(self.fund, self.option, self.trade("S", 1, "1.00", day))
+        for n in range(5):
+            Holding.objects.create(broker_account=self.fund.broker_account, fund=self.fund, asset=UnderlyingAsset.objects.create(name=f"A{n}"),
+                                   quantity=Decimal("10"), average_price=Decimal("1"), total_cost=Decimal("10"))
+
+        broker = self.fund.broker_account
+        self.client.force_login(broker.user)
+        for url_name, args in (
+            ("user_dashboard", ()),
+            ("broker_detail", (broker.slug, broker.id)),
+            ("user_fund_detail", (broker.broker_name, self.fund.id, self.fund.slug)),
+            ("company_detail", (company.id, company.slug)),
+            ("fund_detail", (self.fund.id, self.fund.slug)),
+        ):
+            self.assertEqual(assert_query_budget(self.client, url_name, *args, data={"all": "true"}).status_code, 200)
+        with self.assertRaisesMessage(AssertionError, "fund_detail ran"):
+            assert_query_budget(self.client, "fund_detail", self.fund.id, self.fund.slug, budget=1)
+
+    @override_settings(QUERY_BUDGETS={"user_dashboard": 1})
+    def test_requests_report_their_queries_and_timings(self):
+        user = self.fund.broker_account.user
+        self.client.force_login(user)
+        with self.assertLogs("trackers.instrumentation.middleware") as logs:
+            response = self.client.get(reverse("user_dashboard"))
+        self.assertNotIn("Server-Timing", response)
+        self.assertIn("view=user_dashboard status=200 queries=", logs.output[0])
+        self.assertIn("its budget is 1", logs.output[1])
+
+        User.objects.filter(pk=user.pk).update(is_staff=True)
+        timing = self.client.get(reverse("user_dashboard"))["Server-Timing"]
+        self.assertRegex(timing, r'^db;dur=[\d.]+;desc="\d+ queries", dup;desc="\d+ repeated", render;dur=[\d.]+')
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(PROFILE_DIR=directory.name, PROFILE_STORE_LIMIT=2)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user("ops")
+        self.client.force_login(self.user)
+
+    def test_staff_requests_are_profiled_on_demand_into_a_bounded_store(self):
+        self.assertNotIn("X-Profile", self.client.get(reverse("user_dashboard"), {"profile": "1"}))
+        self.assertEqual(self.client.get(reverse("profile_list")).status_code, 302)
+
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        self.assertNotIn("X-Profile", self.client.get(reverse("user_dashboard")))
+        links = [self.client.get(reverse("user_dashboard"), {"profile": "1"})["X-Profile"],
+                 self.client.get(reverse("user_dashboard"), HTTP_X_PROFILE="1")["X-Profile"],
+                 self.client.get(reverse("user_dashboard"), {"profile": "1"})["X-Profile"]]
+        store = ProfileStore()
+        self.assertEqual(store.ids(), [link.rstrip("/").rsplit("/", 1)[1] for link in links[:0:-1]])
+
+        profile = store.get(store.ids()[0])
+        self.assertEqual((profile["kind"], profile["name"], profile["status"]), ("request", "GET /dashboard/", 200))
+        self.assertTrue(any(row["function"].startswith("user_dashboard (views.py") for row in profile["functions"]))
+        self.assertContains(self.client.get(links[-1]), "user_dashboard (views.py")
+        self.assertContains(self.client.get(reverse("profile_list")), "GET /dashboard/", count=2)
+        self.assertEqual(self.client.get(links[-1], {"format": "folded"})["Content-Type"], "text/plain; charset=utf-8")
+
+    def test_tasks_are_profiled_when_sent_with_the_header_or_listed_in_settings(self):
+        def run(task_id):
+            task_prerun.send(sender=process_company_file, task_id=task_id, task=process_company_file, args=(), kwargs={})
+            task_postrun.send(sender=process_company_file, task_id=task_id, task=process_company_file, args=(),
+                              kwargs={}, retval=None, state="SUCCESS")
+
+        run("plain")
+        self.assertEqual(ProfileStore().ids(), [])
+        process_company_file.push_request(profile=True)
+        try:
+            run("with-header")
+        finally:
+            process_company_file.pop_request()
+        with override_settings(PROFILE_TASKS=["trackers.tasks.process_company_file"]):
+            run("from-settings")
+        self.assertEqual(sorted(profile["task_id"] for profile in ProfileStore().list()), ["from-settings", "with-header"])
+
+
+class AsyncMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    async def test_slow_async_views_do_not_hold_other_requests(self):
+        async def slow_upstream(service, fetch, symbol):
+            await asyncio.sleep(1)
+            return 250.0
+
+        with mock.patch("trackers.views.call_upstream", slow_upstream), self.assertLogs("django.request", "WARNING"), \
+                self.assertLogs("trackers.instrumentation.middleware") as logs:
+            slow = asyncio.ensure_future(self.async_client.get(reverse("live_price", args=["TSLA"])))
+            await asyncio.sleep(0.1)
+            start = time.perf_counter()
+            for _ in range(3):
+                self.assertEqual((await self.async_client.get("/no-such-page/")).status_code, 404)
+            self.assertLess(time.perf_counter() - start, 0.5)
+            self.assertEqual((await slow).json(), {"price": 250.0, "stale": False})
+        self.assertIn("view=live_price status=200", logs.output[-1])
+
+    async def test_async_requests_are_profiled(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        user = await sync_to_async(User.objects.create_user)("ops", is_staff=True)
+        await self.async_client.aforce_login(user)
+
+        async def upstream(service, fetch, symbol):
+            return 250.0
+
+        with mock.patch("trackers.views.call_upstream", upstream), override_settings(PROFILE_DIR=directory.name), \
+                self.assertLogs("trackers.instrumentation.middleware") as logs:
+            response = await self.async_client.get(reverse("live_price", args=["TSLA"]), {"profile": "1"})
+            profile = await sync_to_async(ProfileStore().get)(response["X-Profile"].rstrip("/").rsplit("/", 1)[1])
+        self.assertEqual((profile["name"], profile["status"]), ("GET /api/live-price/TSLA/", 200))
+        self.assertIn("Server-Timing", response)
+        # the session and user lookups ran in sync_to_async threads and still count
+        self.assertIn("queries=2", logs.output[0])
+
+class BenchmarkSuiteTests(TestCase):
+    def test_every_stage_runs_and_is_compared_to_the_baseline(self):
+        results = run_scale("tiny", Scale(users=2, trades=20, funds=2, imports=10, renders=1))
+        self.assertEqual([result["label"].split(" ", 1)[1] for result in results], [
+            "generate", "ibkr import", "replay", "summaries", "settlement",
+            "user_dashboard cold", "user_dashboard warm", "broker_detail cold", "broker_detail warm",
+        ])
+        self.assertEqual(Trade.objects.filter(option__fund__broker_account__user__username="bench-import").count(), 10)
+
+        baseline = [dict(result, queries=result["queries"] - 1) if result["label"] == "tiny replay" else result
+                    for result in results]
+        regressed = [label for label, *_, flag in compare(results, baseline, tolerance=10) if flag]
+        self.assertEqual(regressed, ["tiny replay"])
+
+
+ISSUER_FILE = (
+    "\ufeffDate,Fund,Ticker,Type,Qty/Par Value, Exec Price ,,,\n"
+    "3/24/2025,TSLY,TSLA 250328C00250000,SS,200,24.37,,,\n"
+    "3/24/2025,TSLY,TSLA 250328C00250000,BC,50,1.10,,,\n"
+    "3/24/2025,TSLY,TSLA 250321C00240000,BC,10,Expired,,,\n"
+    "3/24/2025,TSLY,88160R101,B,1000,\"4,761.31\",,,\n"
+    "3/24/2025,AMDY,2AMD  250328P00145010,S ,-30.0,2.00,,,\n"
+    ",,,,,,,,\n"
+)
+
+
+class IssuerParserTests(TestCase):
+    def write_corpus(self, root):
+        folder = os.path.join(root, "YieldMax", "2025-W13")
+        os.makedirs(folder)
+        with open(os.path.join(folder, "YieldMax_IntraDay_2025_03_24.csv"), "w", encoding="utf-8") as f:
+            f.write(ISSUER_FILE)
+        return os.path.join(folder, "YieldMax_IntraDay_2025_03_24.csv")
+
+    def test_issuer_file_loads_once_and_keeps_uncovered_closes(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = self.write_corpus(root)
+            entries = YieldMaxParser().parse_csv(path)
+            self.assertEqual(len(entries), 4)  # no equity row, no blank row
+            self.assertEqual(YieldMaxParser().parse_csv(path), [])
+
+        option = Option.objects.get(ticker="2AMD 250328P00145010")
+        self.assertEqual((option.underlying_asset.name, option.strike_price), ("AMD", Decimal("145.01")))
+        short = Position.objects.get(option__ticker="TSLA 250328C00250000")
+        self.assertEqual((short.remaining_quantity, short.profit_loss), (150, Decimal("487400.00") - Decimal("5500.00")))
+        # closing a contract opened before the files start: a trade with no position
+        expired = Trade.objects.get(option__ticker="TSLA 250321C00240000")
+        self.assertEqual((expired.price, expired.position), (Decimal("0.00"), None))
+        self.assertEqual(Fund.objects.get(name="TSLY").total_profit, Decimal("487400.00") - Decimal("5500.00"))
+
+    def test_corpus_benchmark_reports_every_stage_and_digests_the_pnl(self):
+        with tempfile.TemporaryDirectory() as root:
+            self.write_corpus(root)
+            results = load_corpus(root)
+        self.assertEqual([result["label"] for result in results], [
+            "corpus read", "corpus parse", "corpus resolve", "corpus write", "corpus position", "corpus summary",
+            "corpus total",
+        ])
+        self.assertEqual((results[-1]["files"], results[-1]["items"], results[3]["items"]), (1, 6, 4))
+
+        before = digest(snapshot())
+        Fund.objects.filter(name="TSLY").update(total_profit=0)
+        self.assertNotEqual(digest(snapshot()), before)
+
+
+class RebuildLedgerTests(LedgerTestCase):
+    def test_rebuild_repairs_drift(self):
+        for trade in [self.trade("S", 2, "1.00", 2), self.trade("BC", 1, "0.50", 5)]:
+            Position.objects.process_trade(self.fund, self.option, trade)
+        Position.objects.update(remaining_quantity=7)
+
+        _, diffs = rebuild(verify=True, workers=1)
+        self.assertIn(self.fund.id, diffs)
+        self.assertEqual(Position.objects.get().remaining_quantity, 7)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_ledger", "--verify", "--workers", "1", stdout=io.StringIO())
+
+        results, _ = rebuild(workers=1)
+        self.assertEqual([result["error"] for result in results], [None])
+        position = Position.objects.get()
+        self.assertEqual(position.remaining_quantity, 1)
+        self.assertEqual(Trade.objects.filter(position=position).count(), 2)
+        self.fund.refresh_from_db()
+        self.assertEqual(self.fund.total_profit, Decimal("199.00") - Decimal("51.00"))
+        self.assertEqual(rebuild(verify=True, workers=1)[1], {})
+
+    def test_funds_traded_during_the_replay_are_not_swapped(self):
+        from trackers.ledger import rebuild as rebuild_module
+
+        Position.objects.process_trade(self.fund, self.option, self.trade("S", 2, "1.00", 2))
+        replay_all = rebuild_module.replay_all
+
+        def trade_meanwhile(*args, **kwargs):
+            Position.objects.process_trade(self.fund, self.option, self.trade("BC", 1, "0.50", 5))
+            return replay_all(*args, **kwargs)
+
+        with mock.patch.object(rebuild_module, "replay_all", trade_meanwhile):
+            results, _ = rebuild(workers=1)
+        self.assertIn("changed during the rebuild", results[0]["error"])
+        # the close made while replaying is still applied and linked
+        self.assertEqual(Position.objects.get().remaining_quantity, 1)
+        self.assertFalse(Trade.objects.filter(position__isnull=True).exists())
+
+class RollupTests(LedgerTestCase):
+    def test_rollups_recompute_summaries_from_trades(self):
+        self.trade("S", 2, "1.00", 2)  # +199, week of Dec 29
+        self.trade("BC", 1, "0.50", 5)  # -51, week of Jan 5
+        FundProfitSummary.objects.create(fund=self.fund, start_date=datetime.date(2025, 12, 29),
+                                         end_date=datetime.date(2026, 1, 4), weekly_profit=Decimal("999"))
+        FundProfitSummary.objects.create(fund=self.fund, start_date=datetime.date(2025, 3, 1),
+                                         end_date=datetime.date(2025, 3, 31), monthly_profit=Decimal("5"))
+
+        results = refresh_rollups(full=True)
+        self.assertEqual(results["fund"], (4, 1))  # 2 weeks, January, 2026; the March 2025 row had no trades
+        summaries = {(s.start_date, s.end_date): (s.weekly_profit, s.monthly_profit, s.annually_profit)
+                     for s in FundProfitSummary.objects.filter(fund=self.fund)}
+        self.assertEqual(summaries[(datetime.date(2025, 12, 29), datetime.date(2026, 1, 4))][0], Decimal("199"))
+        self.assertEqual(summaries[(datetime.date(2026, 1, 1), datetime.date(2026, 1, 31))][1], Decimal("148"))
+        self.assertEqual(BrokerAccountProfitSummary.objects.get(start_date=datetime.date(2026, 1, 1),
+                                                                end_date=datetime.date(2026, 12, 31)).annually_profit,
+                         Decimal("148"))
+        self.fund.refresh_from_db()
+        self.assertEqual(self.fund.total_profit, Decimal("148"))
+
+        # Incremental: only the years the changed trades fall in are recomputed
+        untouched = FundProfitSummary.objects.create(fund=self.fund, start_date=datetime.date(2024, 1, 1),
+                                                     end_date=datetime.date(2024, 12, 31), annually_profit=Decimal("7"))
+        self.trade("S", 1, "2.00", 9)  # +199
+        refresh_rollups()
+        year = FundProfitSummary.objects.get(fund=self.fund, start_date=datetime.date(2026, 1, 1), end_date=datetime.date(2026, 12, 31))
+        self.assertEqual(year.annually_profit, Decimal("347"))
+        self.assertTrue(FundProfitSummary.objects.filter(pk=untouched.pk).exists())
+
+
+class PeriodCloseTests(TestCase):
+    def test_close_is_idempotent_and_catches_up(self):
+        broker = BrokerAccount.objects.create(user=User.objects.create_user("close"), broker_name="IBKR")
+        fund = Fund.objects.create(name="CONY", broker_account=broker)
+        update_fund_summary(fund, datetime.date(2026, 2, 25), Decimal("40"))
+        update_Broker_summary(broker, datetime.date(2026, 2, 25), Decimal("40"))
+
+        # Tuesday Mar 3: February and the week of Feb 23 are over, 2026 isn't
+        self.assertEqual(close_periods(today=datetime.date(2026, 3, 3)), {"fund": 2, "company": 0, "broker": 2})
+        self.assertEqual(close_periods(today=datetime.date(2026, 3, 3)), {"fund": 0, "company": 0, "broker": 0})
+
+        # a late trade moves the summary but not what was frozen, and an older gap is picked up
+        update_fund_summary(fund, datetime.date(2026, 2, 26), Decimal("5"))
+        update_fund_summary(fund, datetime.date(2025, 11, 3), Decimal("7"))
+        self.assertEqual(close_periods(today=datetime.date(2026, 3, 3))["fund"], 3)  # 2025, November, that week
+        week = ProfitSnapshot.objects.get(level="fund", owner_id=fund.id, start_date=datetime.date(2026, 2, 23))
+        self.assertEqual((week.period, week.weekly_profit), ("week", Decimal("40")))
+
+
+class PositionHistoryTests(LedgerTestCase):
+    def test_trajectory_survives_compaction(self):
+        position = Position.objects.process_trade(self.fund, self.option, self.trade("S", 3, "1.00", 2))
+        for day in (2, 5, 5):
+            Position.objects.process_trade(self.fund, self.option, self.trade("BC", 1, "0.50", day))
+        # Same-day trades share a bucket
+        self.assertEqual(PositionHistoryBucket.objects.filter(position=position).count(), 2)
+        before = position.trajectory()
+        self.assertEqual([quantity for _, quantity, _, _ in before], [3, 2, 1, 0])
+
+        self.assertEqual(compact(before=datetime.date(2026, 2, 1)), 2)
+        self.assertEqual(PositionHistoryBucket.objects.get(position=position).span, "M")
+        self.assertEqual(position.trajectory(), before)
+        with self.assertNumQueries(1):
+            self.assertEqual(position.trajectory(datetime.date(2026, 1, 5), datetime.date(2026, 1, 31)), before[2:])
+
+
+class SummaryTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.broker = BrokerAccount.objects.create(user=User.objects.create_user("sums"), broker_name="IBKR")
+        self.fund = Fund.objects.create(name="TSLY", broker_account=self.broker)
+
+
+class SummaryUpsertTests(SummaryTestCase):
+    def test_one_upsert_per_trade_adds_in_the_database(self):
+        fund = Fund.objects.get(pk=self.fund.pk)
+        update_fund_summary(self.fund, datetime.date(2026, 3, 2), Decimal("120.50"))
+        # the summaries plus the fund total, instead of 3 get_or_create + 3 saves + a fund save
+        with self.assertNumQueries(2):
+            update_fund_summary(fund, datetime.date(2026, 3, 4), Decimal("-20.25"))
+        update_fund_summary(fund, datetime.date(2026, 4, 1), Decimal("10"))
+
+        summaries = {(s.start_date, s.end_date): s for s in FundProfitSummary.objects.filter(fund=self.fund)}
+        self.assertEqual(len(summaries), 5)  # 2 weeks, 2 months, 1 year
+        self.assertEqual(summaries[(datetime.date(2026, 3, 2), datetime.date(2026, 3, 8))].weekly_profit, Decimal("100.25"))
+        self.assertEqual(summaries[(datetime.date(2026, 3, 1), datetime.date(2026, 3, 31))].monthly_profit, Decimal("100.25"))
+        self.assertEqual(summaries[(datetime.date(2026, 1, 1), datetime.date(2026, 12, 31))].annually_profit, Decimal("110.25"))
+        # a stale instance doesn't overwrite the other writer's increment
+        self.fund.refresh_from_db()
+        self.assertEqual(self.fund.total_profit, Decimal("110.25"))
+
+        update_Broker_summary(self.broker, datetime.date(2026, 3, 2), Decimal("5"))
+        self.assertEqual(BrokerAccountProfitSummary.objects.filter(broker=self.broker).count(), 3)
+        with self.assertRaises(IntegrityError):
+            FundProfitSummary.objects.create(fund=self.fund, start_date=datetime.date(2026, 3, 2),
+                                             end_date=datetime.date(2026, 3, 8))
+
+    def test_deferred_summaries_flush_once_per_table(self):
+        other = Fund.objects.create(name="NVDY", broker_account=self.broker)
+        with self.assertNumQueries(5):  # savepoint, fund upsert, broker upsert, fund totals, release
+            with deferred_summaries():
+                for day in range(2, 32):
+                    for fund in (self.fund, other):
+                        update_fund_summary(fund, datetime.date(2026, 3, day), Decimal("1.50"))
+                    update_Broker_summary(self.broker, datetime.date(2026, 3, day), Decimal("3"))
+
+        march = FundProfitSummary.objects.get(fund=other, start_date=datetime.date(2026, 3, 1), end_date=datetime.date(2026, 3, 31))
+        self.assertEqual(march.monthly_profit, Decimal("45.00"))
+        self.assertEqual(FundProfitSummary.objects.filter(fund=self.fund).count(), 5 + 1 + 1)  # Mar 2-31 spans 5 weeks
+        self.assertEqual(Fund.objects.get(pk=self.fund.pk).total_profit, Decimal("45.00"))
+        self.assertEqual(BrokerAccountProfitSummary.objects.get(broker=self.broker, start_date=datetime.date(2026, 1, 1)).annually_profit,
+                         Decimal("90.00"))
+
+        # nothing is written when the block fails
+        with self.assertRaises(RuntimeError), deferred_summaries():
+            update_fund_summary(self.fund, datetime.date(2026, 3, 2), Decimal("100"))
+            raise RuntimeError
+        self.assertEqual(Fund.objects.get(pk=self.fund.pk).total_profit, Decimal("45.00"))
+
+class CompanySummaryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_company_summaries_are_derived_from_their_funds(self):
+        company = Company.objects.create(name="YieldMax")
+        tsly = Fund.objects.create(name="TSLY", company=company)
+        nvdy = Fund.objects.create(name="NVDY", company=company)
+        update_fund_summary(tsly, datetime.date(2026, 3, 2), Decimal("100"))
+        with deferred_summaries():
+            update_fund_summary(nvdy, datetime.date(2026, 3, 3), Decimal("50"))
+            update_fund_summary(tsly, datetime.date(2026, 4, 1), Decimal("10"))
+
+        summary = Company.current_summaries([company.id], datetime.date(2026, 3, 4))[company.id]
+        self.assertEqual(summary["week"].weekly_profit, Decimal("150"))
+        self.assertEqual(summary["month"].monthly_profit, Decimal("150"))
+        self.assertEqual(summary["year"].annually_profit, Decimal("160"))
+
+        response = self.client.get(reverse("company_detail", args=[company.id, company.slug]))
+        self.assertEqual(response.context["total_profit"], Decimal("160"))
+        self.assertEqual(self.client.get(reverse("dashboard_view")).status_code, 200)
+
+
+class ProfitSeriesTests(SummaryTestCase):
+    def test_series_endpoint_revalidates_until_the_summaries_change(self):
+        self.client.force_login(self.broker.user)
+        url = reverse("fund_profit_series", args=[self.fund.id])
+        update_fund_summary(self.fund, datetime.date(2026, 3, 2), Decimal("10"))
+        update_fund_summary(self.fund, datetime.date(2026, 4, 6), Decimal("5"))
+
+        response = self.client.get(url, {"period": "month", "cumulative": "1"})
+        self.assertEqual(response.json()["labels"], ["2026-03-01", "2026-04-01"])
+        self.assertEqual(response.json()["profit"], [10.0, 15.0])
+        etag = response["ETag"]
+        self.assertEqual(self.client.get(url, {"period": "month", "cumulative": "1"}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url, {"period": "week", "from": "2026-03-05"}).json()["labels"], ["2026-04-06"])
+        self.assertEqual(self.client.get(url, {"period": "day"}).status_code, 400)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            update_fund_summary(self.fund, datetime.date(2026, 4, 7), Decimal("1"))
+        response = self.client.get(url, {"period": "month", "cumulative": "1"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()["profit"], [10.0, 16.0])
+
+        self.client.force_login(User.objects.create_user("someone"))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_leaderboard_ranks_funds_within_each_company(self):
+        yieldmax, defiance = Company.objects.create(name="YieldMax"), Company.objects.create(name="Defiance")
+        funds = {name: Fund.objects.create(name=name, company=company) for name, company in
+                 (("TSLY", yieldmax), ("NVDY", yieldmax), ("MSTY", yieldmax), ("QQQY", defiance))}
+        for name, day, amount in (("TSLY", 2, "30"), ("NVDY", 3, "50"), ("TSLY", 20, "40"), ("QQQY", 3, "5")):
+            update_fund_summary(funds[name], datetime.date(2026, 3, day), Decimal(amount))
+
+        self.assertEqual(refresh_leaderboard(today=datetime.date(2026, 3, 4)), 4)
+        with self.assertNumQueries(1):
+            leaders = FundRanking.leaders([yieldmax.id, defiance.id])
+        week, month = leaders[yieldmax.id]["week"], leaders[yieldmax.id]["month"]
+        self.assertEqual((week["best"].fund.name, week["best"].profit), ("NVDY", Decimal("50")))
+        self.assertEqual((week["worst"].fund.name, week["worst"].profit), ("MSTY", Decimal("0")))
+        self.assertEqual((month["best"].fund.name, leaders[yieldmax.id]["all"]["best"].fund.name), ("TSLY", "TSLY"))
+        # a company with one fund has it as both
+        self.assertEqual(leaders[defiance.id]["year"]["best"], leaders[defiance.id]["year"]["worst"])
+        self.assertContains(self.client.get(reverse("dashboard_view")), "NVDY $50.00")
+
+
+class BrokerProfitTests(SummaryTestCase):
+    def test_broker_profit_in_one_query(self):
+        self.client.force_login(self.broker.user)
+        asset = UnderlyingAsset.objects.create(name="TSLA", live_price=Decimal("110"))
+        update_fund_summary(self.fund, datetime.date(2026, 3, 2), Decimal("20"))
+        Holding.objects.create(broker_account=self.broker, fund=self.fund, asset=asset, quantity=Decimal("10"),
+                               average_price=Decimal("100"), total_cost=Decimal("1000"), realized_profit=Decimal("5"))
+
+        broker = BrokerAccount.objects.with_profit_summaries(datetime.date(2026, 3, 4)).get()
+        self.assertEqual(broker.profit_summary, {
+            "weekly": Decimal("20"), "monthly": Decimal("20"), "yearly": Decimal("20"),
+            "total_all_time_options": Decimal("20"), "holding_profit_loss": Decimal("105"),
+            "combined_total_all_time": Decimal("125"), "name": "IBKR",
+        })
+
+        for n in range(10):
+            update_fund_summary(Fund.objects.create(name=f"F{n}", broker_account=self.broker), datetime.date(2026, 3, 3), Decimal("1"))
+        with self.assertNumQueries(1):
+            broker = BrokerAccount.objects.with_profit_summaries(datetime.date(2026, 3, 4)).get()
+            self.assertEqual(broker.profit_summary["weekly"], Decimal("30"))
+        self.assertEqual(self.client.get(reverse("user_dashboard")).context["holding_total_all_time"], Decimal("105"))
+
+
+class FundListTests(SummaryTestCase):
+    def test_fund_lists_do_not_query_per_fund(self):
+        self.client.force_login(self.broker.user)
+        update_fund_summary(self.fund, datetime.date.today(), Decimal("12"))
+        fund = Fund.objects.with_period_profits().get(pk=self.fund.pk)
+        self.assertEqual((fund.week_profit, fund.month_profit, fund.year_profit), (Decimal("12"),) * 3)
+
+        pages = [reverse("broker_detail", args=[self.broker.slug, self.broker.id]), reverse("user_dashboard")]
+        counts = []
+        for page in pages:
+            with CaptureQueriesContext(connection) as queries:
+                self.assertContains(self.client.get(page), "$12.00")
+            counts.append(len(queries))
+        with self.captureOnCommitCallbacks(execute=True):
+            for n in range(10):
+                Fund.objects.create(name=f"F{n}", broker_account=self.broker)
+        for page, count in zip(pages, counts):
+            with self.assertNumQueries(count):
+                self.client.get(page)
+
+
+class DashboardCacheTests(SummaryTestCase):
+    def test_dashboards_are_cached_until_the_users_data_changes(self):
+        self.client.force_login(self.broker.user)
+        url = reverse("user_dashboard")
+        update_fund_summary(self.fund, datetime.date.today(), Decimal("12"))
+        self.assertContains(self.client.get(url), "$12.00")
+        with self.assertNumQueries(2):  # session and user, the page comes from the cache
+            self.assertContains(self.client.get(url), "$12.00")
+
+        # every write in the transaction is resolved to its user in one go when it commits
+        with self.captureOnCommitCallbacks(execute=True):
+            with deferred_summaries():
+                for n in range(3):
+                    update_fund_summary(self.fund, datetime.date.today(), Decimal("1"))
+                Fund.objects.create(name="NVDY", broker_account=self.broker)
+            with self.assertNumQueries(2):  # the funds' and the accounts' owners
+                dashboards._bump()
+        self.assertContains(self.client.get(url), "NVDY")
+        self.assertContains(self.client.get(reverse("broker_detail", args=[self.broker.slug, self.broker.id])), "$15.00")
+
+        other = User.objects.create_user("other")
+        with self.captureOnCommitCallbacks(execute=True):
+            BrokerAccount.objects.create(user=other, broker_name="WS")
+        with self.assertNumQueries(2):
+            self.client.get(url)
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(reverse("broker_detail", args=[self.broker.slug, self.broker.id])).status_code, 404)
+
+
+class IBKRImportTests(TestCase):
+    STATEMENT = (
+        "Trades,Header,DataDiscriminator,Asset Category,Currency,Symbol,Date/Time,Quantity,T. Price,C. Price,"
+        "Proceeds,Comm/Fee,Basis,Realized P/L,MTM P/L,Code\n"
+        'Trades,Data,Order,Equity and Index Options,USD,TSLA 16JAN26 300 C,"2026-01-02, 10:00:00",-2,3,3,600,-1,0,0,0,O\n'
+        'Trades,Data,Order,Equity and Index Options,USD,AMD 16JAN26 180 P,"2026-01-02, 11:00:00",-1,2,2,200,-1,0,0,0,O\n'
+        'Trades,Data,Order,Equity and Index Options,USD,TSLA 16JAN26 300 C,"2026-01-05, 10:00:00",1,1,1,-100,-1,0,0,0,C\n'
+    )
+
+    def test_statement_locks_every_book_once(self):
+        user = User.objects.create_user("importer")
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+            f.write(self.STATEMENT)
+        self.addCleanup(os.remove, f.name)
+
+        from trackers.IBKR import option_saver
+        with mock.patch.object(option_saver, "lock_books", wraps=option_saver.lock_books) as lock_books, \
+                mock.patch("builtins.print"), warnings.catch_warnings():
+            # statement times are naive
+            warnings.filterwarnings("ignore", "DateTimeField .* received a naive datetime", RuntimeWarning)
+            ParserFactory.get_parser("IBKR", f.name, user).parse_and_save()
+            ParserFactory.get_parser("IBKR", f.name, user).parse_and_save()
+
+        # one call per import with both books, not one per row
+        self.assertEqual(lock_books.call_count, 2)
+        self.assertEqual(Trade.objects.count(), 3)
+        self.assertFalse(Trade.objects.filter(position__isnull=True).exists())
+        self.assertEqual(sorted(Position.objects.filter(active=True).values_list("remaining_quantity", flat=True)),
+                         [1, 1])
+
+
+class ConcurrentTradeTests(TransactionTestCase):
+    def test_parallel_closes_never_oversell_the_book(self):
+        broker = BrokerAccount.objects.create(user=User.objects.create_user("desk"), broker_name="IBKR")
+        asset = UnderlyingAsset.objects.create(name="MSTR")
+        books = []
+        for name in ("MSTY", "MSTX"):
+            fund = Fund.objects.create(name=name, broker_account=broker)
+            option = Option.objects.create(
+                ticker=f"{name}260116C00400000", fund=fund, type="C", strike_price=Decimal("400"),
+                expiration_date=datetime.date(2026, 1, 16), underlying_asset=asset,
+            )
+            for day in (2, 3):
+                trade = Trade.objects.create(option=option, trade_type="S", quantity=10, price=Decimal("3.00"),
+                                             date=datetime.datetime(2026, 1, day, tzinfo=datetime.timezone.utc))
+                Position.objects.process_trade(fund, option, trade)
+            books.append((fund, option))
+
+        outcomes = {"closed": 0, "refused": 0}
+        counter = threading.Lock()
+
+        def hammer(fund, option):
+            try:
+                for _ in range(4):
+                    try:
+                        with lock_book(fund, option):
+                            trade = Trade.objects.create(
+                                option=option, trade_type="BC", quantity=1, price=Decimal("0.40"),
+                                date=datetime.datetime(2026, 1, 5, tzinfo=datetime.timezone.utc),
+                            )
+                            Position.objects.process_trade(fund, option, trade)
+                        result = "closed"
+                    except ValueError:
+                        result = "refused"
+                    with counter:
+                        outcomes[result] += 1
+            finally:
+                connection.close()
+
+        # 6 threads x 4 closes per book against 20 open contracts each
+        threads = [threading.Thread(target=hammer, args=book) for book in books for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(outcomes, {"closed": 40, "refused": 8})
+        for fund, option in books:
+            positions = Position.objects.filter(fund=fund, option=option)
+            self.assertFalse(positions.filter(active=True).exists())
+            self.assertFalse(positions.filter(remaining_quantity__lt=0).exists())
+            closes = Trade.objects.filter(option=option, trade_type="BC")
+            # Refused closes rolled back with their transaction, the rest are all linked
+            self.assertEqual(closes.count(), 20)
+            self.assertFalse(closes.filter(position__isnull=True).exists())
+            self.assertEqual(sum(len(p.trajectory()) for p in positions), 2 + 20)
+
+
+class GreeksTests(TestCase):
+    def test_matches_textbook_values(self):
+        args = (np.array([100.0, 100.0]), np.array([100.0, 100.0]), np.array([1.0, 1.0]), 0.05)
+        is_call = np.array([True, False])
+        premium = bs.price(*args, np.array([0.2, 0.2]), is_call)
+        np.testing.assert_allclose(premium, [10.4506, 5.5735], atol=1e-3)
+        np.testing.assert_allclose(bs.implied_vol(premium, *args, is_call), [0.2, 0.2], atol=1e-6)
+        greeks = bs.greeks(*args, np.array([0.2, 0.2]), is_call)
+        np.testing.assert_allclose(greeks["delta"], [0.6368, -0.3632], atol=1e-3)
+        np.testing.assert_allclose(greeks["gamma"], [0.01876, 0.01876], atol=1e-4)
+        np.testing.assert_allclose(greeks["vega"], [37.524, 37.524], atol=1e-2)
+
+    def test_short_call_nets_per_fund(self):
+        user = User.objects.create_user("risk")
+        broker = BrokerAccount.objects.create(user=user, broker_name="IBKR")
+        fund = Fund.objects.create(name="CONY", broker_account=broker)
+        asset = UnderlyingAsset.objects.create(name="COIN", live_price=Decimal("200"))
+        option = Option.objects.create(
+            ticker="COIN260220C00220000", fund=fund, type="C", strike_price=Decimal("220"),
+            expiration_date=datetime.date(2026, 2, 20), underlying_asset=asset, price=Decimal("200"),
+        )
+        Position.objects.create(option=option, fund=fund, remaining_quantity=2, average_price=Decimal("4.00"),
+                                trade_type="S", date=datetime.date(2026, 1, 20))
+
+        result = user_greeks(user, today=datetime.date(2026, 1, 30))
+        fund_greeks = result["brokers"][0]["funds"][0]
+        self.assertEqual(result["positions"], 1)
+        self.assertLess(fund_greeks["delta"], 0)
+        self.assertGreater(fund_greeks["delta"], -200)
+        self.assertGreater(fund_greeks["theta"], 0)  # short premium earns decay
+        self.assertEqual(result["total"], {name: fund_greeks[name] for name in result["total"]})
+
+    def test_volatility_is_implied_from_the_spot_stored_at_entry(self):
+        user = User.objects.create_user("entry")
+        broker = BrokerAccount.objects.create(user=user, broker_name="IBKR")
+        fund = Fund.objects.create(name="CONY", broker_account=broker)
+        asset = UnderlyingAsset.objects.create(name="COIN", live_price=Decimal("200"))
+        option = Option.objects.create(
+            ticker="COIN260220C00220000", fund=fund, type="C", strike_price=Decimal("220"),
+            expiration_date=datetime.date(2026, 2, 20), underlying_asset=asset,
+        )
+        trade = Trade.objects.create(option=option, trade_type="S", quantity=2, price=Decimal("4.00"),
+                                     date=datetime.datetime(2026, 1, 20, 15, tzinfo=datetime.timezone.utc))
+        position = Position.objects.process_trade(fund, option, trade)
+        self.assertEqual((trade.underlying_price, position.entry_spot), (Decimal("200"), Decimal("200")))
+
+        before = user_greeks(user, today=datetime.date(2026, 1, 30))
+        Option.objects.update(price=Decimal("300"))
+        self.assertEqual(user_greeks(user, today=datetime.date(2026, 1, 30)), before)
+        # a rebuild derives the same entry spot from the opening trade
+        rebuild(workers=1)
+        self.assertEqual(Position.objects.get().entry_spot, Decimal("200"))
+
+
+class SettlementTests(TestCase):
+    # closes on the expiration dates; the live price is deliberately somewhere else
+    CLOSES = {("AMD", datetime.date(2026, 1, 16)): Decimal("150"), ("AMD", datetime.date(2026, 1, 9)): Decimal("170")}
+
+    def setUp(self):
+        cache.clear()
+        broker = BrokerAccount.objects.create(user=User.objects.create_user("settle"), broker_name="IBKR")
+        self.fund = Fund.objects.create(name="AMDY", broker_account=broker)
+        self.amd = UnderlyingAsset.objects.create(name="AMD", live_price=Decimal("400"))
+
+    def closes(self, pairs):
+        return {pair: self.CLOSES[pair] for pair in pairs if pair in self.CLOSES}
+
+    def position(self, option_type, strike, trade_type="S", asset=None, expiry=datetime.date(2026, 1, 16)):
+        option = Option.objects.create(
+            ticker=f"AMD{expiry:%y%m%d}{option_type}{strike}{trade_type}", fund=self.fund, type=option_type,
+            strike_price=Decimal(strike), expiration_date=expiry, underlying_asset=asset or self.amd,
+        )
+        return Position.objects.create(option=option, fund=self.fund, remaining_quantity=2, average_price=Decimal("3"),
+                                       profit_loss=Decimal("600"), trade_type=trade_type, date=datetime.date(2026, 1, 5))
+
+    def test_settles_expired_positions_in_bulk(self):
+        worthless = self.position("C", 160)
+        assigned = self.position("P", 155)
+        long_call = self.position("C", 140, trade_type="B")
+        last_week = self.position("C", 160, expiry=datetime.date(2026, 1, 9))  # BC 2 @ 10.00 on its own close
+        unpriced = self.position("C", 10, asset=UnderlyingAsset.objects.create(name="NEW", live_price=Decimal("50")))
+        running = self.position("C", 160, expiry=datetime.date(2026, 1, 23))
+
+        result = settle_expired_positions(today=datetime.date(2026, 1, 17), closes=self.closes)
+        self.assertEqual((result["worthless"], result["exercised"], result["unpriced"]), (1, 3, 1))
+
+        for position in (worthless, assigned, long_call, last_week, unpriced, running):
+            position.refresh_from_db()
+        self.assertFalse(worthless.active)
+        self.assertEqual(worthless.profit_loss, Decimal("600"))
+        self.assertEqual(assigned.profit_loss, Decimal("600") - Decimal("1000"))  # BC 2 @ 5.00
+        self.assertEqual(long_call.profit_loss, Decimal("600") + Decimal("2000"))  # S 2 @ 10.00
+        self.assertEqual(long_call.trades.get().trade_type, "S")
+        self.assertEqual(last_week.profit_loss, Decimal("600") - Decimal("2000"))
+        self.assertTrue(unpriced.active and running.active)
+
+        summary = FundProfitSummary.objects.get(fund=self.fund, start_date=datetime.date(2026, 1, 12))
+        self.assertEqual(summary.weekly_profit, Decimal("1000"))
+        self.assertEqual(settle_expired_positions(today=datetime.date(2026, 1, 17), closes=self.closes)["trades"], [])
+
+    def test_unexpired_positions_cannot_be_marked_expired(self):
+        running = self.position("C", 160, expiry=datetime.date.today() + datetime.timedelta(days=7))
+        self.client.force_login(self.fund.broker_account.user)
+        response = self.client.post(reverse("mark_position_expired", args=[running.id]), {"confirm": "1"})
+        self.assertIn("hasn't expired yet", [str(message) for message in get_messages(response.wsgi_request)][0])
+        running.refresh_from_db()
+        self.assertTrue(running.active)
+        self.assertFalse(running.trades.exists())
+
+    def test_closes_are_only_looked_up_once_final(self):
+        fetched = []
+
+        def fetch(symbol, day):
+            fetched.append((symbol, day))
+            return 151.234
+
+        friday = datetime.date(2026, 1, 16)
+        with mock.patch("trackers.ledger.settlement.fetch_close", fetch):
+            before_close = datetime.datetime(2026, 1, 16, 15, 0, tzinfo=EXCHANGE_TZ)
+            self.assertEqual(expiry_closes({("AMD", friday)}, now=before_close), {})
+        self.assertEqual(fetched, [])
+
+        good_friday = datetime.date(2026, 4, 3)
+        with mock.patch("trackers.ledger.settlement.fetch_close", fetch):
+            # contracts expiring when the market is shut settle on the session before
+            self.assertEqual(expiry_closes({("AMD", friday), ("AMD", datetime.date(2026, 1, 17)), ("AMD", good_friday)}),
+                             {("AMD", friday): Decimal("151.23"), ("AMD", datetime.date(2026, 1, 17)): Decimal("151.23"),
+                              ("AMD", good_friday): Decimal("151.23")})
+            expiry_closes({("AMD", friday)})
+        self.assertEqual(fetched, [("AMD", friday), ("AMD", datetime.date(2026, 4, 2))])
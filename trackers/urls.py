@@ -10,6 +10,7 @@ urlpatterns = [
 
     path("<str:broker_name>/trade/<int:trade_id>/edit/", views.edit_trade_view, name="edit_trade"),
     path("<str:broker_name>/position/<int:id>/", views.position_detail_view, name="position_detail"),
+    path("<str:broker_name>/position/<int:id>/trajectory/", views.position_trajectory, name="position_trajectory"),
     path('position/<int:id>/confirm-assignment/', views.mark_position_expired, name='mark_position_expired'),
     # path('position/<int:id>/mark-expired/', views.mark_position_expired, name='mark_position_expired'),
     path('<str:broker_name>/position/<int:id>/close/', views.close_position_trade, name='close_position_trade'),
@@ -40,7 +41,9 @@ urlpatterns = [
     path('ajax/get-funds/', views.get_funds, name='get_funds'),
 
     # urls.py
-    path("funds/<int:fund_id>/chart-data/", views.fund_profit_summary_data, name="fund_profit_summary_data"),
+    path("api/funds/<int:fund_id>/series/", views.fund_profit_series, name="fund_profit_series"),
+    path("api/funds/<int:fund_id>/trades/", views.fund_trades_feed, name="fund_trades_feed"),
+    path("api/funds/<int:fund_id>/positions/", views.fund_positions_feed, name="fund_positions_feed"),
 
     path("IBKR/", views.import_csv_view, name="import_csv_view"),
     path("get/", views.home, name="home"),
@@ -49,5 +52,10 @@ urlpatterns = [
     # urls.py
     path('api/live-price/<str:symbol>/', views.live_price, name='live_price'),
     path('api/option-chain/<str:symbol>/<str:expiry>/', views.option_chain, name='option_chain'),
+    path('api/live-pnl/', views.live_pnl_stream, name='live_pnl_stream'),
+    path('api/risk/greeks/', views.risk_greeks, name='risk_greeks'),
+
+    path('staff/profiles/', views.profile_list, name='profile_list'),
+    path('staff/profiles/<str:profile_id>/', views.profile_detail, name='profile_detail'),
 
 ]
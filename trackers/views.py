@@ -1,138 +1,115 @@
 import os
+import json
+import time
+import asyncio
 from collections import defaultdict
-from decimal import Decimal
 from datetime import datetime
 
-from django.http import JsonResponse, HttpResponse
-from django.db.models import Count, Prefetch, Q
+from django.http import Http404, HttpResponseBadRequest, JsonResponse, HttpResponse, StreamingHttpResponse
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Sum, When
 from django.db import models, IntegrityError
+from django.utils import timezone
 from django.utils.timezone import now
+from django.utils.dateparse import parse_date
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+from django.views.decorators.http import condition
 from django.utils.text import slugify
 from django.conf import settings
+from asgiref.sync import sync_to_async
 
 from .forms import OptionsTradeForm, FundForm, OptionsTradeForm, CloseTradeForm, HoldingForm, ManualHoldingForm, BrokerAccountForm
 
 from trackers.tasks import queue_file_processing, process_company_file, update_option_and_underlying_price
 from trackers.csv_downloader.tasks import download_daily_trades
-from trackers.models import Fund, UnderlyingAsset, Option, Trade, Position, Company, FundProfitSummary, CompanyProfitSummary, Holding, BrokerAccount
+from trackers.models import Fund, UnderlyingAsset, Option, Trade, Position, Company, FundProfitSummary, CompanyProfitSummary, Holding, BrokerAccount, FundRanking
 from .utils import get_options_by_company_and_status, get_all_company_names, update_fund_summary, update_company_summary, update_Broker_summary
 from .parser.utils import get_month_range, get_week_range, get_year_range
 
 from .market_scraper.tasks import get_data, update_option_models, update_underline_models
 from .IBKR.import_service import OptionImportService
 from .IBKR.parser import ParserFactory
+from .live.hub import Subscription, get_hub
+from .live.pnl import build_user_book
+from .live.quotes import get_quotes, aget_quote, set_quote, fetch_last_close
+from .live.upstream import UpstreamUnavailable, call_upstream, cached_upstream
+from .ledger import history as position_history
+from .ledger.locking import lock_book
+from .ledger.settlement import settle_positions
+from .analytics import dashboards
+from .analytics.risk import user_greeks
+from .analytics.series import cached_fund_series, series_token
+from .instrumentation.store import ProfileStore
+from .pagination import page_size, seek
+from .ledger.summaries import PERIODS as SERIES_PERIODS
 
-def get_best_and_worst_fund_per_company(start, end, profit_field='monthly_profit'):
-    summaries = FundProfitSummary.objects.filter(
-        start_date=start, end_date=end
-    ).select_related('fund', 'fund__company')
+def dashboard_view(request):
+    today = datetime.today()
 
-    result = defaultdict(lambda: {"best": None, "worst": None})
+    # issuer totals are their own summary rows and the best/worst funds are ranked after each
+    # rollup refresh, one query each for every company
+    companies = list(Company.objects.all())
+    company_ids = [company.id for company in companies]
+    summaries = Company.current_summaries(company_ids, today.date())
+    leaders = FundRanking.leaders(company_ids)
+    funds = defaultdict(list)
+    for fund in Fund.objects.filter(company_id__in=company_ids).with_period_profits(today.date()):
+        funds[fund.company_id].append(fund)
+
+    companies_data = [
+        {"company": company, "summary": summaries[company.id], "leaders": leaders[company.id], "funds": funds[company.id]}
+        for company in companies
+    ]
+    context = {
+        "companies_data": companies_data
+    }
+    return render(request, 'trackers/dashboard.html', context)
 
-    for summary in summaries:
-        company = summary.fund.company
-        profit = getattr(summary.fund, profit_field)
+def _fund_trades(fund, show_all):
+    trades = Trade.objects.filter(option__fund=fund).select_related("option__underlying_asset")
+    if not show_all:
+        trades = trades.filter(active=True, option__expiration_date__gte=now().date())
+    return trades
 
-        best = result[company]["best"]
-        worst = result[company]["worst"]
 
-        if not best or profit > getattr(best, profit_field):
-            result[company]["best"] = summary.fund
+def _with_option_breakeven(trades):
+    """Option.breakeven_price (strike -/+ the option's first trade price) as a subquery instead of one query per row."""
+    first_price = Subquery(Trade.objects.filter(option=OuterRef("option")).order_by("pk").values("price")[:1])
+    return trades.annotate(option_breakeven=Case(
+        When(option__type="P", then=F("option__strike_price") - first_price),
+        When(option__type="C", then=F("option__strike_price") + first_price),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+    ))
 
-        if not worst or profit < getattr(worst, profit_field):
-            result[company]["worst"] = summary.fund
 
-    return result  # Dict[Company] = {"best": Fund, "worst": Fund}
+def _fund_positions(fund, show_all):
+    positions = Position.objects.filter(fund=fund)
+    if not show_all:
+        positions = positions.filter(remaining_quantity__gt=0, option__expiration_date__gte=now().date())
+    return positions.with_moneyness()
 
 
-def dashboard_view(request):
-    # process_company_file('Defiance')
-    # get_data()
-    # update_underline_models()
-    # update_option_models()
-    today = datetime.today()
+def _show_all(request):
+    return request.GET.get("all", "false").lower() == "true"
 
-    companies_data = []
-    week_start, week_end = get_week_range(today)
-    month_start, month_end = get_month_range(today)
-
-    for company in Company.objects.all():
-        funds = company.funds.all()
-
-        # Weekly best and worst fund
-        # best_weekly_fund = funds.order_by('-weekly_profit').first()
-        # worst_weekly_fund = funds.order_by('weekly_profit').first()
-
-        # # Monthly best and worst fund
-        # best_monthly_fund = funds.order_by('-monthly_profit').first()
-        # worst_monthly_fund = funds.order_by('monthly_profit').first()
-
-        # companies_data.append({
-        #     'company': company,
-        #     'best_weekly_fund': {
-        #         'fund': best_weekly_fund,
-        #         'summary': best_weekly_fund.get_current_week_summary() if best_weekly_fund else None,
-        #     },
-        #     'worst_weekly_fund': {
-        #         'fund': worst_weekly_fund,
-        #         'summary': worst_weekly_fund.get_current_week_summary() if worst_weekly_fund else None,
-        #     },
-        #     'best_monthly_fund': {
-        #         'fund': best_monthly_fund,
-        #         'summary': best_monthly_fund.get_current_month_summary() if best_monthly_fund else None,
-        #     },
-        #     'worst_monthly_fund': {
-        #         'fund': worst_monthly_fund,
-        #         'summary': worst_monthly_fund.get_current_month_summary() if worst_monthly_fund else None,
-        #     },
-        # })
-
-    week_start, week_end = get_week_range(today)
-    month_start, month_end = get_month_range(today)
-    year_start, year_end = get_year_range(today)
-
-    # week_data = get_best_and_worst_fund_per_company(week_start, week_end, 'weekly_profit')
-    # month_data = get_best_and_worst_fund_per_company(month_start, month_end, 'monthly_profit')
-    # year_data = get_best_and_worst_fund_per_company(year_start, year_end, 'annually_profit')
-
-    companies_data = []
-
-    for company in Company.objects.all():
-        companies_data.append({
-            "company": company,
-            # "best_week": week_data.get(company, {}).get("best"),
-            # "worst_week": week_data.get(company, {}).get("worst"),
-            # "best_month": month_data.get(company, {}).get("best"),
-            # "worst_month": month_data.get(company, {}).get("worst"),
-            # "best_year": year_data.get(company, {}).get("best"),
-            # "worst_year": year_data.get(company, {}).get("worst"),
-        })
-    context = {
-        "companies_data": companies_data
-    }
-    return render(request, 'trackers/dashboard.html', context)
 
 def fund_detail(request, id, slug):
-    fund = get_object_or_404(Fund, id=id, slug=slug)
+    fund = get_object_or_404(Fund.objects.with_period_profits(), id=id, slug=slug)
 
-    show_all = request.GET.get("all", "false").lower() == "true"
-
-    if show_all:
-        trades = Trade.objects.filter(option__fund=fund).select_related("option")
-    else:
-        trades = Trade.objects.filter(
-            option__fund=fund,
-            active=True,
-            option__expiration_date__gte=now().date()
-        ).select_related("option")
+    show_all = _show_all(request)
+    try:
+        trades, next_cursor = seek(_with_option_breakeven(_fund_trades(fund, show_all)), request.GET.get("cursor"))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid cursor")
 
     context = {
         "fund": fund,
         "trades": trades,
         "show_all": show_all,
+        "next_cursor": next_cursor,
+        "paged": bool(request.GET.get("cursor")),
     }
     return render(request, "trackers/fund_detail.html", context)
 
@@ -141,10 +118,12 @@ def company_detail(request, id, slug):
     company = get_object_or_404(Company, id=id, slug=slug)
       # Using annotate to get the count of active positions for each fund
     funds = Fund.objects.filter(company=company).annotate(
-        active_positions_count=Count('positions', filter=models.Q(positions__active='True'))
+        open_positions_count=Count('positions', filter=models.Q(positions__active=True))
     )
 
     fund_summaries = FundProfitSummary.objects.filter(fund__in=funds)
+    summary = Company.current_summaries([company.id])[company.id]
+    total_profit = funds.aggregate(total=Sum("total_profit"))["total"] or 0
 
     # Sorting funds by total_profit in descending order (highest profits first)
     sorted_funds = sorted(funds, key=lambda f: f.total_profit, reverse=True)
@@ -155,6 +134,8 @@ def company_detail(request, id, slug):
 
     context = {
         "company": company,
+        "summary": summary,
+        "total_profit": total_profit,
         "funds": funds,
         "fund_summaries": fund_summaries,
         "top_3_funds": top_3_funds,
@@ -166,28 +147,25 @@ def company_detail(request, id, slug):
 def user_fund_detail(request, broker_name, id, slug):
     user = request.user
     broker = get_object_or_404(BrokerAccount, broker_name=broker_name, user=user)
-    fund = get_object_or_404(Fund, id=id, slug=slug, broker_account=broker)
+    fund = get_object_or_404(Fund.objects.select_related("broker_account").with_period_profits(), id=id, slug=slug, broker_account=broker)
 
-    holding = Holding.objects.filter(fund=fund)
-    show_all = request.GET.get("all", "false").lower() == "true"
+    holding = Holding.objects.filter(fund=fund).select_related("fund__broker_account", "asset")
+    show_all = _show_all(request)
 
 
     funds = FundProfitSummary.objects.filter(fund=fund)
 
-    if show_all:
-        positions = Position.objects.filter(fund=fund, fund__broker_account=broker).select_related("option")
-    else:
-        positions = Position.objects.filter(
-            fund=fund,
-            fund__broker_account=broker,
-            remaining_quantity__gt=0,
-            option__expiration_date__gte=now().date()
-        ).select_related("option")
+    try:
+        positions, next_cursor = seek(_fund_positions(fund, show_all), request.GET.get("cursor"))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid cursor")
 
     context = {
         "fund": fund,
         "positions": positions,
         "show_all": show_all,
+        "next_cursor": next_cursor,
+        "paged": bool(request.GET.get("cursor")),
         "holding": holding,
         "funds": funds,
     }
@@ -237,40 +215,28 @@ def submit_options_trade(request):
                 }
             )
 
-            # Step 5: Create the Trade
-            trade = Trade.objects.create(
-                option=option,
-                trade_type=action,
-                quantity=quantity,
-                price=premium,
-                date=trade_date,
-                commission=commission,
-            )
-
-            position = Position.objects.create(
-                option=option,
-                fund=fund,
-                remaining_quantity=abs(trade.quantity),
-                average_price=trade.price,
-                profit_loss=trade.total_price,
-                trade_type=trade.trade_type,
-                date=trade.date,
-                commission=trade.commission,
-            )
-            trade.position = position
-            trade.save() 
-            # # Step 6: Process the trade through the PositionManager
-            # try:
-            #     Position.objects.process_trade(fund, option, trade)
-            # except ValueError as e:
-            #     messages.error(request, str(e))
-            #     return render(request, 'trackers/submit_trade.html', {'form': form})
-            
-            # update fund summary
-            update_fund_summary(fund, trade.date, trade.total_price)
-
-            # update Broker Account summary
-            update_Broker_summary(broker, trade.date, trade.total_price)
+            # Step 5: Create the Trade and apply it to the book, under the book's lock so a
+            # concurrent import or close can't interleave
+            try:
+                with lock_book(fund, option):
+                    trade = Trade.objects.create(
+                        option=option,
+                        trade_type=action,
+                        quantity=quantity,
+                        price=premium,
+                        date=trade_date,
+                        commission=commission,
+                    )
+                    Position.objects.process_trade(fund, option, trade)
+
+                    # update fund summary
+                    update_fund_summary(fund, trade.date, trade.total_price)
+
+                    # update Broker Account summary
+                    update_Broker_summary(broker, trade.date, trade.total_price)
+            except ValueError as e:
+                messages.error(request, str(e))
+                return render(request, 'trackers/submit_trade.html', {'form': form})
 
             # update_option_and_underlying_price.delay(
             #     option_id=option.id,
@@ -278,7 +244,6 @@ def submit_options_trade(request):
             #     trade_date_str=str(trade.date)  # format YYYY-MM-DD
             # )
 
-            print("SAVED TRADE:", trade.trade_type, trade.total_price)
             messages.success(request, 'Trade submitted successfully.')
             return redirect('fund_detail', id=fund.id, slug=fund.slug)  # Adjust to your URL name
     else:
@@ -331,88 +296,15 @@ def add_broker(request):
 
 @login_required
 def user_dashboard(request):
-    user = request.user
-    broker_accounts = BrokerAccount.objects.filter(user=user)
-
-    funds = Fund.objects.filter(broker_account__in=broker_accounts)
-    positions = Position.objects.filter(fund__broker_account__in=broker_accounts).select_related("fund", "option")
-    holdings = Holding.objects.filter(fund__broker_account__in=broker_accounts).select_related('fund', 'asset')
-    
-    all_user_weekly = 0
-    all_user_monthly = 0
-    all_user_yearly = 0
-    total_all_time_options = 0
-    conbined_total = 0
-    holding_total = 0
-    accounts = []
-    for broker in broker_accounts:
-        summary = Fund.get_user_profit_summaries(broker)
-        all_user_weekly += summary["weekly"]
-
-        all_user_monthly += summary["monthly"]
-        # all_user_monthly["broker"][broker.broker_name] = summary["monthly"]
-
-        all_user_yearly += summary["yearly"]
-        # all_user_yearly["broker"][broker.broker_name] = summary["yearly"]
-
-        total_all_time_options += summary["total_all_time_options"]
-        # total_all_time_options["broker"][broker.broker_name] = summary["total_all_time_options"]
-
-        conbined_total += summary["combined_total_all_time"]
-        # conbined_total["broker"][broker.broker_name] = summary["combined_total_all_time"]
-        
-        holding_total += summary["holding_profit_loss"]
-        # holding_total["broker"][broker.broker_name] = summary["holding_profit_loss"]
-        accounts.append({
-            "broker": broker,
-            "summary": summary
-        })
-    context = {
-        "accounts": accounts,
-        "positions": positions,
-        "funds": funds,
-        "user_total_weekly_profit": all_user_weekly,
-        "user_total_monthly_profit": all_user_monthly,
-        "user_total_yearly_profit": all_user_yearly,
-        "user_total_all_time_profit": total_all_time_options,
-
-        "combined_total_all_time": conbined_total,
-
-        "holding_total_all_time": holding_total,
-        'holdings': holdings,
-        "brokers": BrokerAccount.objects.filter(user=user)
-    }
-    return render(request, "trackers/user_dashboard.html", context)
+    # cached per user until their data changes, see analytics/dashboards.py
+    return render(request, "trackers/user_dashboard.html", dashboards.user_dashboard(request.user.id))
 
 
 @login_required
 def broker_detail(request, broker_slug, broker_id):
-    user = request.user
-    broker = get_object_or_404(BrokerAccount, id=broker_id, user=user)
-    funds = Fund.objects.filter(broker_account=broker) \
-        .annotate(active_positions_total=Count("positions", filter=Q(positions__active=True))) \
-        .prefetch_related(
-            Prefetch(
-                "holdings",
-                queryset=Holding.objects.filter(quantity__gt=0, fund__broker_account=broker).select_related('asset'),
-            ),
-            Prefetch(
-                "positions",
-                queryset=Position.objects.filter(active=True, fund__broker_account=broker),
-            ),
-        )
-    summary = Fund.get_user_profit_summaries(broker)
-    context = {"broker": broker,
-        "funds": funds,
-        "user_total_weekly_profit": summary["weekly"],
-        "user_total_monthly_profit": summary["monthly"],
-        "user_total_yearly_profit": summary["yearly"],
-        "user_total_all_time_profit": summary["total_all_time_options"],
-
-        "combined_total_all_time": summary["combined_total_all_time"],
-
-        "holding_total_all_time": summary["holding_profit_loss"],
-        }
+    context = dashboards.broker_dashboard(request.user.id, broker_id)
+    if context is None:
+        raise Http404("No such broker account.")
     return render(request, "trackers/broker_detail.html", context)
 
 
@@ -428,6 +320,25 @@ def position_detail_view(request, broker_name, id):
         "trades": trades,
     })
 
+@login_required
+def position_trajectory(request, broker_name, id):
+    """Quantity and P&L points of a position, optionally limited with ?from=YYYY-MM-DD&to=YYYY-MM-DD."""
+    broker = get_object_or_404(BrokerAccount, broker_name=broker_name, user=request.user)
+    position = get_object_or_404(Position, id=id, fund__broker_account=broker)
+    try:
+        start, end = (parse_date(request.GET[key]) if request.GET.get(key) else None for key in ("from", "to"))
+    except ValueError:
+        start = end = None
+    if (request.GET.get("from") and not start) or (request.GET.get("to") and not end):
+        return JsonResponse({"error": "Dates must be YYYY-MM-DD"}, status=400)
+
+    points = [
+        [day.isoformat(), quantity, float(price), float(pnl)]
+        for day, quantity, price, pnl in position.trajectory(start, end)
+    ]
+    return JsonResponse({"position": position.id, "fields": ["date", "quantity", "average_price", "profit_loss"],
+                         "points": points})
+
 @login_required
 def check_fund_name(request):
     name = request.GET.get('name', '').strip()
@@ -444,33 +355,26 @@ def check_fund_name(request):
     return JsonResponse({'exists': exists})
 
 # This is used when we click on the "expired worthless" button
-# i think its useless beacause i can use "Buy to Close"  button
+# Expired positions are settled nightly (trackers/ledger/settlement.py), this closes one early
 @login_required
 def mark_position_expired(request, id):
-    position = get_object_or_404(Position, id=id, fund__user=request.user, active=True)
+    position = get_object_or_404(Position, id=id, fund__broker_account__user=request.user, active=True)
+    fund = position.fund
+    back = redirect("user_fund_detail", broker_name=fund.broker_account.broker_name, id=fund.id, slug=fund.slug)
 
     if request.method == "POST":
         if "confirm" in request.POST:
-            # Mark position as closed
-            position.active = False
-            position.save()
-
-            # Create the offsetting "Buy to Close" trade at 0 cost
-            Trade.objects.create(
-                position=position,
-                option=position.option,
-                trade_type="BC",  # Buy to Close
-                quantity=position.remaining_quantity,
-                price=Decimal("0.00"),
-                date=position.option.expiration_date,
-                active=False,
-            )
-
-            messages.success(request, "Position marked as expired and closed with a Buy to Close trade.")
-            return redirect("user_fund_detail", id=position.fund.id, slug=position.fund.slug)
-
-        else:
-            return redirect("user_fund_detail", id=position.fund.id, slug=position.fund.slug)
+            if position.option.expiration_date > timezone.localdate():
+                messages.error(request, "This option hasn't expired yet, close the position with a trade instead.")
+                return back
+            result = settle_positions(Position.objects.filter(
+                id=position.id, option__expiration_date__lte=timezone.localdate(),
+            ))
+            if result["unpriced"]:
+                messages.error(request, "No close for the underlying on the expiration date yet, can't settle this position.")
+            else:
+                messages.success(request, "Position marked as expired and closed at its intrinsic value.")
+        return back
 
     return render(request, "trackers/confirm_expired.html", {"position": position})
 
@@ -490,33 +394,39 @@ def close_position_trade(request, id, broker_name):
             commission = form.cleaned_data['commission']
             notes = form.cleaned_data['notes']
 
-            if quantity > position.remaining_quantity:
-                messages.error(request, "Cannot close more than the remaining quantity.")
-                return render(request, 'trackers/close_trade.html', {'form': form, 'position': position})
-
-            # Create closing trade
-            trade = Trade.objects.create(
-                position=position,
-                option=option,
-                trade_type='BC' if position.trade_type == 'S' else 'S',
-                quantity=quantity,
-                price=premium,
-                # IMPORTANT:::::: this should be expire date of options or should add a filed(null=true) to from
-                date=option.expiration_date,
-                commission=commission,
-                active=False,
-            )
-            # IMPARTANT::: also change the posion price ex. frsit.trade.price - new.trade.price        
-            pnl = position.profit_loss + trade.total_price
-            # Update position
-            position.remaining_quantity -= quantity
-            if position.remaining_quantity <= 0:
-                position.active = False
-            position.commission += commission
-            position.profit_loss = pnl
-            position.save()
+            with lock_book(fund, option):
+                # Re-read under the lock, another close or an import may have got here first
+                position.refresh_from_db()
+                if not position.active or quantity > position.remaining_quantity:
+                    messages.error(request, "Cannot close more than the remaining quantity.")
+                    return render(request, 'trackers/close_trade.html', {'form': form, 'position': position})
+
+                # Create closing trade
+                trade = Trade.objects.create(
+                    position=position,
+                    option=option,
+                    trade_type='BC' if position.trade_type == 'S' else 'S',
+                    quantity=quantity,
+                    price=premium,
+                    # IMPORTANT:::::: this should be expire date of options or should add a filed(null=true) to from
+                    date=option.expiration_date,
+                    commission=commission,
+                    active=False,
+                )
+                # IMPARTANT::: also change the posion price ex. frsit.trade.price - new.trade.price
+                pnl = position.profit_loss + trade.total_price
+                # Update position
+                position.remaining_quantity -= quantity
+                if position.remaining_quantity <= 0:
+                    position.active = False
+                position.commission += commission
+                position.profit_loss = pnl
+                position.save()
+                position_history.record([
+                    (position.id, trade.date, position.remaining_quantity, position.average_price, position.profit_loss),
+                ])
 
-            update_fund_summary(fund, trade.date, trade.total_price)
+                update_fund_summary(fund, trade.date, trade.total_price)
 
             messages.success(request, "Closing trade recorded and position updated.")
             return redirect('user_fund_detail', broker_name=broker_name, id=fund.id, slug=fund.slug)
@@ -748,32 +658,93 @@ def holding_sell_from_call_view(request, broker_name, position_id):
     return render(request, "trackers/holding_trade_form.html", {"form": form, "action": "Sell Shares from CALL","position": position,})
 
 
-def fund_profit_summary_data(request, fund_id):
-    summaries = FundProfitSummary.objects.filter(fund_id=fund_id).order_by("start_date")
+def _series_params(request):
+    """(period, from, to, cumulative) from the query string, ValueError if any of them is bad."""
+    period = request.GET.get("period", "week")
+    if period not in SERIES_PERIODS:
+        raise ValueError(f"period must be one of {', '.join(SERIES_PERIODS)}")
+    start, end = (parse_date(request.GET[key]) if request.GET.get(key) else None for key in ("from", "to"))
+    if (request.GET.get("from") and not start) or (request.GET.get("to") and not end):
+        raise ValueError("Dates must be YYYY-MM-DD")
+    return period, start, end, request.GET.get("cumulative", "").lower() in ("1", "true")
+
+
+def _series_fund(request, fund_id):
+    # issuer funds are public, broker funds only for their owner
+    fund = get_object_or_404(Fund, id=fund_id)
+    if fund.broker_account_id and (not request.user.is_authenticated or fund.broker_account.user_id != request.user.id):
+        raise Http404
+    return fund
+
+
+def _series_etag(request, fund_id):
+    try:
+        return f'"{series_token(fund_id, *_series_params(request))}"'
+    except ValueError:
+        return None
+
+
+@condition(etag_func=_series_etag)
+def fund_profit_series(request, fund_id):
+    """
+    Profit per week, month or year of a fund for its chart:
+    ?period=week|month|year&from=YYYY-MM-DD&to=YYYY-MM-DD&cumulative=1
+    """
+    fund = _series_fund(request, fund_id)
+    try:
+        params = _series_params(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    response = JsonResponse(cached_fund_series(fund.id, *params))
+    # browsers revalidate with If-None-Match and get a 304 until the fund's summaries change
+    response["Cache-Control"] = "private, no-cache"
+    return response
 
-    weekly = {}
-    monthly = {}
-    annually = {}
+def _feed(request, queryset, row):
+    """A keyset page of `queryset` as {"results": [...], "next": cursor}, for infinite scroll."""
+    try:
+        rows, next_cursor = seek(queryset, request.GET.get("cursor"), page_size(request.GET.get("size")))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse({"results": [row(item) for item in rows], "next": next_cursor})
 
-    for s in summaries:
-        week_label = f"{s.start_date.isocalendar().year}-W{s.start_date.isocalendar().week}"
-        weekly[week_label] = weekly.get(week_label, 0) + float(s.weekly_profit or 0)
 
-        month_label = s.start_date.strftime("%Y-%m")
-        monthly[month_label] = monthly.get(month_label, 0) + float(s.monthly_profit or 0)
+def _money(value):
+    return None if value is None else float(value)
 
-        year_label = str(s.start_date.year)
-        annually[year_label] = annually.get(year_label, 0) + float(s.annually_profit or 0)
 
-    def format_summary(data_dict):
-        return [{"label": k, "profit": round(v, 2)} for k, v in sorted(data_dict.items())]
+def fund_trades_feed(request, fund_id):
+    fund = _series_fund(request, fund_id)
+    return _feed(request, _fund_trades(fund, _show_all(request)), lambda trade: {
+        "id": trade.id,
+        "date": trade.date.isoformat() if trade.date else None,
+        "ticker": trade.option.ticker,
+        "trade_type": trade.trade_type,
+        "quantity": trade.quantity,
+        "price": _money(trade.price),
+        "total_price": _money(trade.total_price),
+        "expiration_date": trade.option.expiration_date.isoformat(),
+    })
+
 
-    return JsonResponse({
-        "weekly": format_summary(weekly),
-        "monthly": format_summary(monthly),
-        "annually": format_summary(annually)
+@login_required
+def fund_positions_feed(request, fund_id):
+    fund = get_object_or_404(Fund, id=fund_id, broker_account__user=request.user)
+    return _feed(request, _fund_positions(fund, _show_all(request)), lambda position: {
+        "id": position.id,
+        "date": position.date.isoformat(),
+        "ticker": position.option.ticker,
+        "trade_type": position.trade_type,
+        "remaining_quantity": position.remaining_quantity,
+        "average_price": _money(position.average_price),
+        "profit_loss": _money(position.profit_loss),
+        "breakeven_price": _money(position.breakeven_price),
+        "annual_yield": _money(position.annual_yield),
+        "moneyness_now": _money(position.moneyness_now),
+        "active": position.active,
     })
 
+
 # i was working on thsi one
 # then i relized that i also need to add Broker to account
 def holding_transaction(request):
@@ -825,31 +796,107 @@ def import_csv_view(request):
     return HttpResponse("Doen.")
 
 
-# views.py
-import yfinance as yf
-from django.http import JsonResponse
+async def live_price(request, symbol):
+    """
+    Latest price for `symbol` from the shared quote cache, refreshed from Yahoo at most every
+    LIVE_PRICE_FRESH_SECONDS. A slow or failing upstream returns the last known price flagged stale.
+    """
+    symbol = symbol.upper()
+    quote = await aget_quote(symbol)
+    fresh_for = getattr(settings, "LIVE_PRICE_FRESH_SECONDS", 15)
+    if quote and time.time() - quote["ts"] < fresh_for:
+        return JsonResponse({"price": quote["price"], "stale": False})
 
-def live_price(request, symbol):
-    print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! requesting new price")
-    data = yf.Ticker(symbol).history(period="1d")
-    price = data["Close"].iloc[-1] if not data.empty else None
-    return JsonResponse({"price": round(price, 2) if price else None})
+    try:
+        price = await call_upstream("yahoo", fetch_last_close, symbol)
+    except UpstreamUnavailable:
+        if quote:
+            return JsonResponse({"price": quote["price"], "stale": True})
+        return JsonResponse({"price": None, "stale": True}, status=503)
+
+    if price is None:
+        return JsonResponse({"price": None, "stale": False})
+    quote = await sync_to_async(set_quote)(symbol, price)
+    return JsonResponse({"price": quote["price"], "stale": False})
+
+def fetch_option_chain(symbol, expiry):
+    import yfinance as yf
+
+    chain = yf.Ticker(symbol).option_chain(expiry)
+    return {
+        "calls": chain.calls.to_dict("records"),
+        "puts": chain.puts.to_dict("records"),
+    }
 
-def option_chain(request, symbol, expiry):
-    ticker = yf.Ticker(symbol)
+async def option_chain(request, symbol, expiry):
+    symbol = symbol.upper()
     try:
-        chain = ticker.option_chain(expiry)
-        calls = chain.calls.to_dict("records")
-        puts = chain.puts.to_dict("records")
-        return JsonResponse({
-            "calls": calls,
-            "puts": puts,
-        })
+        chain, stale = await cached_upstream(
+            f"option-chain:{symbol}:{expiry}", "yahoo", fetch_option_chain, symbol, expiry,
+            fresh_for=getattr(settings, "OPTION_CHAIN_FRESH_SECONDS", 60),
+        )
+    except UpstreamUnavailable as e:
+        return JsonResponse({"error": str(e)}, status=503)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=400)
-    
+    return JsonResponse({**chain, "stale": stale})
+
+@login_required
+def risk_greeks(request):
+    """Net delta/gamma/theta/vega of the user's open option positions, per broker and fund."""
+    return JsonResponse(user_greeks(request.user))
+
+@login_required
+async def live_pnl_stream(request):
+    """
+    Server-sent events with price and P&L deltas for the user's open positions and holdings.
+    Needs an ASGI server; every open tab shares the one refresh loop in the PriceHub.
+    """
+    user = await request.auser()
+    book = await sync_to_async(build_user_book)(user)
+    subscription = Subscription(book)
+    hub = get_hub()
+    keepalive = getattr(settings, "LIVE_KEEPALIVE_SECONDS", 15)
+
+    async def event_stream():
+        hub.subscribe(subscription)
+        try:
+            quotes = await sync_to_async(get_quotes)(subscription.symbols)
+            yield f"event: snapshot\ndata: {json.dumps(subscription.snapshot(quotes))}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: delta\ndata: {json.dumps(event)}\n\n"
+        finally:
+            hub.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(event_stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
 def get_funds(request):
     broker_id = request.GET.get('broker_id')
     funds = Fund.objects.filter(broker_account__id = broker_id)
     data = [{'id': fund.id, 'name': fund.name} for fund in funds]
-    return JsonResponse(data, safe=False)
\ No newline at end of file
+    return JsonResponse(data, safe=False)
+@staff_member_required
+def profile_list(request):
+    """Profiles taken with ?profile=1 or the Celery profile header, newest first."""
+    return render(request, "trackers/profiles.html", {"profiles": ProfileStore().list()})
+
+@staff_member_required
+def profile_detail(request, profile_id):
+    store = ProfileStore()
+    try:
+        profile = store.get(profile_id)
+    except KeyError:
+        raise Http404("No such profile")
+    if request.GET.get("format") == "folded":
+        response = HttpResponse(store.folded(profile_id), content_type="text/plain; charset=utf-8")
+        response["Content-Disposition"] = f'attachment; filename="{profile_id}.folded"'
+        return response
+    return render(request, "trackers/profile_detail.html", {"profile": profile})